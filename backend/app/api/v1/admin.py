@@ -1,13 +1,27 @@
 """
 管理员API接口
 """
+import asyncio
+
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 
 from app.core.response import APIResponse
-from app.db.session import get_db
+from app.db.pool_metrics import async_pool_monitor, primary_pool_monitor
+from app.db.query_stats import query_accounting
+from app.db.replicas import replica_router
+from app.db.session import async_engine, get_db
+from app.db.write_queue import write_queue
 from app.services.ai_service import AIService
-from app.services.cache_service import cache
+from app.services.circuit_breaker import qwen_breaker
+from app.services.latency_tracker import qwen_latency
+from app.services.cache_decorator import get_method_cache_stats
+from app.services.cache_service import async_cache
+from app.services.count_cache import count_cache
+from app.services.counter_buffer import counter_buffer
+from app.services.generation_cache import generation_cache
+from app.services.joke_reservoir import joke_reservoir
+from app.services.request_coalescer import generation_coalescer
 
 router = APIRouter()
 
@@ -28,15 +42,21 @@ async def health_check(request: Request):
     # 检查AI服务
     ai_service = AIService()
     ai_status = await ai_service.test_api_connection()
+    ai_status["circuit_breaker"] = qwen_breaker.get_stats()
+    ai_status["latency"] = qwen_latency.get_stats()
     
     # 检查缓存服务
-    cache_status = cache.get_stats()
+    cache_status = await async_cache.get_stats()
     
     health_data = {
         "database": {"status": db_status},
         "ai_service": ai_status,
         "cache": cache_status,
-        "overall": "healthy" if db_status == "healthy" and ai_status["status"] == "success" else "degraded"
+        "overall": "healthy" if (
+            db_status == "healthy"
+            and ai_status["status"] == "success"
+            and ai_status["circuit_breaker"]["state"] == qwen_breaker.CLOSED
+        ) else "degraded"
     }
     
     return APIResponse.success(
@@ -51,14 +71,33 @@ async def clear_cache(
     request: Request,
     pattern: str = "*"
 ):
-    """清除缓存"""
+    """清除缓存（后台任务，立即返回任务ID）"""
     request_id = getattr(request.state, "request_id", None)
     
-    cleared_count = cache.clear_pattern(pattern)
+    job = async_cache.start_clear_job(pattern)
     
     return APIResponse.success(
-        data={"cleared_count": cleared_count},
-        message=f"成功清除{cleared_count}个缓存项",
+        data=job.to_dict(),
+        message="缓存清除任务已提交",
+        request_id=request_id
+    )
+
+
+@router.get("/cache/clear/{job_id}")
+async def get_clear_cache_job(request: Request, job_id: str):
+    """查询缓存清除任务进度"""
+    request_id = getattr(request.state, "request_id", None)
+    
+    job = async_cache.get_clear_job(job_id)
+    if not job:
+        return APIResponse.not_found(
+            message="缓存清除任务不存在",
+            request_id=request_id
+        )
+    
+    return APIResponse.success(
+        data=job.to_dict(),
+        message="获取缓存清除任务成功",
         request_id=request_id
     )
 
@@ -78,18 +117,24 @@ async def get_system_stats(
     user_service = UserService(db)
     share_service = ShareService(db)
     
+    # 统计查询和缓存等待都不能阻塞事件循环，同步会话的查询放到线程池执行
     # 用户统计
-    user_stats = user_service.get_user_stats()
+    user_stats = await user_service.get_user_stats_async()
     
     # 笑话统计
-    total_jokes = db.query(Joke).count()
-    featured_jokes = db.query(Joke).filter(Joke.is_featured == True).count()
+    def count_jokes():
+        return (
+            db.query(Joke).count(),
+            db.query(Joke).filter(Joke.is_featured == True).count()
+        )
+    
+    total_jokes, featured_jokes = await asyncio.to_thread(count_jokes)
     
     # 分享统计
-    share_stats = share_service.get_share_stats(30)  # 30天统计
+    share_stats = await share_service.get_share_stats_async(30)  # 30天统计
     
     # 缓存统计
-    cache_stats = cache.get_stats()
+    cache_stats = await async_cache.get_stats()
     
     stats_data = {
         "users": user_stats.model_dump(),
@@ -101,7 +146,20 @@ async def get_system_stats(
             "total": share_stats.total_shares,
             "platforms": share_stats.platform_stats
         },
-        "cache": cache_stats
+        "cache": cache_stats,
+        "cache_methods": get_method_cache_stats(),
+        "generation_cache": generation_cache.get_stats(),
+        "reservoir": await joke_reservoir.get_stats(),
+        "coalescing": generation_coalescer.get_stats(),
+        "counters": counter_buffer.get_stats(),
+        "write_queue": write_queue.get_stats(),
+        "database_pool": {
+            "primary": primary_pool_monitor.get_stats(),
+            "async": async_pool_monitor.get_stats() if async_engine is not None else None
+        },
+        "replicas": replica_router.get_stats(),
+        "counts": count_cache.get_stats(),
+        "queries": query_accounting.get_stats()
     }
     
     return APIResponse.success(
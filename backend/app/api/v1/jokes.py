@@ -1,9 +1,11 @@
-from typing import List, Optional
+import json
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.core.middleware import limiter
-from app.core.response import APIResponse
+from app.core.response import APIResponse, DateTimeEncoder
 
 # 创建一个安全的限流装饰器
 def safe_limit(rate_limit: str):
@@ -13,7 +15,8 @@ def safe_limit(rate_limit: str):
             return limiter.limit(rate_limit)(func)
         return func
     return decorator
-from app.db.session import get_db
+from app.db.replicas import get_read_db
+from app.db.session import ReadSession, get_db
 from app.schemas.joke import (
     JokeGenerateRequest,
     JokeBatchGenerateRequest,
@@ -29,6 +32,11 @@ from app.services.share_service import ShareService
 router = APIRouter()
 
 
+def _sse_event(event: str, data: Any) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, cls=DateTimeEncoder)}\n\n"
+
+
 @router.post("/generate")
 @safe_limit("10/minute")
 async def generate_joke(
@@ -49,6 +57,44 @@ async def generate_joke(
     )
 
 
+@router.get("/generate/stream")
+@safe_limit("10/minute")
+async def generate_joke_stream(
+    request: Request,
+    category: Optional[str] = Query(None, description="笑话分类"),
+    length: Optional[str] = Query("medium", description="长度偏好: short/medium/long"),
+    temperature: Optional[float] = Query(0.8, ge=0.1, le=2.0),
+    db: Session = Depends(get_db)
+):
+    """流式生成冷笑话（Server-Sent Events）"""
+    generate_request = JokeGenerateRequest(
+        category=category,
+        length=length,
+        temperature=temperature
+    )
+    joke_service = JokeService(db)
+    
+    async def event_stream():
+        try:
+            async for event in joke_service.stream_joke(generate_request):
+                if event["event"] == "delta":
+                    yield _sse_event("delta", {"content": event["content"]})
+                else:
+                    joke = JokeResponse.model_validate(event["joke"])
+                    yield _sse_event("done", joke.model_dump())
+        except Exception as e:
+            yield _sse_event("error", {"message": getattr(e, "detail", str(e))})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.post("/batch")
 @safe_limit("5/minute")
 async def generate_batch_jokes(
@@ -102,17 +148,23 @@ async def get_jokes(
     size: int = Query(10, ge=1, le=50, description="每页数量"),
     category: Optional[str] = Query(None, description="分类筛选"),
     is_featured: Optional[bool] = Query(None, description="是否精选"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标，传入上一页的next_cursor，优先于page"),
+    include_total: Optional[bool] = Query(None, description="是否返回总数，默认仅页码分页返回"),
+    exact: bool = Query(True, description="是否精确计数，false时返回缓存的总数（可能略有滞后）"),
+    db: ReadSession = Depends(get_read_db)
 ):
     """获取笑话列表"""
     request_id = getattr(request.state, "request_id", None)
     
     joke_service = JokeService(db)
-    result = joke_service.get_jokes(
+    result = await joke_service.get_jokes_async(
         page=page,
         size=size,
         category=category,
-        is_featured=is_featured
+        is_featured=is_featured,
+        cursor=cursor,
+        include_total=include_total,
+        exact=exact
     )
     
     return APIResponse.success(
@@ -141,7 +193,7 @@ async def get_joke(
         )
     
     # 增加查看次数
-    joke_service.increment_view_count(joke_id)
+    await joke_service.increment_view_count_async(joke_id)
     
     return APIResponse.success(
         data=JokeResponse.model_validate(joke),
@@ -161,7 +213,7 @@ async def favorite_joke(
     request_id = getattr(request.state, "request_id", None)
     
     joke_service = JokeService(db)
-    success = joke_service.toggle_favorite(joke_id)
+    success = await joke_service.toggle_favorite_async(joke_id)
     
     if not success:
         return APIResponse.not_found(
@@ -182,13 +234,16 @@ async def get_user_joke_history(
     user_id: int,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标，传入上一页的next_cursor，优先于page"),
+    include_total: Optional[bool] = Query(None, description="是否返回总数，默认仅页码分页返回"),
+    exact: bool = Query(True, description="是否精确计数，false时返回缓存的总数（可能略有滞后）"),
+    db: ReadSession = Depends(get_read_db)
 ):
     """获取用户笑话历史"""
     request_id = getattr(request.state, "request_id", None)
     
     joke_service = JokeService(db)
-    result = joke_service.get_user_jokes(user_id, page, size)
+    result = await joke_service.get_user_jokes_async(user_id, page, size, cursor, include_total, exact)
     
     return APIResponse.success(
         data=result,
@@ -229,13 +284,13 @@ async def share_joke(
 async def get_share_stats(
     request: Request,
     days: int = Query(7, ge=1, le=30, description="统计天数"),
-    db: Session = Depends(get_db)
+    db: ReadSession = Depends(get_read_db)
 ):
     """获取分享统计"""
     request_id = getattr(request.state, "request_id", None)
     
     share_service = ShareService(db)
-    stats = share_service.get_share_stats(days)
+    stats = await share_service.get_share_stats_async(days)
     
     return APIResponse.success(
         data=stats,
@@ -16,7 +16,8 @@ def safe_limit(rate_limit: str):
             return limiter.limit(rate_limit)(func)
         return func
     return decorator
-from app.db.session import get_db
+from app.db.replicas import get_read_db
+from app.db.session import ReadSession, get_async_db, get_db
 from app.schemas.user import (
     UserCreate,
     UserUpdate,
@@ -48,7 +49,7 @@ async def create_user(
             request_id=request_id
         )
     
-    user = user_service.create_user(user_create)
+    user = await user_service.create_user_async(user_create)
     
     return APIResponse.success(
         data=UserResponse.model_validate(user),
@@ -61,13 +62,13 @@ async def create_user(
 async def get_user(
     request: Request,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: ReadSession = Depends(get_async_db)
 ):
     """获取用户信息"""
     request_id = getattr(request.state, "request_id", None)
     
     user_service = UserService(db)
-    user = user_service.get_user_by_id(user_id)
+    user = await user_service.get_user_by_id_async(user_id)
     
     if not user:
         return APIResponse.not_found(
@@ -118,7 +119,7 @@ async def update_user(
     request_id = getattr(request.state, "request_id", None)
     
     user_service = UserService(db)
-    user = user_service.update_user(user_id, user_update)
+    user = await user_service.update_user_async(user_id, user_update)
     
     if not user:
         return APIResponse.not_found(
@@ -144,7 +145,7 @@ async def user_login(
     request_id = getattr(request.state, "request_id", None)
     
     user_service = UserService(db)
-    user = user_service.update_last_login(user_id)
+    user = await user_service.update_last_login_async(user_id)
     
     if not user:
         return APIResponse.not_found(
@@ -165,13 +166,15 @@ async def get_users(
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(10, ge=1, le=50, description="每页数量"),
     is_active: Optional[bool] = Query(None, description="是否激活"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标，传入上一页的next_cursor，优先于page"),
+    include_total: Optional[bool] = Query(None, description="是否返回总数，默认仅页码分页返回"),
+    db: ReadSession = Depends(get_read_db)
 ):
     """获取用户列表"""
     request_id = getattr(request.state, "request_id", None)
     
     user_service = UserService(db)
-    result = user_service.get_users(page, size, is_active)
+    result = await user_service.get_users_async(page, size, is_active, cursor, include_total)
     
     return APIResponse.success(
         data=result,
@@ -183,13 +186,13 @@ async def get_users(
 @router.get("/stats/overview")
 async def get_user_stats(
     request: Request,
-    db: Session = Depends(get_db)
+    db: ReadSession = Depends(get_read_db)
 ):
     """获取用户统计信息"""
     request_id = getattr(request.state, "request_id", None)
     
     user_service = UserService(db)
-    stats = user_service.get_user_stats()
+    stats = await user_service.get_user_stats_async()
     
     return APIResponse.success(
         data=stats,
@@ -1,5 +1,5 @@
 import os
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings
 
@@ -28,13 +28,116 @@ class Settings(BaseSettings):
     QWEN_MAX_TOKENS: int = 200
     QWEN_TEMPERATURE: float = 0.8
     
+    # 千问HTTP连接池配置（应用级共享客户端）
+    QWEN_HTTP_MAX_CONNECTIONS: int = 100
+    QWEN_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    QWEN_HTTP_KEEPALIVE_EXPIRY: float = 30.0  # 秒
+    QWEN_HTTP_CONNECT_TIMEOUT: float = 5.0
+    QWEN_HTTP_READ_TIMEOUT: float = 30.0
+    QWEN_HTTP_WRITE_TIMEOUT: float = 10.0
+    QWEN_HTTP_POOL_TIMEOUT: float = 5.0
+    
+    # 千问API重试与熔断配置
+    QWEN_RETRY_ATTEMPTS: int = 2  # 含首次调用
+    QWEN_RETRY_BACKOFF: float = 0.2  # 指数退避基数（秒）
+    QWEN_BREAKER_ENABLED: bool = True
+    QWEN_BREAKER_WINDOW_SIZE: int = 20  # 统计最近N次调用
+    QWEN_BREAKER_MIN_CALLS: int = 10  # 窗口内至少N次调用才判断是否熔断
+    QWEN_BREAKER_ERROR_RATE: float = 0.5  # 错误率阈值
+    QWEN_BREAKER_SLOW_CALL_SECONDS: float = 10.0  # 慢调用阈值
+    QWEN_BREAKER_SLOW_CALL_RATE: float = 0.8  # 慢调用比例阈值
+    QWEN_BREAKER_OPEN_SECONDS: float = 30.0  # 打开状态持续时间
+    QWEN_BREAKER_HALF_OPEN_MAX_CALLS: int = 1  # 半开状态允许的探测调用数
+    
+    # 千问API自适应超时与对冲请求配置
+    QWEN_LATENCY_WINDOW_SIZE: int = 200  # 统计最近N次调用延迟
+    QWEN_LATENCY_MIN_SAMPLES: int = 20  # 样本不足时使用固定超时
+    QWEN_ADAPTIVE_TIMEOUT_ENABLED: bool = False
+    QWEN_ADAPTIVE_TIMEOUT_QUANTILE: float = 0.99
+    QWEN_ADAPTIVE_TIMEOUT_MULTIPLIER: float = 1.5
+    QWEN_ADAPTIVE_TIMEOUT_MIN: float = 2.0  # 秒
+    QWEN_ADAPTIVE_TIMEOUT_MAX: float = 30.0  # 秒
+    QWEN_HEDGE_ENABLED: bool = False
+    QWEN_HEDGE_QUANTILE: float = 0.95  # 超过该分位延迟仍未返回时发出对冲请求
+    QWEN_HEDGE_MIN_DELAY: float = 0.2  # 秒
+    
+    # 相同提示词请求合并配置
+    QWEN_COALESCE_ENABLED: bool = False
+    QWEN_COALESCE_VARIETY: bool = True  # 合并后用多选一次返回不同笑话
+    QWEN_COALESCE_WINDOW_MS: int = 20  # 多选模式下收集同批请求的等待窗口
+    QWEN_COALESCE_MAX_CHOICES: int = 4  # 单次请求的最大候选数
+    
+    # 批量生成配置
+    JOKE_BATCH_CONCURRENCY: int = 5  # 批量生成时并发调用AI的上限
+    
+    # 笑话蓄水池配置（按分类/长度/温度档位预生成笑话）
+    JOKE_RESERVOIR_ENABLED: bool = False
+    JOKE_RESERVOIR_LOW_WATER: int = 5  # 低于该水位触发补充
+    JOKE_RESERVOIR_HIGH_WATER: int = 20  # 补充到该水位为止
+    JOKE_RESERVOIR_TEMPERATURE_STEP: float = 0.2  # 温度分档步长
+    JOKE_RESERVOIR_REFILL_CONCURRENCY: int = 4
+    JOKE_RESERVOIR_REFILL_INTERVAL: float = 1.0  # 秒
+    JOKE_RESERVOIR_WARM_CATEGORIES: List[str] = []  # 启动时预热的分类
+    JOKE_RESERVOIR_USE_REDIS: bool = False  # 多进程共享蓄水池
+    JOKE_RESERVOIR_PROMOTE_HITS: int = 3  # 非预热键被请求该次数后才开始维持水位
+    JOKE_RESERVOIR_MAX_DYNAMIC_KEYS: int = 16  # 动态维持水位的键数上限（LRU）
+    JOKE_RESERVOIR_IDLE_TTL: int = 600  # 秒，动态键闲置超过该时间后不再补充
+    JOKE_RESERVOIR_REFILL_LOCK_MS: int = 30000  # Redis模式下单键补充锁的超时
+    
+    # 计数器写回配置
+    COUNTER_WRITE_MODE: str = "direct"  # direct/memory/redis，决定崩溃时的数据保证
+    COUNTER_FLUSH_INTERVAL: float = 2.0  # 秒
+    COUNTER_FLUSH_MAX_PENDING: int = 10000  # 进程内累积的增量达到该数量时提前刷新
+    
+    # 列表总数缓存配置
+    COUNT_CACHE_TTL: int = 600  # 秒，过期后重新COUNT纠正增量偏差
+    COUNT_CACHE_MAX_ENTRIES: int = 10000  # 进程内LRU容量
+    
+    # 生成结果缓存配置（按提示词缓存多个变体，轮询返回）
+    GENERATION_CACHE_ENABLED: bool = False
+    GENERATION_CACHE_TTL: int = 3600  # 秒
+    GENERATION_CACHE_VARIANTS: int = 5  # 每个键缓存的变体数量
+    GENERATION_CACHE_MAX_ENTRIES: int = 1000  # 进程内LRU容量
+    GENERATION_CACHE_TEMPERATURE_STEP: float = 0.2
+    GENERATION_CACHE_USE_REDIS: bool = True  # 使用Redis作为共享层
+    
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./test.db"
     DATABASE_ECHO: bool = False
+    DATABASE_ASYNC: bool = True  # 只读查询使用异步引擎（aiosqlite / asyncpg）
+    
+    # 数据库连接池配置（SQLite内存库不适用）
+    DATABASE_POOL_SIZE: int = 5  # 常驻连接数
+    DATABASE_MAX_OVERFLOW: int = 10  # 高峰时额外创建的连接数
+    DATABASE_POOL_TIMEOUT: float = 30.0  # 获取连接的最长等待（秒）
+    DATABASE_POOL_RECYCLE: int = 1800  # 连接最长使用时间（秒），-1表示不回收
+    DATABASE_POOL_PRE_PING: bool = True  # 取出连接前检测是否可用
+    
+    # 只读副本配置（列表、统计等只读接口路由到副本）
+    DATABASE_REPLICA_URLS: List[str] = []  # 副本连接串，留空表示只用主库
+    DATABASE_REPLICA_MAX_LAG: float = 5.0  # 复制延迟超过该秒数的副本不参与路由
+    DATABASE_REPLICA_CHECK_INTERVAL: float = 5.0  # 检测副本延迟的间隔（秒）
+    DATABASE_READ_YOUR_WRITES_WINDOW: float = 10.0  # 写入后该时间内的读取走主库（秒）
+    
+    # SQL统计配置（每个请求的语句数和数据库耗时、慢查询日志）
+    QUERY_STATS_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0  # 超过该耗时的语句记录慢查询日志
+    
+    # SQLite生产模式（WAL等连接参数，默认关闭）
+    SQLITE_TUNING_ENABLED: bool = False
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL模式下NORMAL只在断电时可能丢失最近的提交
+    SQLITE_MMAP_SIZE: int = 268435456  # 字节，256MB
+    SQLITE_CACHE_SIZE: int = -65536  # 负数表示KiB，即64MB
+    SQLITE_BUSY_TIMEOUT: int = 5000  # 毫秒
+    
+    # 单写线程队列（所有写操作由一个线程执行并合并提交，默认关闭）
+    WRITE_QUEUE_ENABLED: bool = False
+    WRITE_QUEUE_MAX_BATCH: int = 200  # 一次提交最多合并的写操作数
     
     # Redis配置
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_EXPIRE_TIME: int = 3600  # 1小时
+    REDIS_MAX_CONNECTIONS: int = 50  # 异步客户端共享连接池上限
     
     # 限流配置
     RATE_LIMIT_PER_MINUTE: int = 60
@@ -53,6 +156,23 @@ class Settings(BaseSettings):
     # 缓存配置
     CACHE_EXPIRE_TIME: int = 300  # 5分钟
     ENABLE_CACHE: bool = True
+    CACHE_L1_ENABLED: bool = True  # Redis前的进程内缓存
+    CACHE_L1_MAX_SIZE: int = 1024
+    CACHE_L1_TTL: int = 30  # 秒，进程内副本的最长存活时间
+    CACHE_XFETCH_BETA: float = 1.0  # 提前刷新强度，越大越早刷新
+    CACHE_STALE_TTL: int = 60  # 秒，逻辑过期后旧值可继续返回的时长
+    CACHE_LOCK_TIMEOUT_MS: int = 10000  # 重新计算锁的自动过期时间
+    CACHE_LOCK_WAIT_MS: int = 50  # 无旧值时等待结果的轮询间隔
+    CACHE_TTL_JITTER: float = 0.1  # 读穿缓存TTL的随机抖动比例
+    CACHE_NEGATIVE_TTL: int = 30  # 秒，未找到结果的缓存时间
+    CACHE_BYPASS_HEADER: str = "X-Cache-Bypass"  # 调试用，带此请求头时跳过读穿缓存
+    CACHE_BYPASS_ENABLED: bool = False  # 非调试模式下是否接受跳过缓存请求头
+    CACHE_SCAN_BATCH_SIZE: int = 500  # 按模式清除时每批SCAN/UNLINK的键数
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"  # 跨进程失效通知频道
+    CACHE_SERIALIZER: str = "orjson"  # orjson/msgpack/json/pickle
+    CACHE_NAMESPACE_SERIALIZERS: Dict[str, str] = {}  # 按键前缀覆盖，如 {"legacy": "pickle"}
+    CACHE_COMPRESSION: str = "zlib"  # none/zlib/zstd/lz4
+    CACHE_COMPRESSION_MIN_BYTES: int = 1024  # 超过该大小才压缩
     
     # 监控配置
     ENABLE_METRICS: bool = True
@@ -64,6 +184,18 @@ class Settings(BaseSettings):
             return [i.strip() for i in v.split(",")]
         return v
     
+    @validator("JOKE_RESERVOIR_WARM_CATEGORIES", pre=True)
+    def parse_reservoir_categories(cls, v: Union[str, List[str]]) -> List[str]:
+        if isinstance(v, str):
+            return [i.strip() for i in v.split(",") if i.strip()]
+        return v
+    
+    @validator("DATABASE_REPLICA_URLS", pre=True)
+    def parse_replica_urls(cls, v: Union[str, List[str]]) -> List[str]:
+        if isinstance(v, str):
+            return [i.strip() for i in v.split(",") if i.strip()]
+        return v
+    
     @validator("CORS_ORIGINS", pre=True)
     def parse_cors_origins(cls, v: Union[str, List[str]]) -> List[str]:
         if isinstance(v, str):
@@ -64,4 +64,14 @@ class ValidationException(BaseCustomException):
         super().__init__(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=detail
-        )
\ No newline at end of file
+        )
+
+
+class CircuitOpenException(BaseCustomException):
+    """熔断器打开异常"""
+    
+    def __init__(self, detail: str = "上游服务暂不可用，已熔断"):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail
+        )
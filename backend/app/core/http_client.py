@@ -0,0 +1,65 @@
+"""
+共享HTTP客户端
+
+应用生命周期内复用同一个 httpx.AsyncClient，使调用千问API时可以
+复用 keep-alive 连接，避免每次生成笑话都重新建立 TCP/TLS 连接。
+"""
+from typing import Optional
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def build_http_client(
+    transport: Optional[httpx.AsyncBaseTransport] = None
+) -> httpx.AsyncClient:
+    """按配置构建带连接池的HTTP客户端"""
+    limits = httpx.Limits(
+        max_connections=settings.QWEN_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.QWEN_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.QWEN_HTTP_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        connect=settings.QWEN_HTTP_CONNECT_TIMEOUT,
+        read=settings.QWEN_HTTP_READ_TIMEOUT,
+        write=settings.QWEN_HTTP_WRITE_TIMEOUT,
+        pool=settings.QWEN_HTTP_POOL_TIMEOUT
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, transport=transport)
+
+
+async def init_http_client() -> httpx.AsyncClient:
+    """初始化共享HTTP客户端（应用启动时调用）"""
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+        logger.info(
+            f"共享HTTP客户端已创建: max_connections={settings.QWEN_HTTP_MAX_CONNECTIONS}, "
+            f"keepalive={settings.QWEN_HTTP_MAX_KEEPALIVE_CONNECTIONS}"
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """关闭共享HTTP客户端（应用关闭时调用）"""
+    global _http_client
+    
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+        logger.info("共享HTTP客户端已关闭")
+    _http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享HTTP客户端，未初始化时（如脚本、测试）惰性创建"""
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
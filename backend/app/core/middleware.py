@@ -24,6 +24,9 @@ except ImportError:
     limiter = None
 
 from app.core.config import settings
+from app.db.query_stats import QueryStats, current_query_stats, query_accounting
+from app.db.replicas import READ_YOUR_WRITES_COOKIE, ReadScope, current_read_scope, replica_router
+from app.services.cache_decorator import cache_bypass
 
 
 class LoggingMiddleware(BaseHTTPMiddleware):
@@ -45,8 +48,15 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             f"Client: {request.client.host if request.client else 'unknown'}"
         )
         
+        # 统计本次请求执行的SQL
+        query_stats = QueryStats(request_id)
+        token = current_query_stats.set(query_stats)
+        
         # 处理请求
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            current_query_stats.reset(token)
         
         # 计算处理时间
         process_time = time.time() - start_time
@@ -55,12 +65,62 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         logger.info(
             f"Request completed - ID: {request_id} | "
             f"Status: {response.status_code} | "
-            f"Duration: {process_time:.4f}s"
+            f"Duration: {process_time:.4f}s | "
+            f"Queries: {query_stats.count} ({query_stats.duration * 1000:.1f}ms)"
         )
         
+        # 按路由模板汇总，未匹配的路径归为一类，避免指标标签无限增长
+        route = request.scope.get("route")
+        query_accounting.observe(request.method, getattr(route, "path", "unmatched"), query_stats)
+        
         # 添加响应头
         response.headers["X-Request-ID"] = request_id
         response.headers["X-Process-Time"] = str(process_time)
+        response.headers["X-DB-Query-Count"] = str(query_stats.count)
+        response.headers["X-DB-Time"] = f"{query_stats.duration * 1000:.2f}"
+        
+        return response
+
+
+class CacheBypassMiddleware(BaseHTTPMiddleware):
+    """带跳过缓存请求头时，本次请求的读穿缓存直接查询数据库（调试用）"""
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        bypass = bool(request.headers.get(settings.CACHE_BYPASS_HEADER))
+        token = cache_bypass.set(bypass)
+        try:
+            return await call_next(request)
+        finally:
+            cache_bypass.reset(token)
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """读己之写：请求中发生写操作后，窗口期内该客户端和路径中的用户读取走主库"""
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        try:
+            primary_until = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+        except ValueError:
+            primary_until = 0.0
+        scope = ReadScope(sticky=primary_until > time.time())
+        token = current_read_scope.set(scope)
+        try:
+            response = await call_next(request)
+        finally:
+            current_read_scope.reset(token)
+        
+        if scope.wrote:
+            window = replica_router.window
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE,
+                f"{time.time() + window:.3f}",
+                max_age=max(int(window), 1),
+                httponly=True,
+                samesite="lax"
+            )
+            user_id = request.path_params.get("user_id")
+            if user_id is not None:
+                await replica_router.mark_user(user_id)
         
         return response
 
@@ -92,5 +152,13 @@ def setup_middleware(app):
     else:
         logger.warning("SlowAPI 不可用，跳过限流中间件设置")
     
+    # 跳过缓存请求头（仅调试模式或显式开启时生效）
+    if settings.DEBUG or settings.CACHE_BYPASS_ENABLED:
+        app.add_middleware(CacheBypassMiddleware)
+    
+    # 读己之写（配置了只读副本时）
+    if replica_router.enabled:
+        app.add_middleware(ReadYourWritesMiddleware)
+    
     # 日志中间件
     app.add_middleware(LoggingMiddleware)
\ No newline at end of file
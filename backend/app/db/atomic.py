@@ -0,0 +1,50 @@
+"""
+原子计数更新
+
+计数字段用一条 UPDATE ... SET col = col + :delta 在数据库端累加，
+不先加载ORM对象，避免读-改-写的额外往返和并发下的更新丢失。
+数据库支持 UPDATE ... RETURNING 时（PostgreSQL、SQLite 3.35+）同一条语句
+返回更新后的值，否则再查询一次。
+"""
+from typing import Dict, Optional, Type
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+
+
+def atomic_increment(
+    db: Session,
+    model: Type[Base],
+    entity_id: int,
+    **deltas: int
+) -> Optional[Dict[str, int]]:
+    """按主键原子累加计数字段，不提交事务
+    
+    Args:
+        db: 数据库会话
+        model: 模型类
+        entity_id: 主键
+        **deltas: 字段名 -> 增量
+    
+    Returns:
+        更新后的字段值；记录不存在时返回None
+    """
+    table = model.__table__
+    columns = [table.c[field] for field in deltas]
+    statement = (
+        update(table)
+        .where(table.c.id == entity_id)
+        .values({column: column + delta for column, delta in zip(columns, deltas.values())})
+    )
+    
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(statement.returning(*columns)).first()
+        return dict(row._mapping) if row is not None else None
+    
+    result = db.execute(statement)
+    if result.rowcount == 0:
+        return None
+    row = db.execute(select(*columns).where(table.c.id == entity_id)).first()
+    return dict(row._mapping)
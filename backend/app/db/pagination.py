@@ -0,0 +1,150 @@
+"""
+列表分页
+
+按 (created_at, id) 倒序排列，支持两种模式：
+- 游标模式：以上一页最后一条记录的 (created_at, id) 为条件取下一页，
+  深翻页不再扫描并丢弃前面的行，耗时与页码无关
+- offset模式：按页码跳过前面的行，保留用于兼容
+
+游标是编码后的不透明字符串，客户端原样回传 next_cursor 即可。
+总数需要额外一次 COUNT 查询，游标模式默认不返回。
+"""
+import base64
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from sqlalchemy import Select, String, desc, func, literal, or_, select
+from sqlalchemy.orm import Query, Session
+
+from app.core.exceptions import ValidationException
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(created_at: datetime, entity_id: int) -> str:
+    """编码分页游标"""
+    raw = f"{created_at.isoformat()}|{entity_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解码分页游标"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, entity_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(entity_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationException("无效的分页游标")
+
+
+def timestamp_param(db: Union[Session, "AsyncSession"], value: datetime):
+    """与 created_at 等时间字段比较时使用的绑定参数
+    
+    SQLite以文本保存时间，CURRENT_TIMESTAMP默认值不带微秒，而DateTime类型
+    绑定时总是补上微秒，按文本比较会错位；这里绑定与存储一致的文本。
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return literal(value.replace(tzinfo=None).isoformat(sep=" "), String)
+    return value
+
+
+def paginate(
+    query: Query,
+    model,
+    page: int = 1,
+    size: int = 10,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    count: Optional[Callable[[Query], int]] = None
+) -> Dict[str, Any]:
+    """分页查询
+    
+    Args:
+        query: 已加好筛选条件的查询
+        model: 模型类，需有 created_at 和 id 字段
+        page: 页码（offset模式）
+        size: 每页数量
+        cursor: 分页游标，传入时使用游标模式并忽略page
+        include_total: 是否返回总数，默认offset模式返回、游标模式不返回
+        count: 自定义计数函数（如走计数缓存），默认执行 COUNT
+    
+    Returns:
+        items、total、page、size、pages、next_cursor、has_more
+    """
+    if include_total is None:
+        include_total = cursor is None
+    
+    total = None
+    if include_total:
+        total = count(query) if count is not None else query.order_by(None).count()
+    
+    rows = _window(query, model, query.session, page, size, cursor).all()
+    return _build_page(rows, total, page, size, cursor)
+
+
+def count_statement(statement: Select) -> Select:
+    """筛选条件下的 COUNT 语句"""
+    return select(func.count()).select_from(statement.order_by(None).subquery())
+
+
+async def paginate_async(
+    db: "AsyncSession",
+    statement: Select,
+    model,
+    page: int = 1,
+    size: int = 10,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    count: Optional[Callable[[Select], Awaitable[int]]] = None
+) -> Dict[str, Any]:
+    """分页查询的异步版本，参数同 paginate，statement 为 select() 语句"""
+    if include_total is None:
+        include_total = cursor is None
+    
+    total = None
+    if include_total:
+        if count is not None:
+            total = await count(statement)
+        else:
+            total = (await db.execute(count_statement(statement))).scalar_one()
+    
+    result = await db.execute(_window(statement, model, db, page, size, cursor))
+    return _build_page(result.scalars().all(), total, page, size, cursor)
+
+
+def _window(statement, model, db, page: int, size: int, cursor: Optional[str]):
+    """加上排序和游标条件（或offset），多取一条判断是否还有下一页"""
+    ordered = statement.order_by(desc(model.created_at), desc(model.id))
+    if cursor:
+        created_at, entity_id = decode_cursor(cursor)
+        timestamp = timestamp_param(db, created_at)
+        # 单独的 created_at <= 条件让索引按范围定位起点，只写OR时SQLite会从头扫描
+        ordered = ordered.filter(
+            model.created_at <= timestamp,
+            or_(model.created_at < timestamp, model.id < entity_id)
+        )
+    else:
+        ordered = ordered.offset((page - 1) * size)
+    return ordered.limit(size + 1)
+
+
+def _build_page(rows: list, total: Optional[int], page: int, size: int, cursor: Optional[str]) -> Dict[str, Any]:
+    """组装分页结果"""
+    has_more = len(rows) > size
+    items = rows[:size]
+    
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    return {
+        "items": items,
+        "total": total,
+        "page": None if cursor else page,
+        "size": size,
+        "pages": (total + size - 1) // size if total is not None else None,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
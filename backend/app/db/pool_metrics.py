@@ -0,0 +1,199 @@
+"""
+数据库连接池监控
+
+区分连接池耗尽和慢查询：
+- 获取连接等待时间（checkout wait）：请求从池中拿到连接前等了多久，
+  持续升高说明连接池不够用（或连接被长时间占用）
+- 连接占用时间（hold）：从取出到归还，包含事务内所有查询，
+  等待不高而占用时间长说明是查询或事务本身慢
+- 使用中连接数、溢出连接数、获取超时次数
+
+获取连接的等待时间由连接池子类在 _do_get 中计时，其余通过连接池事件记录。
+prometheus_client 可用时同时导出到监控端点。
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.services.latency_tracker import LatencyTracker
+
+# 可选导入 prometheus_client
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# 连接池统计窗口大小
+WINDOW_SIZE = 1000
+
+if PROMETHEUS_AVAILABLE:
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    
+    CHECKOUT_WAIT = Histogram(
+        "db_pool_checkout_wait_seconds", "从连接池获取连接的等待时间", ["engine"], buckets=LATENCY_BUCKETS
+    )
+    CONNECTION_HOLD = Histogram(
+        "db_pool_connection_hold_seconds", "连接从取出到归还的占用时间", ["engine"], buckets=LATENCY_BUCKETS
+    )
+    CHECKOUTS = Counter("db_pool_checkouts_total", "获取连接次数", ["engine"])
+    OVERFLOW_CHECKOUTS = Counter("db_pool_overflow_checkouts_total", "连接池处于溢出状态时的获取次数", ["engine"])
+    CHECKOUT_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "获取连接超时次数", ["engine"])
+    CONNECTS = Counter("db_pool_connects_total", "新建数据库连接次数", ["engine"])
+    INVALIDATIONS = Counter("db_pool_invalidations_total", "失效（断开或预检失败）的连接数", ["engine"])
+    POOL_SIZE = Gauge("db_pool_size", "连接池常驻连接数上限", ["engine"])
+    CHECKED_OUT = Gauge("db_pool_checked_out", "使用中的连接数", ["engine"])
+    OVERFLOW = Gauge("db_pool_overflow", "使用中的溢出连接数", ["engine"])
+
+# 区分 _do_get 的递归调用，只对最外层计时
+_in_checkout: ContextVar[bool] = ContextVar("in_checkout", default=False)
+
+
+class PoolMonitor:
+    """连接池监控"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.engine: Optional[Engine] = None
+        self.checkout_wait = LatencyTracker(window_size=WINDOW_SIZE, min_samples=1)
+        self.connection_hold = LatencyTracker(window_size=WINDOW_SIZE, min_samples=1)
+        
+        # 统计信息
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+    
+    def instrument(self, engine: Engine):
+        """注册连接池事件；连接池是 Instrumented*Pool 时同时记录获取连接的等待时间"""
+        self.engine = engine
+        pool = engine.pool
+        if isinstance(pool, TimedCheckoutMixin):
+            pool.monitor = self
+        
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        
+        if PROMETHEUS_AVAILABLE:
+            POOL_SIZE.labels(self.name).set_function(lambda: self._pool_value("size"))
+            CHECKED_OUT.labels(self.name).set_function(lambda: self._pool_value("checkedout"))
+            OVERFLOW.labels(self.name).set_function(lambda: max(self._pool_value("overflow"), 0))
+    
+    def record_wait(self, seconds: float):
+        """记录一次获取连接的等待时间"""
+        self.checkout_wait.record(seconds)
+        if PROMETHEUS_AVAILABLE:
+            CHECKOUT_WAIT.labels(self.name).observe(seconds)
+    
+    def record_timeout(self):
+        """记录一次获取连接超时"""
+        self.timeouts += 1
+        if PROMETHEUS_AVAILABLE:
+            CHECKOUT_TIMEOUTS.labels(self.name).inc()
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        def ms(tracker: LatencyTracker, q: float) -> Optional[float]:
+            value = tracker.quantile(q)
+            return round(value * 1000, 2) if value is not None else None
+        
+        return {
+            "pool_size": self._pool_value("size"),
+            "checked_out": self._pool_value("checkedout"),
+            "overflow": max(self._pool_value("overflow"), 0),
+            "checkouts": self.checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "checkout_wait_p50_ms": ms(self.checkout_wait, 0.50),
+            "checkout_wait_p99_ms": ms(self.checkout_wait, 0.99),
+            "hold_p50_ms": ms(self.connection_hold, 0.50),
+            "hold_p99_ms": ms(self.connection_hold, 0.99)
+        }
+    
+    def _pool_value(self, name: str) -> int:
+        """读取当前连接池的数值，不支持的连接池类型返回0"""
+        if self.engine is None:
+            return 0
+        getter = getattr(self.engine.pool, name, None)
+        return getter() if callable(getter) else 0
+    
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+        if PROMETHEUS_AVAILABLE:
+            CONNECTS.labels(self.name).inc()
+    
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        self.checkouts += 1
+        overflow = self._pool_value("overflow") > 0
+        if overflow:
+            self.overflow_checkouts += 1
+        if PROMETHEUS_AVAILABLE:
+            CHECKOUTS.labels(self.name).inc()
+            if overflow:
+                OVERFLOW_CHECKOUTS.labels(self.name).inc()
+    
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is None:
+            return
+        seconds = time.perf_counter() - checked_out_at
+        self.connection_hold.record(seconds)
+        if PROMETHEUS_AVAILABLE:
+            CONNECTION_HOLD.labels(self.name).observe(seconds)
+    
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+        if PROMETHEUS_AVAILABLE:
+            INVALIDATIONS.labels(self.name).inc()
+
+
+class TimedCheckoutMixin:
+    """在 _do_get 中记录获取连接的等待时间（含排队和新建连接）"""
+    
+    monitor: Optional[PoolMonitor] = None
+    
+    def _do_get(self):
+        if self.monitor is None or _in_checkout.get():
+            return super()._do_get()
+        
+        token = _in_checkout.set(True)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.monitor.record_timeout()
+            raise
+        finally:
+            _in_checkout.reset(token)
+            # 超时的等待同样计入，连接池耗尽时等待分布才完整
+            self.monitor.record_wait(time.perf_counter() - start)
+    
+    def recreate(self):
+        # engine.dispose() 会新建连接池，沿用同一个监控
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        return pool
+
+
+class InstrumentedQueuePool(TimedCheckoutMixin, QueuePool):
+    """记录获取连接等待时间的 QueuePool"""
+
+
+class InstrumentedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的 AsyncAdaptedQueuePool"""
+
+
+# 各引擎的连接池监控
+primary_pool_monitor = PoolMonitor("primary")
+async_pool_monitor = PoolMonitor("async")
@@ -0,0 +1,192 @@
+"""
+请求级SQL统计和慢查询日志
+
+before/after_cursor_execute 钩子注册在 Engine 类上，对所有引擎生效：
+- 每条语句计入当前请求的查询次数和数据库耗时，请求由 LoggingMiddleware
+  通过 ContextVar 绑定，和日志中的 request_id 对应
+- 超过 SLOW_QUERY_THRESHOLD_MS 的语句记一条慢查询日志，SQL归一化
+  （字面量替换为?、IN列表折叠），参数只记录类型不记录值
+
+asyncio.to_thread 会复制上下文，放到线程池执行的查询同样计入；
+单写线程合并了多个请求的写操作，不计入任何请求。
+"""
+import re
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+# 可选导入 prometheus_client
+try:
+    from prometheus_client import Counter, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+if PROMETHEUS_AVAILABLE:
+    QUERIES_PER_REQUEST = Histogram(
+        "db_queries_per_request", "每个请求执行的SQL语句数", ["method", "route"],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+    )
+    DB_TIME_PER_REQUEST = Histogram(
+        "db_time_per_request_seconds", "每个请求的数据库耗时", ["method", "route"],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    )
+    SLOW_QUERIES = Counter("db_slow_queries_total", "慢查询次数")
+
+# 归一化SQL
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+MAX_SQL_LENGTH = 2000
+
+
+class QueryStats:
+    """一个请求的SQL统计"""
+    
+    __slots__ = ("request_id", "count", "duration")
+    
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id
+        self.count = 0
+        self.duration = 0.0
+
+
+# 当前请求的统计，请求外执行的语句为None
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def normalize_sql(statement: str) -> str:
+    """归一化SQL：合并空白，字面量替换为?，IN列表折叠为 IN (...)"""
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _STRING_LITERAL.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    if len(normalized) > MAX_SQL_LENGTH:
+        normalized = normalized[:MAX_SQL_LENGTH] + "..."
+    return normalized
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> str:
+    """只保留参数的类型，不输出值"""
+    if executemany:
+        rows = list(parameters or [])
+        first = redact_parameters(rows[0]) if rows else "()"
+        return f"{len(rows)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return "()"
+
+
+class QueryAccounting:
+    """按路由汇总请求的SQL统计"""
+    
+    def __init__(self):
+        # (method, route) -> [请求数, 语句总数, 单请求最多语句数, 数据库总耗时]
+        self._routes: Dict[tuple, list] = {}
+        self._lock = Lock()
+        
+        # 统计信息
+        self.slow_queries = 0
+    
+    def observe(self, method: str, route: str, stats: QueryStats):
+        """记录一个请求结束时的统计"""
+        with self._lock:
+            entry = self._routes.setdefault((method, route), [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += stats.count
+            entry[2] = max(entry[2], stats.count)
+            entry[3] += stats.duration
+        
+        if PROMETHEUS_AVAILABLE:
+            QUERIES_PER_REQUEST.labels(method, route).observe(stats.count)
+            DB_TIME_PER_REQUEST.labels(method, route).observe(stats.duration)
+    
+    def record_slow(self, statement: str, parameters: Any, executemany: bool, seconds: float):
+        """记录一条慢查询"""
+        self.slow_queries += 1
+        if PROMETHEUS_AVAILABLE:
+            SLOW_QUERIES.inc()
+        
+        stats = current_query_stats.get()
+        request_id = stats.request_id if stats is not None else "-"
+        logger.warning(
+            f"Slow query - ID: {request_id} | "
+            f"Duration: {seconds * 1000:.1f}ms | "
+            f"SQL: {normalize_sql(statement)} | "
+            f"Params: {redact_parameters(parameters, executemany)}"
+        )
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        with self._lock:
+            routes = {
+                f"{method} {route}": {
+                    "requests": requests,
+                    "avg_queries": round(queries / requests, 2),
+                    "max_queries": max_queries,
+                    "avg_db_ms": round(duration / requests * 1000, 2)
+                }
+                for (method, route), (requests, queries, max_queries, duration) in self._routes.items()
+            }
+        return {
+            "slow_query_threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+            "slow_queries": self.slow_queries,
+            "routes": routes
+        }
+    
+    def reset(self):
+        """清空路由统计"""
+        with self._lock:
+            self._routes.clear()
+        self.slow_queries = 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += seconds
+    
+    if seconds * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        query_accounting.record_slow(statement, parameters, executemany, seconds)
+
+
+def _handle_error(exception_context):
+    # 执行失败的语句不会触发 after_cursor_execute，丢弃它的开始时间
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def install_query_hooks():
+    """在 Engine 类上注册语句计时钩子（重复调用无副作用）"""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+# 全局SQL统计实例
+query_accounting = QueryAccounting()
@@ -0,0 +1,308 @@
+"""
+只读副本路由
+
+配置 DATABASE_REPLICA_URLS 后，列表、历史、统计等只读接口的查询路由到副本：
+- 后台定期检测每个副本的复制延迟，延迟超过 DATABASE_REPLICA_MAX_LAG 或检测
+  失败的副本不参与路由，在其余副本间轮询；没有可用副本时回到主库
+- 读己之写：请求中发生过写操作时，响应设置 db_primary_until Cookie，窗口期内
+  同一客户端的读取走主库；路径中带 user_id 的写请求同时标记该用户（有Redis时
+  跨worker共享），窗口期内对该用户的读取也走主库
+
+PostgreSQL副本用 pg_last_xact_replay_timestamp() 计算延迟；其他数据库只做
+连通性检查，延迟记为0。
+
+读穿缓存不区分数据来源，副本上读到的结果同样写入缓存，最多滞后 MAX_LAG 秒。
+"""
+import asyncio
+import itertools
+import time
+from contextvars import ContextVar
+from typing import AsyncGenerator, Dict, List, Optional
+
+from fastapi import Request
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.pool_metrics import PoolMonitor
+from app.db.session import (
+    AsyncSessionLocal,
+    ReadSession,
+    SessionLocal,
+    create_async_session_factory,
+    create_db_engine,
+    read_session,
+)
+from app.services.cache_service import async_cache
+
+# 可选导入 prometheus_client
+try:
+    from prometheus_client import Counter, Gauge
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+if PROMETHEUS_AVAILABLE:
+    REPLICA_LAG = Gauge("db_replica_lag_seconds", "只读副本的复制延迟", ["replica"])
+    READS_ROUTED = Counter("db_reads_routed_total", "只读查询的路由次数", ["target"])
+
+# 读己之写Cookie，值为主库读取窗口的截止时间戳
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+
+# 副本上回放到最新WAL时延迟为0，否则为最后回放事务距今的秒数
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# 本地用户标记超过该数量时清理过期项
+MAX_LOCAL_MARKS = 10000
+
+
+class ReadScope:
+    """一个请求的读写状态"""
+    
+    __slots__ = ("sticky", "wrote")
+    
+    def __init__(self, sticky: bool = False):
+        self.sticky = sticky
+        self.wrote = False
+
+
+# 当前请求的读写状态，由 ReadYourWritesMiddleware 绑定
+current_read_scope: ContextVar[Optional[ReadScope]] = ContextVar("current_read_scope", default=None)
+
+
+def note_write():
+    """记录当前请求发生了写操作，之后的读取走主库"""
+    scope = current_read_scope.get()
+    if scope is not None:
+        scope.wrote = True
+
+
+class Replica:
+    """一个只读副本"""
+    
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.monitor = PoolMonitor(name)
+        self.engine = create_db_engine(url, self.monitor)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine, self.async_session_factory = create_async_session_factory(
+            url, PoolMonitor(f"{name}_async")
+        )
+        
+        # 未检测前不参与路由
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.reads = 0
+    
+    def check(self) -> Optional[float]:
+        """检测复制延迟（秒），连接失败时标记为不可用"""
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0.0)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"只读副本不可用: {self.name} - {e}")
+            self.healthy = False
+            self.lag = None
+        else:
+            if not self.healthy:
+                logger.info(f"只读副本可用: {self.name}, 延迟 {lag:.2f}s")
+            self.healthy = True
+            self.lag = lag
+        self.checked_at = time.time()
+        
+        if PROMETHEUS_AVAILABLE:
+            REPLICA_LAG.labels(self.name).set(self.lag if self.lag is not None else float("nan"))
+        return self.lag
+    
+    async def dispose(self):
+        """关闭副本连接池"""
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        self.engine.dispose()
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "url": make_url(self.url).render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag_seconds": round(self.lag, 3) if self.lag is not None else None,
+            "checked_at": self.checked_at,
+            "reads": self.reads,
+            "pool": self.monitor.get_stats()
+        }
+
+
+class ReplicaRouter:
+    """只读副本路由"""
+    
+    def __init__(
+        self,
+        urls: Optional[List[str]] = None,
+        max_lag: Optional[float] = None,
+        check_interval: Optional[float] = None,
+        window: Optional[float] = None
+    ):
+        urls = settings.DATABASE_REPLICA_URLS if urls is None else urls
+        self.replicas = [Replica(f"replica_{i}", url) for i, url in enumerate(urls)]
+        self.max_lag = settings.DATABASE_REPLICA_MAX_LAG if max_lag is None else max_lag
+        self.check_interval = check_interval or settings.DATABASE_REPLICA_CHECK_INTERVAL
+        self.window = settings.DATABASE_READ_YOUR_WRITES_WINDOW if window is None else window
+        
+        self._next = itertools.count()
+        self._marks: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        
+        # 统计信息
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.lag_fallbacks = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+    
+    def check(self):
+        """检测所有副本的复制延迟"""
+        for replica in self.replicas:
+            replica.check()
+    
+    async def start(self):
+        """检测一次副本延迟并启动后台检测（应用启动时调用）"""
+        if not self.enabled or self._task is not None:
+            return
+        await asyncio.to_thread(self.check)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"只读副本路由已启动: {len(self.replicas)}个副本, 最大延迟{self.max_lag}s")
+    
+    async def stop(self):
+        """停止后台检测并关闭副本连接池（应用关闭时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+    
+    def choose(self) -> Optional[Replica]:
+        """在延迟不超过上限的可用副本间轮询，没有时返回None（使用主库）"""
+        candidates = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag
+        ]
+        if not candidates:
+            self.lag_fallbacks += 1
+            return None
+        return candidates[next(self._next) % len(candidates)]
+    
+    async def route(self, request: Request) -> Optional[Replica]:
+        """为只读请求选择副本，返回None时使用主库"""
+        if not self.enabled:
+            return None
+        
+        scope = current_read_scope.get()
+        user_id = request.path_params.get("user_id")
+        if (scope is not None and (scope.sticky or scope.wrote)) or (
+            user_id is not None and await self.is_marked(user_id)
+        ):
+            self.sticky_reads += 1
+            replica = None
+        else:
+            replica = self.choose()
+        
+        if replica is None:
+            self.primary_reads += 1
+        else:
+            replica.reads += 1
+        if PROMETHEUS_AVAILABLE:
+            READS_ROUTED.labels(replica.name if replica is not None else "primary").inc()
+        return replica
+    
+    async def mark_user(self, user_id):
+        """标记用户刚写入过，窗口期内对该用户的读取走主库"""
+        key = str(user_id)
+        now = time.time()
+        if len(self._marks) >= MAX_LOCAL_MARKS:
+            self._marks = {k: until for k, until in self._marks.items() if until > now}
+        self._marks[key] = now + self.window
+        
+        if async_cache.enabled and async_cache.redis_client is not None:
+            try:
+                await async_cache.redis_client.set(self._mark_key(key), "1", px=int(self.window * 1000))
+            except RedisError as e:
+                logger.warning(f"记录读己之写标记失败: {e}")
+    
+    async def is_marked(self, user_id) -> bool:
+        """用户是否在读己之写窗口内（本地或其他worker标记）"""
+        key = str(user_id)
+        if self._marks.get(key, 0) > time.time():
+            return True
+        
+        if async_cache.enabled and async_cache.redis_client is not None:
+            try:
+                return bool(await async_cache.redis_client.exists(self._mark_key(key)))
+            except RedisError as e:
+                logger.warning(f"读取读己之写标记失败: {e}")
+        return False
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "enabled": self.enabled,
+            "max_lag_seconds": self.max_lag,
+            "read_your_writes_window": self.window,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "lag_fallbacks": self.lag_fallbacks,
+            "replicas": {replica.name: replica.get_stats() for replica in self.replicas}
+        }
+    
+    async def _run(self):
+        """后台检测循环"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                logger.error(f"检测只读副本失败: {e}")
+    
+    @staticmethod
+    def _mark_key(user_id: str) -> str:
+        return f"rw:user:{user_id}"
+
+
+# 全局只读副本路由实例
+replica_router = ReplicaRouter()
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[ReadSession, None]:
+    """
+    获取只读接口的数据库会话
+    
+    按复制延迟和读己之写状态选择副本或主库，会话类型与 get_async_db 相同。
+    """
+    replica = await replica_router.route(request)
+    if replica is None:
+        session_factory, async_session_factory = SessionLocal, AsyncSessionLocal
+    else:
+        session_factory, async_session_factory = replica.session_factory, replica.async_session_factory
+    
+    async with read_session(session_factory, async_session_factory) as db:
+        yield db
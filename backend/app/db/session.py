@@ -1,21 +1,101 @@
-from typing import Generator
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Generator, Optional, Union
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.db.pool_metrics import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    PoolMonitor,
+    async_pool_monitor,
+    primary_pool_monitor,
+)
+from app.db.query_stats import install_query_hooks
+
+# 可选导入异步引擎（需要 aiosqlite / asyncpg 驱动）
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    ASYNC_SQLALCHEMY_AVAILABLE = True
+except ImportError:
+    ASYNC_SQLALCHEMY_AVAILABLE = False
 
 logger = get_logger(__name__)
 
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def sqlite_pragmas() -> dict:
+    """SQLite生产模式的连接参数"""
+    return {
+        "journal_mode": "WAL",
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "temp_store": "MEMORY",
+    }
+
+
+def configure_sqlite(target: Engine, pragmas: Optional[dict] = None):
+    """在每个新连接上执行PRAGMA
+    
+    WAL模式下读不阻塞写、写不阻塞读；synchronous=NORMAL 只在检查点时fsync。
+    journal_mode 写入数据库文件，其余参数只对当前连接生效。
+    """
+    pragmas = pragmas if pragmas is not None else sqlite_pragmas()
+    
+    @event.listens_for(target, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def pool_kwargs(url: str, asynchronous: bool = False) -> dict:
+    """连接池参数，使用带等待计时的连接池；SQLite内存库沿用默认的单连接池"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+
+# 记录每个请求的SQL语句数和耗时
+if settings.QUERY_STATS_ENABLED:
+    install_query_hooks()
+
+def create_db_engine(url: str, monitor: PoolMonitor) -> Engine:
+    """创建同步引擎并注册连接池监控（主库和只读副本共用）"""
+    engine_kwargs = pool_kwargs(url)
+    if url.startswith("sqlite"):
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+    
+    db_engine = create_engine(url, echo=settings.DATABASE_ECHO, **engine_kwargs)
+    if settings.SQLITE_TUNING_ENABLED and db_engine.dialect.name == "sqlite":
+        configure_sqlite(db_engine)
+    monitor.instrument(db_engine)
+    return db_engine
+
+
 # 创建数据库引擎
-engine_kwargs = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
-
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=settings.DATABASE_ECHO,
-    **engine_kwargs
-)
+engine = create_db_engine(settings.DATABASE_URL, primary_pool_monitor)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(
@@ -24,6 +104,39 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# 只读查询依赖 get_async_db 返回的会话类型
+ReadSession = Union[AsyncSession, Session] if ASYNC_SQLALCHEMY_AVAILABLE else Session
+
+
+def async_database_url(url: str) -> str:
+    """把同步连接串换成对应的异步驱动"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def create_async_session_factory(database_url: str, monitor: PoolMonitor):
+    """创建异步引擎和会话工厂，未开启或驱动未安装时返回None"""
+    if not settings.DATABASE_ASYNC or not ASYNC_SQLALCHEMY_AVAILABLE:
+        return None, None
+    
+    url = async_database_url(database_url)
+    try:
+        async_engine = create_async_engine(url, echo=settings.DATABASE_ECHO, **pool_kwargs(url, asynchronous=True))
+    except ImportError as e:
+        logger.warning(f"异步数据库驱动不可用，查询使用同步会话: {e}")
+        return None, None
+    
+    if settings.SQLITE_TUNING_ENABLED and async_engine.dialect.name == "sqlite":
+        configure_sqlite(async_engine.sync_engine)
+    monitor.instrument(async_engine.sync_engine)
+    
+    factory = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    return async_engine, factory
+
+
+async_engine, AsyncSessionLocal = create_async_session_factory(settings.DATABASE_URL, async_pool_monitor)
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -40,6 +153,43 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[ReadSession, None]:
+    """
+    获取只读查询使用的数据库会话
+    
+    DATABASE_ASYNC开启且异步驱动可用时返回AsyncSession，否则返回同步Session；
+    服务的 *_async 查询方法对同步会话会放到线程池执行，两种情况都不阻塞事件循环。
+    """
+    async with read_session(SessionLocal, AsyncSessionLocal) as db:
+        yield db
+
+
+@asynccontextmanager
+async def read_session(session_factory: sessionmaker, async_session_factory=None) -> AsyncIterator[ReadSession]:
+    """打开只读查询会话，有异步会话工厂时优先使用"""
+    if async_session_factory is None:
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+    
+    async with async_session_factory() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"数据库会话异常: {e}")
+            await db.rollback()
+            raise
+
+
+async def dispose_async_engine():
+    """关闭异步引擎的连接池"""
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 def create_tables():
     """创建所有数据表"""
     from app.db.base import Base
@@ -0,0 +1,197 @@
+"""
+单写线程队列
+
+SQLite同一时间只允许一个写事务，多个请求同时提交时互相等待锁，超过
+busy_timeout 就报 "database is locked"。开启队列后所有写操作交给一个写线程
+串行执行：写线程每次取出队列中已有的全部写操作（最多 max_batch 个），在同一个
+事务中依次执行后只提交一次，提交越慢合并得越多，不额外等待凑批。
+
+写操作是一个接收 Session 的函数，只执行语句不提交，返回值原样交给调用方。
+返回的ORM对象属于写线程的会话（提交后已分离），调用方应返回主键并用自己的
+会话重新读取。批次中某个写操作失败时回滚整个批次，其余写操作逐个重新执行并
+单独提交，失败只影响它自己的调用方。
+
+队列关闭时写操作直接在调用方的会话中执行并提交，行为与原来一致。
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.replicas import note_write
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+Job = Tuple[Callable[[Session], object], Future]
+
+
+class WriteQueue:
+    """单写线程队列"""
+    
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        max_batch: Optional[int] = None,
+        session_factory=None
+    ):
+        self.enabled = settings.WRITE_QUEUE_ENABLED if enabled is None else enabled
+        self.max_batch = max_batch or settings.WRITE_QUEUE_MAX_BATCH
+        self.session_factory = session_factory
+        
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.jobs = 0
+        self.commits = 0
+        self.failures = 0
+        self.retried_batches = 0
+        self.largest_batch = 0
+    
+    def execute(self, db: Session, work: Callable[[Session], T], read_your_writes: bool = True) -> T:
+        """执行写操作并提交，阻塞到提交完成
+        
+        队列开启时交给写线程执行，完成后提交调用方会话以结束其读事务，
+        之后读取能看到刚写入的数据；队列关闭时在调用方会话中执行。
+        read_your_writes 为True时当前请求之后的只读查询改走主库（读己之写）；
+        计数累加等不影响读取结果的写入传False，避免把读请求钉在主库。
+        """
+        if read_your_writes:
+            note_write()
+        if not self.enabled:
+            try:
+                result = work(db)
+                db.commit()
+                return result
+            except Exception:
+                db.rollback()
+                raise
+        
+        result = self.submit(work).result()
+        db.commit()
+        return result
+    
+    async def execute_async(self, db: Session, work: Callable[[Session], T], read_your_writes: bool = True) -> T:
+        """execute 的异步版本，等待写线程时不阻塞事件循环"""
+        if read_your_writes:
+            note_write()
+        if not self.enabled:
+            return self.execute(db, work, read_your_writes=False)
+        
+        result = await asyncio.wrap_future(self.submit(work))
+        db.commit()
+        return result
+    
+    def submit(self, work: Callable[[Session], T]) -> "Future[T]":
+        """把写操作放入队列，返回提交完成后得到结果的Future"""
+        self.start()
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+    
+    def start(self):
+        """启动写线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+        logger.info(f"单写线程已启动: 每批最多{self.max_batch}个写操作")
+    
+    def stop(self, timeout: float = 10.0):
+        """执行完已排队的写操作后停止写线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        
+        self._queue.put(None)
+        thread.join(timeout)
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "enabled": self.enabled,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": self._queue.qsize(),
+            "jobs": self.jobs,
+            "commits": self.commits,
+            "failures": self.failures,
+            "retried_batches": self.retried_batches,
+            "largest_batch": self.largest_batch,
+            "jobs_per_commit": round(self.jobs / self.commits, 2) if self.commits else 0.0
+        }
+    
+    def _run(self):
+        """写线程循环"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            
+            batch = [job]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                # 不应发生：_commit_batch 已把异常交给各个Future
+                logger.error(f"写线程处理批次失败: {e}")
+            if stopping:
+                return
+    
+    def _commit_batch(self, batch: List[Job]):
+        """在一个事务中执行整批写操作，失败时逐个重试"""
+        self.largest_batch = max(self.largest_batch, len(batch))
+        db = self._new_session()
+        try:
+            results = [work(db) for work, _ in batch]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if len(batch) == 1:
+                self.failures += 1
+                batch[0][1].set_exception(e)
+                return
+            self.retried_batches += 1
+            logger.warning(f"批量写入失败，逐个重试{len(batch)}个写操作: {e}")
+        else:
+            self.jobs += len(batch)
+            self.commits += 1
+            # 返回的对象交给其他线程，脱离写线程的会话
+            db.expunge_all()
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            return
+        finally:
+            db.close()
+        
+        for job in batch:
+            self._commit_batch([job])
+    
+    def _new_session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.session import engine
+            self.session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        return self.session_factory()
+
+
+# 全局写队列实例
+write_queue = WriteQueue()
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -15,6 +16,13 @@ from app.core.logging import setup_logging, get_logger
 from app.core.middleware import setup_middleware
 from app.core.response import APIResponse
 from app.core.exceptions import BaseCustomException
+from app.core.http_client import init_http_client, close_http_client
+from app.db.replicas import replica_router
+from app.db.session import dispose_async_engine
+from app.db.write_queue import write_queue
+from app.services.cache_service import cache, async_cache
+from app.services.counter_buffer import counter_buffer
+from app.services.joke_reservoir import joke_reservoir
 
 
 # 设置日志
@@ -40,6 +48,28 @@ async def startup_event():
     logger.info("应用启动中...")
     logger.info(f"环境: {settings.ENVIRONMENT}")
     logger.info(f"调试模式: {settings.DEBUG}")
+    
+    # 创建共享HTTP客户端（千问API连接池）
+    await init_http_client()
+    
+    # 创建异步Redis连接池
+    await async_cache.connect()
+    
+    # 订阅缓存失效通知（多worker间同步L1缓存）
+    cache.start_invalidation_listener()
+    
+    # 启动笑话蓄水池后台补充
+    await joke_reservoir.start()
+    
+    # 检测只读副本延迟
+    await replica_router.start()
+    
+    # 启动单写线程
+    if write_queue.enabled:
+        write_queue.start()
+    
+    # 启动计数器定期写回
+    await counter_buffer.start()
 
 
 # 关闭事件
@@ -47,6 +77,30 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("应用关闭中...")
+    
+    # 停止笑话蓄水池
+    await joke_reservoir.stop()
+    
+    # 写入剩余计数
+    await counter_buffer.stop()
+    
+    # 执行完排队的写操作后停止单写线程
+    await asyncio.to_thread(write_queue.stop)
+    
+    # 停止订阅缓存失效通知
+    cache.stop_invalidation_listener()
+    
+    # 关闭异步Redis连接池
+    await async_cache.close()
+    
+    # 停止副本检测并关闭副本连接池
+    await replica_router.stop()
+    
+    # 关闭异步数据库连接池
+    await dispose_async_engine()
+    
+    # 关闭共享HTTP客户端
+    await close_http_client()
 
 # 设置中间件
 setup_middleware(app)
@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, Boolean, Float
+from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, Boolean, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -13,6 +13,16 @@ from app.db.base import Base
 class Joke(Base):
     """笑话模型"""
     __tablename__ = "jokes"
+    __table_args__ = (
+        # 公开笑话列表：is_public = ? ORDER BY created_at DESC, id DESC
+        Index("ix_jokes_public_created", "is_public", "created_at", "id"),
+        # 按分类筛选的列表和分类计数
+        Index("ix_jokes_category_public_created", "category", "is_public", "created_at", "id"),
+        # 精选列表和精选计数
+        Index("ix_jokes_featured_public_created", "is_featured", "is_public", "created_at", "id"),
+        # 用户笑话历史
+        Index("ix_jokes_user_created", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, comment="笑话内容")
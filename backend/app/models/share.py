@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, DateTime, Integer, ForeignKey, Text
+from sqlalchemy import String, DateTime, Integer, ForeignKey, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -13,6 +13,14 @@ from app.db.base import Base
 class Share(Base):
     """分享记录模型"""
     __tablename__ = "shares"
+    __table_args__ = (
+        # 分享统计：按时间范围筛选，按平台分组、按笑话汇总时无需回表
+        Index("ix_shares_created_share_to_joke", "created_at", "share_to", "joke_id"),
+        # 用户分享记录
+        Index("ix_shares_user_created", "user_id", "created_at", "id"),
+        Index("ix_shares_joke_id", "joke_id"),
+        Index("ix_shares_share_url", "share_url"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     
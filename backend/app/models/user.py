@@ -3,7 +3,7 @@
 """
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import String, DateTime, Boolean, Text
+from sqlalchemy import String, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -13,6 +13,14 @@ from app.db.base import Base
 class User(Base):
     """用户模型"""
     __tablename__ = "users"
+    __table_args__ = (
+        # 用户列表
+        Index("ix_users_created", "created_at", "id"),
+        Index("ix_users_active_created", "is_active", "created_at", "id"),
+        # 生成/分享排行
+        Index("ix_users_total_generated", "total_generated"),
+        Index("ix_users_total_shared", "total_shared"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     openid: Mapped[str] = mapped_column(String(100), unique=True, index=True, comment="微信openid")
@@ -69,10 +69,12 @@ class JokeResponse(JokeInDB):
 class JokeListResponse(BaseModel):
     """笑话列表响应模型"""
     items: List[JokeResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = Field(None, description="下一页游标")
+    has_more: bool = Field(False, description="是否还有下一页")
 
 
 class ShareRequest(BaseModel):
@@ -4,13 +4,18 @@ AI服务 - 阿里千问API集成
 import json
 import random
 import asyncio
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, AsyncIterator
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
 
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.core.exceptions import JokeGenerationException, APIKeyException
+from app.core.exceptions import JokeGenerationException, APIKeyException, CircuitOpenException
+from app.core.http_client import get_http_client
+from app.services.circuit_breaker import CircuitBreaker, qwen_breaker
+from app.services.latency_tracker import LatencyTracker, qwen_latency
+from app.services.request_coalescer import generation_coalescer
 
 logger = get_logger(__name__)
 
@@ -18,11 +23,21 @@ logger = get_logger(__name__)
 class AIService:
     """AI服务类"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        latency: Optional[LatencyTracker] = None
+    ):
         self.api_key = settings.QWEN_API_KEY
         self.api_url = settings.QWEN_API_URL
         self.model = settings.QWEN_MODEL
         
+        # 默认使用应用级共享客户端，AIService实例按请求创建，连接池需比实例活得更久
+        self._client = client
+        self.breaker = breaker or qwen_breaker
+        self.latency = latency or qwen_latency
+        
         # 备用笑话库
         self.fallback_jokes = [
             "为什么程序员喜欢冷笑话？因为它们像代码一样冷！",
@@ -37,10 +52,16 @@ class AIService:
             "一个程序员的妻子让他去买牛奶，如果有鸡蛋的话买一打。他回来时买了一打牛奶。妻子问为什么，他说：'因为有鸡蛋。'"
         ]
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
+    @property
+    def is_configured(self) -> bool:
+        """是否配置了有效的API密钥"""
+        return bool(self.api_key) and self.api_key != "your_qwen_api_key_here"
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取HTTP客户端"""
+        return self._client or get_http_client()
+    
     async def generate_joke(
         self,
         prompt: str,
@@ -50,12 +71,21 @@ class AIService:
         """生成笑话"""
         
         # 如果没有API密钥，使用备用笑话
-        if not self.api_key or self.api_key == "your_qwen_api_key_here":
+        if not self.is_configured:
             logger.warning("未配置阿里千问API密钥，使用备用笑话")
             return self._get_fallback_joke()
         
         try:
+            if settings.QWEN_COALESCE_ENABLED:
+                # 相同提示词和参数的并发请求共享一次上游调用
+                return await generation_coalescer.run(
+                    (self.model, prompt, temperature, max_tokens),
+                    lambda n: self._call_qwen_api_choices(prompt, temperature, max_tokens, n)
+                )
             return await self._call_qwen_api(prompt, temperature, max_tokens)
+        except CircuitOpenException as e:
+            logger.warning(f"{e.detail}，使用备用笑话")
+            return self._get_fallback_joke()
         except Exception as e:
             logger.error(f"调用阿里千问API失败: {e}")
             logger.info("使用备用笑话")
@@ -68,13 +98,240 @@ class AIService:
         max_tokens: int
     ) -> str:
         """调用阿里千问API"""
+        choices = await self._call_qwen_api_choices(prompt, temperature, max_tokens)
+        return choices[0]
+    
+    async def _call_qwen_api_choices(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        n: int = 1
+    ) -> List[str]:
+        """调用阿里千问API，返回n个候选结果"""
+        # 重试只作用于上游调用本身；熔断打开或密钥无效时不重试
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(settings.QWEN_RETRY_ATTEMPTS),
+            wait=wait_exponential(multiplier=settings.QWEN_RETRY_BACKOFF, max=2),
+            retry=retry_if_exception(self._should_retry),
+            reraise=True
+        ):
+            with attempt:
+                return await self.breaker.call(
+                    self._request_qwen, prompt, temperature, max_tokens, n
+                )
+    
+    @staticmethod
+    def _should_retry(exc: BaseException) -> bool:
+        """判断异常是否值得重试"""
+        return not isinstance(exc, (CircuitOpenException, APIKeyException))
+    
+    async def _request_qwen(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        n: int = 1
+    ) -> List[str]:
+        """请求千问API，按配置使用自适应超时和对冲请求"""
+        timeout = self.latency.timeout()
+        hedge_delay = self.latency.hedge_delay()
+        
+        if hedge_delay is None:
+            return await self._timed_post(prompt, temperature, max_tokens, n, timeout)
+        
+        primary = asyncio.create_task(
+            self._timed_post(prompt, temperature, max_tokens, n, timeout)
+        )
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            # 调用方在等待期间被取消时，finally 会一并取消未完成的请求
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary.result()
+            
+            # 首个请求超过分位延迟仍未返回，发出对冲请求，取先成功的结果
+            self.latency.hedges_sent += 1
+            hedge = asyncio.create_task(
+                self._timed_post(prompt, temperature, max_tokens, n, timeout)
+            )
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.latency.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _timed_post(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        n: int,
+        timeout: Optional[float]
+    ) -> List[str]:
+        """发送请求并记录耗时"""
+        start = time.monotonic()
+        try:
+            if timeout is None:
+                result = await self._post_qwen(prompt, temperature, max_tokens, n)
+            else:
+                result = await asyncio.wait_for(
+                    self._post_qwen(prompt, temperature, max_tokens, n),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            # 超时按超时时长计入样本，避免分位数持续下降导致超时越来越短
+            self.latency.record(timeout)
+            self.latency.timeouts += 1
+            raise JokeGenerationException(f"API调用超时（自适应超时{timeout:.1f}秒）")
+        
+        self.latency.record(time.monotonic() - start)
+        return result
+    
+    async def _post_qwen(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        n: int = 1
+    ) -> List[str]:
+        """发送一次千问API请求"""
+        headers = self._build_headers(stream=False)
+        payload = self._build_payload(prompt, temperature, max_tokens, n)
+        
+        client = self.client
+        try:
+            response = await client.post(
+                self.api_url,
+                headers=headers,
+                json=payload
+            )
+            
+            if response.status_code == 401:
+                raise APIKeyException("API密钥无效")
+            
+            if response.status_code != 200:
+                raise JokeGenerationException(f"API调用失败，状态码: {response.status_code}")
+            
+            result = response.json()
+            
+            # 解析响应
+            if 'output' in result and 'choices' in result['output']:
+                choices = result['output']['choices']
+                contents = [
+                    choice.get('message', {}).get('content', '')
+                    for choice in choices or []
+                ]
+                contents = [self._clean_joke_content(content) for content in contents if content]
+                if contents:
+                    return contents
+            
+            # 如果解析失败，抛出异常
+            raise JokeGenerationException("API响应格式异常")
+            
+        except httpx.TimeoutException:
+            raise JokeGenerationException("API调用超时")
+        except httpx.RequestError as e:
+            raise JokeGenerationException(f"API请求错误: {str(e)}")
+    
+    async def stream_joke(
+        self,
+        prompt: str,
+        temperature: float = 0.8,
+        max_tokens: int = 200
+    ) -> AsyncIterator[str]:
+        """流式生成笑话，逐段返回增量内容"""
         
+        # 没有API密钥时，直接以一段备用笑话结束
+        if not self.is_configured:
+            yield self._get_fallback_joke()
+            return
+        
+        emitted = False
+        try:
+            # 流式调用同样计入熔断统计，熔断打开时在首次迭代前被拒绝
+            async for delta in self.breaker.stream(self._stream_qwen, prompt, temperature, max_tokens):
+                emitted = True
+                yield delta
+        except CircuitOpenException as e:
+            logger.warning(f"{e.detail}，使用备用笑话")
+            yield self._get_fallback_joke()
+        except Exception as e:
+            if emitted:
+                # 已经向客户端输出了部分内容，无法再替换为备用笑话
+                raise JokeGenerationException(f"流式生成中断: {getattr(e, 'detail', str(e))}")
+            logger.error(f"流式调用阿里千问API失败: {e}")
+            logger.info("使用备用笑话")
+            yield self._get_fallback_joke()
+    
+    async def _stream_qwen(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """以SSE方式调用千问API，逐段返回增量内容"""
+        headers = self._build_headers(stream=True)
+        payload = self._build_payload(prompt, temperature, max_tokens)
+        payload["parameters"]["incremental_output"] = True
+        
+        try:
+            async with self.client.stream(
+                "POST",
+                self.api_url,
+                headers=headers,
+                json=payload
+            ) as response:
+                if response.status_code == 401:
+                    raise APIKeyException("API密钥无效")
+                
+                if response.status_code != 200:
+                    raise JokeGenerationException(f"API调用失败，状态码: {response.status_code}")
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    result = json.loads(line[len("data:"):])
+                    choices = result.get("output", {}).get("choices") or []
+                    if choices:
+                        content = choices[0].get("message", {}).get("content", "")
+                        if content:
+                            yield content
+                
+        except httpx.TimeoutException:
+            raise JokeGenerationException("API调用超时")
+        except httpx.RequestError as e:
+            raise JokeGenerationException(f"API请求错误: {str(e)}")
+    
+    def _build_headers(self, stream: bool) -> Dict[str, str]:
+        """构建请求头"""
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json',
-            'X-DashScope-SSE': 'disable'
+            'X-DashScope-SSE': 'enable' if stream else 'disable'
         }
-        
+        if stream:
+            headers['Accept'] = 'text/event-stream'
+        return headers
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        n: int = 1
+    ) -> Dict[str, Any]:
+        """构建请求体"""
         payload = {
             "model": self.model,
             "input": {
@@ -93,41 +350,14 @@ class AIService:
                 "max_tokens": max_tokens,
                 "temperature": temperature,
                 "top_p": 0.8,
-                "repetition_penalty": 1.1
+                "repetition_penalty": 1.1,
+                # 响应解析依赖 output.choices 结构
+                "result_format": "message"
             }
         }
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload
-                )
-                
-                if response.status_code == 401:
-                    raise APIKeyException("API密钥无效")
-                
-                if response.status_code != 200:
-                    raise JokeGenerationException(f"API调用失败，状态码: {response.status_code}")
-                
-                result = response.json()
-                
-                # 解析响应
-                if 'output' in result and 'choices' in result['output']:
-                    choices = result['output']['choices']
-                    if choices and len(choices) > 0:
-                        content = choices[0].get('message', {}).get('content', '')
-                        if content:
-                            return self._clean_joke_content(content)
-                
-                # 如果解析失败，抛出异常
-                raise JokeGenerationException("API响应格式异常")
-                
-            except httpx.TimeoutException:
-                raise JokeGenerationException("API调用超时")
-            except httpx.RequestError as e:
-                raise JokeGenerationException(f"API请求错误: {str(e)}")
+        if n > 1:
+            payload["parameters"]["n"] = n
+        return payload
     
     def _get_fallback_joke(self) -> str:
         """获取备用笑话"""
@@ -152,7 +382,7 @@ class AIService:
     
     async def test_api_connection(self) -> Dict[str, Any]:
         """测试API连接"""
-        if not self.api_key or self.api_key == "your_qwen_api_key_here":
+        if not self.is_configured:
             return {
                 "status": "error",
                 "message": "API密钥未配置",
@@ -0,0 +1,196 @@
+"""
+服务方法读穿缓存装饰器
+
+按参数生成缓存键，键中嵌入所依赖命名空间的代数（见 CacheNamespace），
+支持按方法设置TTL、TTL随机抖动、未找到结果的负缓存，以及通过请求头
+跳过缓存（调试用）。读取经 get_or_compute，自带防击穿保护。
+设置 fallback 时方法抛出的异常转为降级结果返回，降级结果不写入缓存。
+协程方法使用异步缓存服务，与同名参数的同步方法共用缓存键。
+"""
+import functools
+import hashlib
+import inspect
+import json
+import random
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.cache_service import async_cache, cache
+
+logger = get_logger(__name__)
+
+# 当前请求是否跳过缓存，由 CacheBypassMiddleware 设置
+cache_bypass: ContextVar[bool] = ContextVar("cache_bypass", default=False)
+
+
+class MethodCacheStats:
+    """单个方法的缓存统计"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.bypasses = 0
+    
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "bypasses": self.bypasses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+_method_stats: Dict[str, MethodCacheStats] = {}
+
+
+def get_method_cache_stats() -> Dict[str, dict]:
+    """按方法导出缓存统计"""
+    return {name: stats.to_dict() for name, stats in _method_stats.items()}
+
+
+def _jittered_ttl(ttl: int, jitter: float) -> int:
+    """在TTL上加随机抖动，避免同一批键同时过期"""
+    if jitter <= 0:
+        return ttl
+    return max(1, int(ttl * random.uniform(1 - jitter, 1 + jitter)))
+
+
+def _arguments_digest(arguments: Dict[str, Any]) -> str:
+    """参数摘要，作为缓存键的一部分"""
+    raw = json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def cached(
+    prefix: str,
+    ttl: Optional[int] = None,
+    namespaces: Optional[Callable[[Dict[str, Any]], List[str]]] = None,
+    model: Optional[Type[BaseModel]] = None,
+    negative_ttl: Optional[int] = None,
+    jitter: Optional[float] = None,
+    fallback: Optional[Callable[[Dict[str, Any]], Any]] = None
+):
+    """服务方法读穿缓存
+    
+    Args:
+        prefix: 缓存键前缀
+        ttl: 缓存时间（秒），默认 CACHE_EXPIRE_TIME
+        namespaces: 根据参数返回所依赖的命名空间，命名空间代数变化后缓存失效
+        model: 返回值的Pydantic模型，缓存命中时据此还原
+        negative_ttl: 返回None时的缓存时间，默认 CACHE_NEGATIVE_TTL
+        jitter: TTL抖动比例，默认 CACHE_TTL_JITTER
+        fallback: 根据参数返回方法出错时的降级结果，未设置时异常照常抛出
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        name = func.__qualname__
+        stats = _method_stats.setdefault(name, MethodCacheStats(name))
+        
+        def bind(self, args, kwargs) -> Dict[str, Any]:
+            """除self外的参数（含默认值）"""
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            return dict(list(bound.arguments.items())[1:])
+        
+        def cache_key(self, args, kwargs) -> Tuple[str, List[str]]:
+            """缓存键和所依赖的命名空间"""
+            arguments = bind(self, args, kwargs)
+            key = f"{prefix}:{_arguments_digest(arguments)}"
+            return key, namespaces(arguments) if namespaces is not None else []
+        
+        def fall_back(self, args, kwargs, error: Exception) -> Any:
+            """方法出错时返回降级结果；异常已穿过 get_or_compute，不会写入缓存"""
+            logger.error(f"{name} 执行失败，返回降级结果: {error}")
+            return fallback(bind(self, args, kwargs))
+        
+        def options() -> dict:
+            return {
+                "ttl": _jittered_ttl(ttl or settings.CACHE_EXPIRE_TIME, settings.CACHE_TTL_JITTER if jitter is None else jitter),
+                "negative_ttl": settings.CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+            }
+        
+        def restore(value: Any, computed: bool) -> Any:
+            """统计命中情况，命中时按模型还原"""
+            if computed:
+                stats.misses += 1
+                return value
+            
+            stats.hits += 1
+            if value is None:
+                stats.negative_hits += 1
+                return None
+            return model.model_validate(value) if model is not None else value
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                try:
+                    return await async_lookup(self, *args, **kwargs)
+                except Exception as e:
+                    if fallback is None:
+                        raise
+                    return fall_back(self, args, kwargs, e)
+            
+            async def async_lookup(self, *args, **kwargs):
+                if cache_bypass.get() or not async_cache.enabled:
+                    stats.bypasses += 1
+                    return await func(self, *args, **kwargs)
+                
+                key, key_namespaces = cache_key(self, args, kwargs)
+                if key_namespaces:
+                    key = await async_cache.versioned_key(key, *key_namespaces)
+                
+                computed = False
+                
+                async def compute():
+                    nonlocal computed
+                    computed = True
+                    return await func(self, *args, **kwargs)
+                
+                value = await async_cache.get_or_compute(key, compute, **options())
+                return restore(value, computed)
+            
+            async_wrapper.uncached = func
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return lookup(self, *args, **kwargs)
+            except Exception as e:
+                if fallback is None:
+                    raise
+                return fall_back(self, args, kwargs, e)
+        
+        def lookup(self, *args, **kwargs):
+            if cache_bypass.get() or not cache.enabled:
+                stats.bypasses += 1
+                return func(self, *args, **kwargs)
+            
+            key, key_namespaces = cache_key(self, args, kwargs)
+            if key_namespaces:
+                key = cache.versioned_key(key, *key_namespaces)
+            
+            computed = False
+            
+            def compute():
+                nonlocal computed
+                computed = True
+                return func(self, *args, **kwargs)
+            
+            value = cache.get_or_compute(key, compute, **options())
+            return restore(value, computed)
+        
+        # 未经缓存的原函数
+        wrapper.uncached = func
+        return wrapper
+    
+    return decorator
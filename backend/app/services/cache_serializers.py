@@ -0,0 +1,227 @@
+"""
+缓存序列化
+
+序列化器注册表（orjson / msgpack / json / pickle）加可选压缩（zstd / lz4 / zlib）。
+写入Redis的数据带3字节帧头：魔数、序列化器编号、压缩编号，读取时据此选择
+解码方式；没有帧头的旧数据按调用方指定的旧格式（pickle或json）解码。
+序列化器按缓存键的命名空间（第一个冒号之前的部分）选择。JSON格式缓存
+未压缩时不加帧头，与旧数据和其他客户端保持兼容。
+"""
+import json
+import pickle
+import zlib
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+# 可选导入 orjson
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 可选导入 msgpack
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# 可选导入 zstandard
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 可选导入 lz4
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+# 帧头魔数，pickle以0x80开头、JSON以可打印字符开头，不会冲突
+MAGIC = 0xCA
+
+
+def _default(value: Any) -> Any:
+    """JSON类序列化器无法直接处理的类型"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+class Serializer:
+    """序列化器"""
+    
+    def __init__(self, name: str, code: int, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]):
+        self.name = name
+        self.code = code
+        self.dumps = dumps
+        self.loads = loads
+
+
+class Compressor:
+    """压缩器"""
+    
+    def __init__(self, name: str, code: int, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]):
+        self.name = name
+        self.code = code
+        self.compress = compress
+        self.decompress = decompress
+
+
+_serializers: Dict[str, Serializer] = {}
+_serializers_by_code: Dict[int, Serializer] = {}
+_compressors: Dict[str, Compressor] = {}
+_compressors_by_code: Dict[int, Compressor] = {}
+
+
+def register_serializer(serializer: Serializer):
+    """注册序列化器"""
+    _serializers[serializer.name] = serializer
+    _serializers_by_code[serializer.code] = serializer
+
+
+def register_compressor(compressor: Compressor):
+    """注册压缩器"""
+    _compressors[compressor.name] = compressor
+    _compressors_by_code[compressor.code] = compressor
+
+
+def available_serializers() -> list:
+    """已注册的序列化器名称"""
+    return list(_serializers)
+
+
+def available_compressors() -> list:
+    """已注册的压缩器名称"""
+    return list(_compressors)
+
+
+register_serializer(Serializer(
+    "pickle", 1,
+    lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+    pickle.loads
+))
+register_serializer(Serializer(
+    "json", 2,
+    lambda value: json.dumps(value, ensure_ascii=False, default=_default).encode("utf-8"),
+    lambda data: json.loads(data.decode("utf-8"))
+))
+if ORJSON_AVAILABLE:
+    register_serializer(Serializer(
+        "orjson", 3,
+        lambda value: orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads
+    ))
+if MSGPACK_AVAILABLE:
+    register_serializer(Serializer(
+        "msgpack", 4,
+        lambda value: msgpack.packb(value, default=_default, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    ))
+
+register_compressor(Compressor("none", 0, lambda data: data, lambda data: data))
+register_compressor(Compressor("zlib", 1, lambda data: zlib.compress(data, 6), zlib.decompress))
+if ZSTD_AVAILABLE:
+    register_compressor(Compressor(
+        "zstd", 2,
+        zstandard.ZstdCompressor(level=3).compress,
+        zstandard.ZstdDecompressor().decompress
+    ))
+if LZ4_AVAILABLE:
+    register_compressor(Compressor("lz4", 3, lz4.frame.compress, lz4.frame.decompress))
+
+
+class CacheCodec:
+    """缓存编解码器"""
+    
+    def __init__(
+        self,
+        default: Optional[str] = None,
+        namespaces: Optional[Dict[str, str]] = None,
+        compression: Optional[str] = None,
+        compression_min_bytes: Optional[int] = None
+    ):
+        self.default = self._resolve_serializer(default or settings.CACHE_SERIALIZER)
+        self.namespaces = {
+            namespace: self._resolve_serializer(name)
+            for namespace, name in (settings.CACHE_NAMESPACE_SERIALIZERS if namespaces is None else namespaces).items()
+        }
+        self.compressor = self._resolve_compressor(compression or settings.CACHE_COMPRESSION)
+        self.compression_min_bytes = (
+            settings.CACHE_COMPRESSION_MIN_BYTES if compression_min_bytes is None else compression_min_bytes
+        )
+    
+    @property
+    def json_serializer(self) -> Serializer:
+        """JSON格式使用的序列化器"""
+        return _serializers["orjson"] if ORJSON_AVAILABLE else _serializers["json"]
+    
+    def serializer_for(self, key: str) -> Serializer:
+        """按命名空间选择序列化器"""
+        namespace = key.split(":", 1)[0]
+        return self.namespaces.get(namespace, self.default)
+    
+    def encode(self, key: str, value: Any, serializer: Optional[Serializer] = None, bare: bool = False) -> bytes:
+        """序列化并按需压缩，返回带帧头的数据
+        
+        bare为True且未压缩时省略帧头，保持JSON原文，便于INCRBY等命令和其他客户端直接读取。
+        """
+        serializer = serializer or self.serializer_for(key)
+        payload = serializer.dumps(value)
+        
+        compressor = _compressors["none"]
+        if self.compressor.code and len(payload) >= self.compression_min_bytes:
+            compressed = self.compressor.compress(payload)
+            if len(compressed) < len(payload):
+                compressor = self.compressor
+                payload = compressed
+        
+        if bare and not compressor.code:
+            return payload
+        return bytes((MAGIC, serializer.code, compressor.code)) + payload
+    
+    def decode(self, data: bytes, legacy: str = "pickle") -> Any:
+        """根据帧头解码；无帧头的旧数据按legacy格式解码"""
+        if len(data) < 3 or data[0] != MAGIC:
+            return _serializers[legacy].loads(data)
+        
+        serializer = _serializers_by_code.get(data[1])
+        compressor = _compressors_by_code.get(data[2])
+        if serializer is None or compressor is None:
+            raise ValueError(f"不支持的缓存数据格式: serializer={data[1]} compression={data[2]}")
+        return serializer.loads(compressor.decompress(data[3:]))
+    
+    def _resolve_serializer(self, name: str) -> Serializer:
+        """查找序列化器，未安装时回退到json"""
+        serializer = _serializers.get(name)
+        if serializer is None:
+            logger.warning(f"缓存序列化器{name}不可用，使用json")
+            serializer = _serializers["json"]
+        return serializer
+    
+    def _resolve_compressor(self, name: str) -> Compressor:
+        """查找压缩器，未安装时回退到zlib"""
+        compressor = _compressors.get(name)
+        if compressor is None:
+            logger.warning(f"缓存压缩算法{name}不可用，使用zlib")
+            compressor = _compressors["zlib"]
+        return compressor
+
+
+# 全局编解码器
+cache_codec = CacheCodec()
@@ -1,24 +1,326 @@
 """
 缓存服务
+
+两级缓存：进程内LRU（L1）在前，Redis（L2）在后。写入和删除通过Redis
+发布订阅通知其他worker丢弃各自的L1副本。
+
+get_or_compute 提供防击穿读取：XFetch概率提前刷新，加上 SET NX PX
+分布式锁保证同一时间只有一个worker重新计算，其他worker返回旧值。
+
+版本化命名空间：每个命名空间有一个代数计数器，缓存键中嵌入所依赖命名空间
+的当前代数，递增计数器即可让整组缓存失效，无需扫描键空间。
 """
+import asyncio
+import fnmatch
+import inspect
 import json
-import pickle
-from typing import Any, Optional, Union
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple, Union
 from redis import Redis
+from redis.asyncio import ConnectionPool as AsyncConnectionPool
+from redis.asyncio import Redis as AsyncRedis
 from redis.exceptions import RedisError
 
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.services.cache_serializers import cache_codec
 
 logger = get_logger(__name__)
 
+# 释放锁时校验令牌，避免删掉锁过期后其他worker重新获取的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
-class CacheService:
-    """缓存服务类"""
+
+async def _resolve(result: Union[Any, Awaitable[Any]]) -> Any:
+    """兼容同步和异步的计算函数"""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class StampedeStats:
+    """防击穿统计"""
     
     def __init__(self):
+        self.recomputes = 0
+        self.early_refreshes = 0
+        self.stale_served = 0
+        self.lock_waits = 0
+    
+    def to_dict(self) -> dict:
+        return {
+            "recomputes": self.recomputes,
+            "early_refreshes": self.early_refreshes,
+            "stale_served": self.stale_served,
+            "lock_waits": self.lock_waits
+        }
+
+
+class CacheNamespace:
+    """缓存命名空间"""
+    
+    # 不带分类筛选的笑话列表
+    JOKE_LISTS = "jokes:list:all"
+    SHARE_STATS = "shares:stats"
+    USER_STATS = "users:stats"
+    
+    VERSION_PREFIX = "ns"
+    
+    @staticmethod
+    def joke_category(category: str) -> str:
+        """按分类筛选的笑话列表"""
+        return f"jokes:list:category:{category}"
+    
+    @staticmethod
+    def user_jokes(user_id: int) -> str:
+        """用户的笑话列表"""
+        return f"jokes:user:{user_id}"
+    
+    @classmethod
+    def version_key(cls, namespace: str) -> str:
+        """命名空间代数计数器的键"""
+        return f"{cls.VERSION_PREFIX}:{namespace}"
+    
+    @staticmethod
+    def build_key(key: str, versions: List[int]) -> str:
+        """在键中嵌入各命名空间的代数"""
+        return f"{key}:v" + ".".join(str(version) for version in versions)
+
+
+class LocalCache:
+    """进程内LRU缓存，带容量上限和TTL"""
+    
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        # 失效通知在订阅线程中处理，需要加锁
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """获取缓存"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+    
+    def set(self, key: str, data: bytes, expire: Optional[int] = None):
+        """设置缓存，存活时间不超过L1的TTL"""
+        ttl = min(expire, self.ttl) if expire else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, data)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str):
+        """删除缓存"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def delete_pattern(self, pattern: str) -> int:
+        """删除匹配glob模式的缓存"""
+        with self._lock:
+            keys = [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+class BaseCacheService:
+    """同步与异步缓存服务的公共部分
+    
+    键构造、序列化、XFetch计算、L1读写和统计都在这里实现，
+    子类只负责各自的Redis I/O，避免两份实现逐渐不一致。
+    """
+    
+    LOCK_PREFIX = "lock"
+    
+    def __init__(self, local: Optional[LocalCache] = None, instance_id: Optional[str] = None):
         self.redis_client = None
+        self.enabled = False
+        self.local = local
+        
+        # 失效通知
+        self.instance_id = instance_id or uuid.uuid4().hex
+        self.channel = settings.CACHE_INVALIDATION_CHANNEL
+        
+        # 二级缓存统计
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.stampede = StampedeStats()
+    
+    @staticmethod
+    def _expire_time(expire: Optional[int]) -> int:
+        return expire or settings.CACHE_EXPIRE_TIME
+    
+    @staticmethod
+    def _encode(key: str, value: Any) -> bytes:
+        return cache_codec.encode(key, value)
+    
+    @staticmethod
+    def _encode_json(key: str, value: dict) -> bytes:
+        return cache_codec.encode(key, value, cache_codec.json_serializer, bare=True)
+    
+    @staticmethod
+    def _decode(data: Optional[bytes], legacy: str = "pickle") -> Optional[Any]:
+        return cache_codec.decode(data, legacy=legacy) if data else None
+    
+    @staticmethod
+    def _parse_version(data: Optional[bytes]) -> int:
+        return int(data) if data else 0
+    
+    @classmethod
+    def _lock_key(cls, key: str) -> str:
+        return f"{cls.LOCK_PREFIX}:{key}"
+    
+    @staticmethod
+    def _stampede_options(
+        ttl: Optional[int],
+        beta: Optional[float],
+        stale_ttl: Optional[int]
+    ) -> Tuple[int, float, int]:
+        """补全get_or_compute参数的默认值"""
+        return (
+            ttl or settings.CACHE_EXPIRE_TIME,
+            settings.CACHE_XFETCH_BETA if beta is None else beta,
+            settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        )
+    
+    @staticmethod
+    def _should_refresh(entry: dict, beta: float) -> bool:
+        """XFetch：越接近过期、重新计算越慢，越可能提前刷新"""
+        jitter = -entry["delta"] * beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= entry["expires_at"]
+    
+    @staticmethod
+    def _is_newer(current: Optional[dict], entry: Optional[dict]) -> bool:
+        """拿到锁前其他worker是否已完成刷新"""
+        return current is not None and current["expires_at"] > (entry["expires_at"] if entry else 0)
+    
+    def _make_entry(
+        self,
+        value: Any,
+        delta: float,
+        ttl: int,
+        stale_ttl: int,
+        entry: Optional[dict],
+        negative_ttl: Optional[int] = None
+    ) -> Tuple[dict, int]:
+        """记录重新计算并构造带计算耗时和逻辑过期时间的缓存条目
+        
+        返回条目和Redis过期时间：旧值在逻辑过期后还保留stale_ttl秒，结果为None时使用negative_ttl。
+        """
+        self.stampede.recomputes += 1
+        if entry is not None and time.time() < entry["expires_at"]:
+            self.stampede.early_refreshes += 1
+        if value is None and negative_ttl:
+            ttl = negative_ttl
+        return {"value": value, "delta": delta, "expires_at": time.time() + ttl}, ttl + stale_ttl
+    
+    def _invalidation_message(self, key: str, is_pattern: bool) -> str:
+        return json.dumps({
+            "origin": self.instance_id,
+            "op": "pattern" if is_pattern else "key",
+            "value": key
+        })
+    
+    def _drop_local(self, key: str, is_pattern: bool = False):
+        """丢弃本进程的L1副本"""
+        if is_pattern:
+            self.local.delete_pattern(key)
+        else:
+            self.local.delete(key)
+    
+    def _get_local(self, key: str) -> Optional[bytes]:
+        """查L1"""
+        if self.local is not None:
+            return self.local.get(key)
+        return None
+    
+    def _record_l2(self, key: str, data: Optional[bytes]) -> Optional[bytes]:
+        """统计Redis读取结果，命中时回填L1"""
+        if data is None:
+            self.l2_misses += 1
+            return None
+        
+        self.l2_hits += 1
+        self._set_local(key, data)
+        return data
+    
+    def _set_local(self, key: str, data: bytes, expire: Optional[int] = None):
+        """写入L1"""
+        if self.local is not None:
+            self.local.set(key, data, expire)
+    
+    def _stats_payload(self, info: dict) -> dict:
+        """由Redis INFO和本地统计构造统计信息"""
+        return {
+            "enabled": True,
+            "connected_clients": info.get("connected_clients", 0),
+            "used_memory": info.get("used_memory_human", "0B"),
+            "keyspace_hits": info.get("keyspace_hits", 0),
+            "keyspace_misses": info.get("keyspace_misses", 0),
+            "total_commands_processed": info.get("total_commands_processed", 0),
+            "l1": self.local.get_stats() if self.local else {"enabled": False},
+            "l2": {"hits": self.l2_hits, "misses": self.l2_misses},
+            "stampede": self.stampede.to_dict()
+        }
+
+
+class CacheService(BaseCacheService):
+    """缓存服务类"""
+    
+    def __init__(self):
+        # 进程内一级缓存
+        local = None
+        if settings.CACHE_L1_ENABLED:
+            local = LocalCache(settings.CACHE_L1_MAX_SIZE, settings.CACHE_L1_TTL)
+        super().__init__(local)
+        
         self.enabled = settings.ENABLE_CACHE
+        self._pubsub = None
+        self._listener = None
         
         if self.enabled:
             try:
@@ -42,10 +344,7 @@ class CacheService:
             return None
         
         try:
-            data = self.redis_client.get(key)
-            if data:
-                return pickle.loads(data)
-            return None
+            return self._decode(self._get_raw(key))
         except RedisError as e:
             logger.error(f"获取缓存失败: {e}")
             return None
@@ -64,11 +363,7 @@ class CacheService:
             return False
         
         try:
-            data = pickle.dumps(value)
-            expire_time = expire or settings.CACHE_EXPIRE_TIME
-            
-            result = self.redis_client.setex(key, expire_time, data)
-            return bool(result)
+            return self._set_raw(key, self._encode(key, value), self._expire_time(expire))
         except RedisError as e:
             logger.error(f"设置缓存失败: {e}")
             return False
@@ -83,6 +378,7 @@ class CacheService:
         
         try:
             result = self.redis_client.delete(key)
+            self.invalidate_local(key)
             return bool(result)
         except RedisError as e:
             logger.error(f"删除缓存失败: {e}")
@@ -105,14 +401,11 @@ class CacheService:
             return None
         
         try:
-            data = self.redis_client.get(key)
-            if data:
-                return json.loads(data.decode('utf-8'))
-            return None
+            return self._decode(self._get_raw(key), legacy="json")
         except RedisError as e:
             logger.error(f"获取JSON缓存失败: {e}")
             return None
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             logger.error(f"JSON解析失败: {e}")
             return None
     
@@ -127,15 +420,11 @@ class CacheService:
             return False
         
         try:
-            data = json.dumps(value, ensure_ascii=False)
-            expire_time = expire or settings.CACHE_EXPIRE_TIME
-            
-            result = self.redis_client.setex(key, expire_time, data)
-            return bool(result)
+            return self._set_raw(key, self._encode_json(key, value), self._expire_time(expire))
         except RedisError as e:
             logger.error(f"设置JSON缓存失败: {e}")
             return False
-        except json.JSONEncodeError as e:
+        except (TypeError, ValueError) as e:
             logger.error(f"JSON序列化失败: {e}")
             return False
     
@@ -145,7 +434,10 @@ class CacheService:
             return None
         
         try:
-            return self.redis_client.incrby(key, amount)
+            # 先写入再通知，避免其他worker在写入前重新读到旧值
+            result = self.redis_client.incrby(key, amount)
+            self.invalidate_local(key)
+            return result
         except RedisError as e:
             logger.error(f"递增计数器失败: {e}")
             return None
@@ -156,6 +448,7 @@ class CacheService:
             return False
         
         try:
+            self.invalidate_local(key)
             return bool(self.redis_client.expire(key, seconds))
         except RedisError as e:
             logger.error(f"设置过期时间失败: {e}")
@@ -167,33 +460,615 @@ class CacheService:
             return 0
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return self.redis_client.delete(*keys)
-            return 0
+            self.invalidate_local(pattern, is_pattern=True)
+            # 使用SCAN游标分批查找，UNLINK在后台释放内存，避免KEYS阻塞Redis
+            deleted = 0
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=settings.CACHE_SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= settings.CACHE_SCAN_BATCH_SIZE:
+                    deleted += self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis_client.unlink(*batch)
+            return deleted
         except RedisError as e:
             logger.error(f"清除模式缓存失败: {e}")
             return 0
     
+    def namespace_version(self, namespace: str) -> int:
+        """获取命名空间当前代数，缓存不可用时返回0"""
+        if not self.enabled or not self.redis_client:
+            return 0
+        
+        try:
+            return self._parse_version(self._get_raw(CacheNamespace.version_key(namespace)))
+        except (RedisError, ValueError) as e:
+            logger.error(f"获取命名空间版本失败: {e}")
+            return 0
+    
+    def versioned_key(self, key: str, *namespaces: str) -> str:
+        """生成嵌入命名空间代数的缓存键"""
+        return CacheNamespace.build_key(key, [self.namespace_version(namespace) for namespace in namespaces])
+    
+    def bump_namespace(self, *namespaces: str):
+        """递增命名空间代数，使其下所有缓存失效"""
+        for namespace in dict.fromkeys(namespaces):
+            self.increment(CacheNamespace.version_key(namespace))
+    
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: Optional[int] = None,
+        beta: Optional[float] = None,
+        stale_ttl: Optional[int] = None,
+        negative_ttl: Optional[int] = None
+    ) -> Any:
+        """读取缓存，未命中或需要提前刷新时只由一个worker重新计算
+        
+        计算结果需可被缓存序列化器编码（Pydantic对象会转换为字典）。
+        异步接口请使用 AsyncCacheService，这里等待锁时会阻塞当前线程。
+        """
+        if not self.enabled or not self.redis_client:
+            return compute()
+        
+        ttl, beta, stale_ttl = self._stampede_options(ttl, beta, stale_ttl)
+        
+        entry = self.get(key)
+        if entry is not None and not self._should_refresh(entry, beta):
+            return entry["value"]
+        
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_MS / 1000
+        while True:
+            if self._acquire_lock(lock_key, token):
+                try:
+                    current = self.get(key)
+                    if self._is_newer(current, entry):
+                        return current["value"]
+                    return self._recompute(key, compute, ttl, stale_ttl, entry, negative_ttl)
+                finally:
+                    self._release_lock(lock_key, token)
+            
+            if entry is not None:
+                self.stampede.stale_served += 1
+                return entry["value"]
+            
+            # 没有旧值可返回，等待持锁worker写入结果
+            self.stampede.lock_waits += 1
+            time.sleep(settings.CACHE_LOCK_WAIT_MS / 1000)
+            current = self.get(key)
+            if current is not None:
+                return current["value"]
+            if time.monotonic() >= deadline:
+                # 持锁worker可能已退出，不再等待
+                return self._recompute(key, compute, ttl, stale_ttl, entry, negative_ttl)
+    
     def get_stats(self) -> dict:
         """获取缓存统计信息"""
         if not self.enabled or not self.redis_client:
             return {"enabled": False}
         
         try:
-            info = self.redis_client.info()
-            return {
-                "enabled": True,
-                "connected_clients": info.get("connected_clients", 0),
-                "used_memory": info.get("used_memory_human", "0B"),
-                "keyspace_hits": info.get("keyspace_hits", 0),
-                "keyspace_misses": info.get("keyspace_misses", 0),
-                "total_commands_processed": info.get("total_commands_processed", 0)
+            return self._stats_payload(self.redis_client.info())
+        except RedisError as e:
+            logger.error(f"获取缓存统计失败: {e}")
+            return {"enabled": True, "error": str(e)}
+    
+    def invalidate_local(self, key: str, is_pattern: bool = False, publish: bool = True):
+        """丢弃本进程的L1副本，并通知其他worker"""
+        if self.local is None:
+            return
+        
+        self._drop_local(key, is_pattern)
+        
+        if publish and self.enabled and self.redis_client:
+            try:
+                self.redis_client.publish(self.channel, self._invalidation_message(key, is_pattern))
+            except RedisError as e:
+                logger.error(f"发布缓存失效通知失败: {e}")
+    
+    def start_invalidation_listener(self):
+        """订阅失效通知（应用启动时调用）"""
+        if self.local is None or not self.enabled or not self.redis_client or self._listener:
+            return
+        
+        try:
+            self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.channel: self._handle_invalidation})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            logger.info(f"已订阅缓存失效频道: {self.channel}")
+        except RedisError as e:
+            logger.error(f"订阅缓存失效频道失败: {e}")
+            self._pubsub = None
+    
+    def stop_invalidation_listener(self):
+        """停止订阅失效通知（应用关闭时调用）"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+    
+    def _handle_invalidation(self, message: dict):
+        """处理其他worker发来的失效通知"""
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError) as e:
+            logger.error(f"解析缓存失效通知失败: {e}")
+            return
+        
+        if payload.get("origin") == self.instance_id:
+            return
+        
+        self.invalidate_local(
+            payload.get("value", ""),
+            is_pattern=payload.get("op") == "pattern",
+            publish=False
+        )
+    
+    def _acquire_lock(self, lock_key: str, token: str) -> bool:
+        """SET NX PX 获取分布式锁"""
+        try:
+            return bool(self.redis_client.set(
+                lock_key, token, nx=True, px=settings.CACHE_LOCK_TIMEOUT_MS
+            ))
+        except RedisError as e:
+            logger.error(f"获取缓存锁失败: {e}")
+            return True
+    
+    def _release_lock(self, lock_key: str, token: str):
+        """释放分布式锁"""
+        try:
+            self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            logger.error(f"释放缓存锁失败: {e}")
+    
+    def _recompute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: int,
+        stale_ttl: int,
+        entry: Optional[dict],
+        negative_ttl: Optional[int] = None
+    ) -> Any:
+        """重新计算并写入"""
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        
+        new_entry, expire = self._make_entry(value, delta, ttl, stale_ttl, entry, negative_ttl)
+        self.set(key, new_entry, expire=expire)
+        return value
+    
+    def _get_raw(self, key: str) -> Optional[bytes]:
+        """先查L1，未命中再查Redis并回填L1"""
+        data = self._get_local(key)
+        if data is not None:
+            return data
+        return self._record_l2(key, self.redis_client.get(key))
+    
+    def _set_raw(self, key: str, data: bytes, expire: int) -> bool:
+        """写入Redis，通知其他worker后回填本进程L1"""
+        result = self.redis_client.setex(key, expire, data)
+        self.invalidate_local(key)
+        self._set_local(key, data, expire)
+        return bool(result)
+
+
+class CacheClearJob:
+    """后台模式清除任务"""
+    
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    
+    def __init__(self, pattern: str):
+        self.id = uuid.uuid4().hex
+        self.pattern = pattern
+        self.status = self.PENDING
+        self.scanned = 0
+        self.deleted = 0
+        self.batches = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+    
+    def finish(self, error: Optional[str] = None):
+        """标记任务结束"""
+        self.status = self.FAILED if error else self.COMPLETED
+        self.error = error
+        self.finished_at = time.time()
+    
+    def to_dict(self) -> dict:
+        """转换为响应数据"""
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "pattern": self.pattern,
+            "status": self.status,
+            "scanned": self.scanned,
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "error": self.error,
+            "elapsed_seconds": round(end - self.started_at, 3)
+        }
+
+
+class AsyncCacheService(BaseCacheService):
+    """异步缓存服务类
+    
+    基于 redis.asyncio 和共享连接池，供异步接口使用，不阻塞事件循环。
+    与同步缓存共用L1和失效通知的实例ID，同步版本保留给脚本使用。
+    """
+    
+    MAX_JOBS = 50
+    
+    def __init__(self, local: Optional[LocalCache] = None, instance_id: Optional[str] = None):
+        super().__init__(local, instance_id)
+        self.redis_client: Optional[AsyncRedis] = None
+        self.pool: Optional[AsyncConnectionPool] = None
+        
+        # 后台清除任务，只保留最近的若干个
+        self._jobs: "OrderedDict[str, CacheClearJob]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def connect(self):
+        """创建连接池并测试连接（应用启动时调用）"""
+        if not settings.ENABLE_CACHE or self.redis_client is not None:
+            return
+        
+        try:
+            self.pool = AsyncConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=5,
+                socket_timeout=5
+            )
+            self.redis_client = AsyncRedis(connection_pool=self.pool)
+            await self.redis_client.ping()
+            self.enabled = True
+            logger.info("异步Redis连接成功")
+        except Exception as e:
+            logger.warning(f"异步Redis连接失败: {e}，缓存功能将被禁用")
+            await self.close()
+    
+    async def close(self):
+        """关闭连接池（应用关闭时调用）"""
+        self.enabled = False
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+            self.redis_client = None
+        if self.pool is not None:
+            await self.pool.disconnect()
+            self.pool = None
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存"""
+        if not self.enabled or not self.redis_client:
+            return None
+        
+        try:
+            return self._decode(await self._get_raw(key))
+        except RedisError as e:
+            logger.error(f"获取缓存失败: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"反序列化缓存数据失败: {e}")
+            return None
+    
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        expire: Optional[int] = None
+    ) -> bool:
+        """设置缓存"""
+        if not self.enabled or not self.redis_client:
+            return False
+        
+        try:
+            return await self._set_raw(key, self._encode(key, value), self._expire_time(expire))
+        except RedisError as e:
+            logger.error(f"设置缓存失败: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"序列化缓存数据失败: {e}")
+            return False
+    
+    async def delete(self, key: str) -> bool:
+        """删除缓存"""
+        if not self.enabled or not self.redis_client:
+            return False
+        
+        try:
+            result = await self.redis_client.delete(key)
+            await self.invalidate_local(key)
+            return bool(result)
+        except RedisError as e:
+            logger.error(f"删除缓存失败: {e}")
+            return False
+    
+    async def exists(self, key: str) -> bool:
+        """检查缓存是否存在"""
+        if not self.enabled or not self.redis_client:
+            return False
+        
+        try:
+            return bool(await self.redis_client.exists(key))
+        except RedisError as e:
+            logger.error(f"检查缓存存在性失败: {e}")
+            return False
+    
+    async def get_json(self, key: str) -> Optional[dict]:
+        """获取JSON格式缓存"""
+        if not self.enabled or not self.redis_client:
+            return None
+        
+        try:
+            return self._decode(await self._get_raw(key), legacy="json")
+        except RedisError as e:
+            logger.error(f"获取JSON缓存失败: {e}")
+            return None
+        except ValueError as e:
+            logger.error(f"JSON解析失败: {e}")
+            return None
+    
+    async def set_json(
+        self,
+        key: str,
+        value: dict,
+        expire: Optional[int] = None
+    ) -> bool:
+        """设置JSON格式缓存"""
+        if not self.enabled or not self.redis_client:
+            return False
+        
+        try:
+            return await self._set_raw(key, self._encode_json(key, value), self._expire_time(expire))
+        except RedisError as e:
+            logger.error(f"设置JSON缓存失败: {e}")
+            return False
+        except (TypeError, ValueError) as e:
+            logger.error(f"JSON序列化失败: {e}")
+            return False
+    
+    async def increment(self, key: str, amount: int = 1) -> Optional[int]:
+        """递增计数器"""
+        if not self.enabled or not self.redis_client:
+            return None
+        
+        try:
+            # 先写入再通知，避免其他worker在写入前重新读到旧值
+            result = await self.redis_client.incrby(key, amount)
+            await self.invalidate_local(key)
+            return result
+        except RedisError as e:
+            logger.error(f"递增计数器失败: {e}")
+            return None
+    
+    async def expire(self, key: str, seconds: int) -> bool:
+        """设置过期时间"""
+        if not self.enabled or not self.redis_client:
+            return False
+        
+        try:
+            await self.invalidate_local(key)
+            return bool(await self.redis_client.expire(key, seconds))
+        except RedisError as e:
+            logger.error(f"设置过期时间失败: {e}")
+            return False
+    
+    async def clear_pattern(self, pattern: str, job: Optional[CacheClearJob] = None) -> int:
+        """清除匹配模式的缓存
+        
+        使用SCAN游标分批查找、UNLINK分批删除，批次之间让出事件循环；
+        传入job时实时更新进度。
+        """
+        if not self.enabled or not self.redis_client:
+            return 0
+        
+        job = job or CacheClearJob(pattern)
+        job.status = CacheClearJob.RUNNING
+        try:
+            await self.invalidate_local(pattern, is_pattern=True)
+            cursor = 0
+            while True:
+                cursor, keys = await self.redis_client.scan(
+                    cursor=cursor,
+                    match=pattern,
+                    count=settings.CACHE_SCAN_BATCH_SIZE
+                )
+                job.scanned += len(keys)
+                if keys:
+                    job.deleted += await self.redis_client.unlink(*keys)
+                job.batches += 1
+                if cursor == 0:
+                    break
+                await asyncio.sleep(0)
+            job.finish()
+        except RedisError as e:
+            logger.error(f"清除模式缓存失败: {e}")
+            job.finish(error=str(e))
+        return job.deleted
+    
+    def start_clear_job(self, pattern: str) -> CacheClearJob:
+        """在后台任务中清除匹配模式的缓存，立即返回任务"""
+        job = CacheClearJob(pattern)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.MAX_JOBS:
+            self._jobs.popitem(last=False)
+        
+        if not self.enabled or not self.redis_client:
+            job.finish(error="缓存未启用")
+            return job
+        
+        task = asyncio.create_task(self.clear_pattern(pattern, job))
+        # 保留任务引用，防止被垃圾回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+    
+    def get_clear_job(self, job_id: str) -> Optional[CacheClearJob]:
+        """查询清除任务"""
+        return self._jobs.get(job_id)
+    
+    async def namespace_version(self, namespace: str) -> int:
+        """获取命名空间当前代数，缓存不可用时返回0"""
+        if not self.enabled or not self.redis_client:
+            return 0
+        
+        try:
+            return self._parse_version(await self._get_raw(CacheNamespace.version_key(namespace)))
+        except (RedisError, ValueError) as e:
+            logger.error(f"获取命名空间版本失败: {e}")
+            return 0
+    
+    async def versioned_key(self, key: str, *namespaces: str) -> str:
+        """生成嵌入命名空间代数的缓存键"""
+        versions = [await self.namespace_version(namespace) for namespace in namespaces]
+        return CacheNamespace.build_key(key, versions)
+    
+    async def bump_namespace(self, *namespaces: str):
+        """递增命名空间代数，使其下所有缓存失效"""
+        for namespace in dict.fromkeys(namespaces):
+            await self.increment(CacheNamespace.version_key(namespace))
+    
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Union[Any, Awaitable[Any]]],
+        ttl: Optional[int] = None,
+        beta: Optional[float] = None,
+        stale_ttl: Optional[int] = None,
+        negative_ttl: Optional[int] = None
+    ) -> Any:
+        """读取缓存，未命中或需要提前刷新时只由一个worker重新计算
+        
+        compute可以是普通函数或协程函数，计算结果需可被缓存序列化器编码。
+        """
+        if not self.enabled or not self.redis_client:
+            return await _resolve(compute())
+        
+        ttl, beta, stale_ttl = self._stampede_options(ttl, beta, stale_ttl)
+        
+        entry = await self.get(key)
+        if entry is not None and not self._should_refresh(entry, beta):
+            return entry["value"]
+        
+        lock_key = self._lock_key(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT_MS / 1000
+        while True:
+            if await self._acquire_lock(lock_key, token):
+                try:
+                    current = await self.get(key)
+                    if self._is_newer(current, entry):
+                        return current["value"]
+                    return await self._recompute(key, compute, ttl, stale_ttl, entry, negative_ttl)
+                finally:
+                    await self._release_lock(lock_key, token)
+            
+            if entry is not None:
+                self.stampede.stale_served += 1
+                return entry["value"]
+            
+            # 没有旧值可返回，等待持锁worker写入结果
+            self.stampede.lock_waits += 1
+            await asyncio.sleep(settings.CACHE_LOCK_WAIT_MS / 1000)
+            current = await self.get(key)
+            if current is not None:
+                return current["value"]
+            if time.monotonic() >= deadline:
+                # 持锁worker可能已退出，不再等待
+                return await self._recompute(key, compute, ttl, stale_ttl, entry, negative_ttl)
+    
+    async def get_stats(self) -> dict:
+        """获取缓存统计信息"""
+        if not self.enabled or not self.redis_client:
+            return {"enabled": False}
+        
+        try:
+            stats = self._stats_payload(await self.redis_client.info())
+            stats["pool"] = {
+                "max_connections": self.pool.max_connections,
+                "in_use": len(self.pool._in_use_connections),
+                "idle": len(self.pool._available_connections)
             }
+            return stats
         except RedisError as e:
             logger.error(f"获取缓存统计失败: {e}")
             return {"enabled": True, "error": str(e)}
+    
+    async def invalidate_local(self, key: str, is_pattern: bool = False):
+        """丢弃本进程的L1副本，并通知其他worker"""
+        if self.local is None:
+            return
+        
+        self._drop_local(key, is_pattern)
+        
+        try:
+            await self.redis_client.publish(self.channel, self._invalidation_message(key, is_pattern))
+        except RedisError as e:
+            logger.error(f"发布缓存失效通知失败: {e}")
+    
+    async def _acquire_lock(self, lock_key: str, token: str) -> bool:
+        """SET NX PX 获取分布式锁"""
+        try:
+            return bool(await self.redis_client.set(
+                lock_key, token, nx=True, px=settings.CACHE_LOCK_TIMEOUT_MS
+            ))
+        except RedisError as e:
+            logger.error(f"获取缓存锁失败: {e}")
+            return True
+    
+    async def _release_lock(self, lock_key: str, token: str):
+        """释放分布式锁"""
+        try:
+            await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            logger.error(f"释放缓存锁失败: {e}")
+    
+    async def _recompute(
+        self,
+        key: str,
+        compute: Callable[[], Union[Any, Awaitable[Any]]],
+        ttl: int,
+        stale_ttl: int,
+        entry: Optional[dict],
+        negative_ttl: Optional[int] = None
+    ) -> Any:
+        """重新计算并写入"""
+        start = time.monotonic()
+        value = await _resolve(compute())
+        delta = time.monotonic() - start
+        
+        new_entry, expire = self._make_entry(value, delta, ttl, stale_ttl, entry, negative_ttl)
+        await self.set(key, new_entry, expire=expire)
+        return value
+    
+    async def _get_raw(self, key: str) -> Optional[bytes]:
+        """先查L1，未命中再查Redis并回填L1"""
+        data = self._get_local(key)
+        if data is not None:
+            return data
+        return self._record_l2(key, await self.redis_client.get(key))
+    
+    async def _set_raw(self, key: str, data: bytes, expire: int) -> bool:
+        """写入Redis，通知其他worker后回填本进程L1"""
+        result = await self.redis_client.setex(key, expire, data)
+        await self.invalidate_local(key)
+        self._set_local(key, data, expire)
+        return bool(result)
 
 
 # 全局缓存实例
-cache = CacheService()
\ No newline at end of file
+cache = CacheService()
+
+# 异步接口使用的缓存实例，与同步实例共用L1，失效通知由同步实例的订阅线程处理
+async_cache = AsyncCacheService(local=cache.local, instance_id=cache.instance_id)
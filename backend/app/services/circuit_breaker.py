@@ -0,0 +1,201 @@
+"""
+熔断器
+
+统计最近N次上游调用的错误率和慢调用比例，超过阈值后进入打开状态，
+打开期间直接拒绝调用以便立即走备用逻辑；打开时间结束后进入半开状态，
+放行少量探测调用，成功则关闭，失败则重新打开。
+"""
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenException
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """熔断器"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(
+        self,
+        name: str,
+        window_size: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_max_calls: Optional[int] = None
+    ):
+        self.name = name
+        self.enabled = settings.QWEN_BREAKER_ENABLED
+        self.window_size = settings.QWEN_BREAKER_WINDOW_SIZE if window_size is None else window_size
+        self.min_calls = settings.QWEN_BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.error_rate = settings.QWEN_BREAKER_ERROR_RATE if error_rate is None else error_rate
+        self.slow_call_seconds = settings.QWEN_BREAKER_SLOW_CALL_SECONDS if slow_call_seconds is None else slow_call_seconds
+        self.slow_call_rate = settings.QWEN_BREAKER_SLOW_CALL_RATE if slow_call_rate is None else slow_call_rate
+        self.open_seconds = settings.QWEN_BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_max_calls = settings.QWEN_BREAKER_HALF_OPEN_MAX_CALLS if half_open_max_calls is None else half_open_max_calls
+        
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # (是否失败, 是否慢调用)
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=self.window_size)
+        
+        # 统计信息
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+    
+    @property
+    def is_open(self) -> bool:
+        """是否处于打开状态（会直接拒绝调用）"""
+        return self.enabled and self._current_state() == self.OPEN
+    
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """通过熔断器调用"""
+        if not self.enabled:
+            return await func(*args, **kwargs)
+        
+        self._before_call()
+        
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._record(failed=True, elapsed=time.monotonic() - start)
+            raise
+        
+        self._record(failed=False, elapsed=time.monotonic() - start)
+        return result
+    
+    async def stream(self, func: Callable[..., AsyncIterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """通过熔断器消费流式调用，流结束或出错时按整个流的耗时记录结果"""
+        if not self.enabled:
+            async for item in func(*args, **kwargs):
+                yield item
+            return
+        
+        self._before_call()
+        
+        start = time.monotonic()
+        try:
+            async for item in func(*args, **kwargs):
+                yield item
+        except Exception:
+            self._record(failed=True, elapsed=time.monotonic() - start)
+            raise
+        except BaseException:
+            # 客户端断开或任务取消，结果未知，不计入统计
+            self._abandon()
+            raise
+        
+        self._record(failed=False, elapsed=time.monotonic() - start)
+    
+    def get_stats(self) -> dict:
+        """获取熔断器状态"""
+        failures, slow_calls = self._window_counts()
+        calls = len(self._window)
+        remaining = 0.0
+        if self.state == self.OPEN:
+            remaining = max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+        
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "state": self._current_state(),
+            "window_calls": calls,
+            "error_rate": round(failures / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(slow_calls / calls, 4) if calls else 0.0,
+            "open_remaining_seconds": round(remaining, 2),
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+            "times_opened": self.times_opened
+        }
+    
+    def reset(self):
+        """重置为关闭状态"""
+        self.state = self.CLOSED
+        self._half_open_calls = 0
+        self._window.clear()
+    
+    def _current_state(self) -> str:
+        """打开时间结束后视为半开"""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return self.HALF_OPEN
+        return self.state
+    
+    def _before_call(self):
+        """调用前检查是否放行"""
+        if self.state == self.OPEN and self._current_state() == self.HALF_OPEN:
+            self.state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"熔断器[{self.name}]进入半开状态")
+        
+        if self.state == self.OPEN:
+            self.total_rejected += 1
+            raise CircuitOpenException(f"上游服务[{self.name}]熔断中")
+        
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.total_rejected += 1
+                raise CircuitOpenException(f"上游服务[{self.name}]熔断探测中")
+            self._half_open_calls += 1
+        
+        self.total_calls += 1
+    
+    def _abandon(self):
+        """归还未完成调用占用的半开探测名额"""
+        if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+    
+    def _record(self, failed: bool, elapsed: float):
+        """记录调用结果并更新状态"""
+        slow = elapsed >= self.slow_call_seconds
+        if failed:
+            self.total_failures += 1
+        
+        if self.state == self.HALF_OPEN:
+            if failed or slow:
+                self._open()
+            else:
+                logger.info(f"熔断器[{self.name}]探测成功，恢复关闭状态")
+                self.reset()
+            return
+        
+        self._window.append((failed, slow))
+        calls = len(self._window)
+        if calls < self.min_calls:
+            return
+        
+        failures, slow_calls = self._window_counts()
+        if failures / calls >= self.error_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
+    
+    def _open(self):
+        """进入打开状态"""
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self._window.clear()
+        self.times_opened += 1
+        logger.warning(f"熔断器[{self.name}]打开，{self.open_seconds}秒内直接使用备用逻辑")
+    
+    def _window_counts(self) -> Tuple[int, int]:
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow_calls = sum(1 for _, slow in self._window if slow)
+        return failures, slow_calls
+
+
+# 千问API熔断器
+qwen_breaker = CircuitBreaker("qwen")
@@ -0,0 +1,313 @@
+"""
+列表总数缓存
+
+分页列表的总数按 (表, 筛选条件) 缓存，读取是一次键查找，不再每页执行 COUNT。
+新增记录时对已缓存的相关条目做增量调整；条目过期后下一次读取重新 COUNT，
+纠正增量维护可能产生的偏差（例如回滚、其他worker未共享的进程内缓存）。
+Redis可用时多个worker共享，否则使用进程内LRU。异步路径使用 *_async 版本。
+
+exact=True 时总是执行 COUNT 并用结果刷新缓存；exact=False 时返回缓存值，
+未缓存时才 COUNT 一次。
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Select
+from sqlalchemy.orm import Query
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.pagination import count_statement
+from app.models.joke import Joke
+from app.services.cache_service import async_cache, cache
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = get_logger(__name__)
+
+# 仅当键存在时累加，避免为未缓存的条件写入不完整的计数
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 then
+    return redis.call("incrby", KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class CountCache:
+    """列表总数缓存"""
+    
+    REDIS_PREFIX = "counts"
+    
+    def __init__(self, ttl: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl or settings.COUNT_CACHE_TTL
+        self.max_entries = max_entries or settings.COUNT_CACHE_MAX_ENTRIES
+        
+        # 键 -> (总数, 过期时间)
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.exact_counts = 0
+        self.adjustments = 0
+    
+    @property
+    def redis_client(self):
+        """共享存储使用的Redis客户端，不可用时返回None"""
+        if cache.enabled and cache.redis_client:
+            return cache.redis_client
+        return None
+    
+    @property
+    def async_redis_client(self):
+        """异步路径使用的Redis客户端，不可用时返回None"""
+        if async_cache.enabled and async_cache.redis_client:
+            return async_cache.redis_client
+        return None
+    
+    def make_key(self, table: str, **filters) -> str:
+        """按筛选条件生成键，值为None的条件视为未筛选"""
+        parts = [table] + [
+            f"{name}={int(value) if isinstance(value, bool) else value}"
+            for name, value in sorted(filters.items())
+            if value is not None
+        ]
+        return ":".join(parts)
+    
+    def count(self, key: str, query: Query, exact: bool = True) -> int:
+        """获取查询的总数"""
+        if not exact:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+        else:
+            self.exact_counts += 1
+        
+        total = query.order_by(None).count()
+        self.set(key, total)
+        return total
+    
+    async def count_async(self, key: str, db: "AsyncSession", statement: Select, exact: bool = True) -> int:
+        """count 的异步版本，statement 为 select() 语句"""
+        if not exact:
+            cached = await self.get_async(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+        else:
+            self.exact_counts += 1
+        
+        total = (await db.execute(count_statement(statement))).scalar_one()
+        await self.set_async(key, total)
+        return total
+    
+    def get(self, key: str) -> Optional[int]:
+        """读取缓存的总数"""
+        client = self.redis_client
+        if client is None:
+            return self._get_local(key)
+        
+        try:
+            value = client.get(self._redis_key(key))
+            return int(value) if value is not None else None
+        except Exception as e:
+            logger.error(f"读取计数缓存失败: {e}")
+            return None
+    
+    async def get_async(self, key: str) -> Optional[int]:
+        """get 的异步版本"""
+        client = self.async_redis_client
+        if client is None:
+            return self._get_local(key)
+        
+        try:
+            value = await client.get(self._redis_key(key))
+            return int(value) if value is not None else None
+        except Exception as e:
+            logger.error(f"读取计数缓存失败: {e}")
+            return None
+    
+    def set(self, key: str, value: int):
+        """写入总数并重新计时"""
+        client = self.redis_client
+        if client is None:
+            self._set_local(key, value)
+            return
+        
+        try:
+            client.set(self._redis_key(key), value, ex=self.ttl)
+        except Exception as e:
+            logger.error(f"写入计数缓存失败: {e}")
+    
+    async def set_async(self, key: str, value: int):
+        """set 的异步版本"""
+        client = self.async_redis_client
+        if client is None:
+            self._set_local(key, value)
+            return
+        
+        try:
+            await client.set(self._redis_key(key), value, ex=self.ttl)
+        except Exception as e:
+            logger.error(f"写入计数缓存失败: {e}")
+    
+    def adjust(self, deltas: Dict[str, int]):
+        """对已缓存的条目做增量调整，未缓存的条目保持缺失"""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.adjustments += len(deltas)
+        
+        client = self.redis_client
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                for key, delta in deltas.items():
+                    pipe.eval(INCR_IF_EXISTS_SCRIPT, 1, self._redis_key(key), delta)
+                pipe.execute()
+            except Exception as e:
+                # 调整失败时删除相关条目，下次读取重新计数
+                logger.error(f"调整计数缓存失败: {e}")
+                self.invalidate(deltas)
+            return
+        
+        self._adjust_local(deltas)
+    
+    async def adjust_async(self, deltas: Dict[str, int]):
+        """adjust 的异步版本"""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.adjustments += len(deltas)
+        
+        client = self.async_redis_client
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                for key, delta in deltas.items():
+                    pipe.eval(INCR_IF_EXISTS_SCRIPT, 1, self._redis_key(key), delta)
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"调整计数缓存失败: {e}")
+                await self.invalidate_async(deltas)
+            return
+        
+        self._adjust_local(deltas)
+    
+    def invalidate(self, keys: Iterable[str]):
+        """删除条目"""
+        keys = list(keys)
+        client = self.redis_client
+        if client is not None:
+            try:
+                client.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                logger.error(f"删除计数缓存失败: {e}")
+            return
+        
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    async def invalidate_async(self, keys: Iterable[str]):
+        """invalidate 的异步版本"""
+        keys = list(keys)
+        client = self.async_redis_client
+        if client is not None:
+            try:
+                await client.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                logger.error(f"删除计数缓存失败: {e}")
+            return
+        
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def joke_keys(self, joke: Joke) -> List[str]:
+        """包含该笑话的所有列表条件"""
+        keys = [
+            self.make_key("jokes", is_public=joke.is_public, category=category, is_featured=featured)
+            for category in {None, joke.category}
+            for featured in (None, joke.is_featured)
+        ]
+        if joke.user_id:
+            keys.append(self.make_key("jokes", user_id=joke.user_id))
+        return keys
+    
+    def record_jokes(self, jokes: Iterable[Joke], delta: int = 1):
+        """新增（delta=1）或删除（delta=-1）笑话后调整相关总数"""
+        self.adjust(self._joke_deltas(jokes, delta))
+    
+    async def record_jokes_async(self, jokes: Iterable[Joke], delta: int = 1):
+        """record_jokes 的异步版本"""
+        await self.adjust_async(self._joke_deltas(jokes, delta))
+    
+    def _joke_deltas(self, jokes: Iterable[Joke], delta: int) -> Dict[str, int]:
+        """笑话增减对各列表总数的增量"""
+        deltas = Counter()
+        for joke in jokes:
+            for key in self.joke_keys(joke):
+                deltas[key] += delta
+        return deltas
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis" if self.redis_client is not None else "memory",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "exact_counts": self.exact_counts,
+            "adjustments": self.adjustments
+        }
+    
+    def _adjust_local(self, deltas: Dict[str, int]):
+        """调整进程内已缓存的条目"""
+        with self._lock:
+            for key, delta in deltas.items():
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries[key] = (entry[0] + delta, entry[1])
+    
+    def _get_local(self, key: str) -> Optional[int]:
+        """读取进程内条目并维护LRU顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def _set_local(self, key: str, value: int):
+        """写入进程内条目，超过容量时淘汰最久未使用的键"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _redis_key(self, key: str) -> str:
+        return f"{self.REDIS_PREFIX}:{key}"
+
+
+# 全局计数缓存实例
+count_cache = CountCache()
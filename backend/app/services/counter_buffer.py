@@ -0,0 +1,302 @@
+"""
+计数器写回缓冲
+
+查看、收藏、点击等计数先累加在缓冲区中，后台协程定期合并为批量的
+UPDATE ... SET col = col + :delta 写入数据库，代替每次请求一次读-改-写事务。
+
+写入模式（COUNTER_WRITE_MODE）决定崩溃时的数据保证：
+- direct（默认）: 每次增量立即执行一条原子UPDATE，不丢失，但每次请求一次写事务
+- memory: 累加在进程内，进程崩溃时最多丢失一个刷新间隔的增量
+- redis: 累加在Redis哈希中，应用进程崩溃不丢失；刷新过程中崩溃时，
+  已提交但未清理的批次会在下次刷新时重复写入（至少一次）
+"""
+import asyncio
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.write_queue import write_queue
+from app.models.joke import Joke
+from app.models.share import Share
+from app.services.cache_service import RELEASE_LOCK_SCRIPT, cache
+
+logger = get_logger(__name__)
+
+# 计数器名称 -> (模型, 字段)
+COUNTERS = {
+    "joke_views": (Joke, "view_count"),
+    "joke_likes": (Joke, "like_count"),
+    "share_clicks": (Share, "click_count"),
+}
+
+
+class CounterBuffer:
+    """计数器写回缓冲"""
+    
+    DIRECT = "direct"
+    MEMORY = "memory"
+    REDIS = "redis"
+    
+    REDIS_PREFIX = "counters"
+    
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        session_factory=None
+    ):
+        self.mode = mode or settings.COUNTER_WRITE_MODE
+        self.flush_interval = flush_interval or settings.COUNTER_FLUSH_INTERVAL
+        self.max_pending = max_pending or settings.COUNTER_FLUSH_MAX_PENDING
+        self.session_factory = session_factory
+        
+        self._pending: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self._pending_count = 0
+        # 请求在事件循环线程中累加，刷新在线程池中执行
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # 统计信息
+        self.increments = 0
+        self.flushes = 0
+        self.rows_updated = 0
+        self.flush_errors = 0
+    
+    @property
+    def redis_client(self):
+        """redis模式使用的Redis客户端，不可用时返回None（退回进程内累加）"""
+        if self.mode == self.REDIS and cache.enabled and cache.redis_client:
+            return cache.redis_client
+        return None
+    
+    @property
+    def is_direct(self) -> bool:
+        """是否立即写入数据库；缓冲模式下调用方需自行检查实体是否存在"""
+        return self.mode == self.DIRECT
+    
+    def incr(self, name: str, entity_id: int, delta: int = 1, db: Optional[Session] = None) -> bool:
+        """累加一次计数；direct模式下使用传入的会话立即写入，实体不存在时返回False"""
+        self.increments += 1
+        
+        if self.is_direct and db is not None:
+            return write_queue.execute(db, self._direct_write(name, entity_id, delta), read_your_writes=False) > 0
+        
+        return self._buffer(name, entity_id, delta)
+    
+    async def incr_async(self, name: str, entity_id: int, delta: int = 1, db: Optional[Session] = None) -> bool:
+        """incr 的异步版本，direct模式下等待写线程时不阻塞事件循环"""
+        self.increments += 1
+        
+        if self.is_direct and db is not None:
+            return await write_queue.execute_async(
+                db, self._direct_write(name, entity_id, delta), read_your_writes=False
+            ) > 0
+        
+        return self._buffer(name, entity_id, delta)
+    
+    def _direct_write(self, name: str, entity_id: int, delta: int):
+        """direct模式的单条累加写操作；计数不触发读己之写"""
+        return lambda session: self._apply(session, name, {entity_id: delta})
+    
+    def _buffer(self, name: str, entity_id: int, delta: int) -> bool:
+        """把增量累加到Redis哈希或进程内缓冲"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                client.hincrby(self._redis_key(name), str(entity_id), delta)
+                return True
+            except Exception as e:
+                logger.error(f"写入Redis计数缓冲失败，改用进程内缓冲: {e}")
+        
+        with self._lock:
+            self._pending[name][entity_id] += delta
+            self._pending_count += 1
+            full = self._pending_count >= self.max_pending
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+    
+    def pending(self, name: str, entity_id: int) -> int:
+        """尚未写入数据库的增量"""
+        amount = self._pending.get(name, {}).get(entity_id, 0)
+        client = self.redis_client
+        if client is not None:
+            try:
+                amount += int(client.hget(self._redis_key(name), str(entity_id)) or 0)
+            except Exception as e:
+                logger.error(f"读取Redis计数缓冲失败: {e}")
+        return amount
+    
+    def flush(self, db: Optional[Session] = None) -> int:
+        """把缓冲的增量写入数据库，返回更新的行数"""
+        owns_session = db is None
+        if owns_session:
+            db = self._new_session()
+        
+        try:
+            updated = self._flush_memory(db)
+            if self.redis_client is not None:
+                updated += self._flush_redis(db)
+            if updated:
+                self.flushes += 1
+                self.rows_updated += updated
+            return updated
+        finally:
+            if owns_session:
+                db.close()
+    
+    async def start(self):
+        """启动后台刷新协程"""
+        if self.mode == self.DIRECT or self._task is not None:
+            return
+        
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"计数器写回已启动: 模式={self.mode}, 刷新间隔={self.flush_interval}秒")
+    
+    async def stop(self):
+        """停止后台刷新协程，并写入剩余增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            logger.error(f"关闭时写入计数失败: {e}")
+    
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "mode": self.mode,
+            "backend": "redis" if self.redis_client is not None else "memory",
+            "increments": self.increments,
+            "pending_local": sum(len(entries) for entries in self._pending.values()),
+            "flushes": self.flushes,
+            "rows_updated": self.rows_updated,
+            "flush_errors": self.flush_errors,
+            "write_amplification": round(self.rows_updated / self.increments, 4) if self.increments else 0.0
+        }
+    
+    async def _run(self):
+        """后台刷新循环"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                self.flush_errors += 1
+                logger.error(f"计数写入失败: {e}")
+    
+    def _flush_memory(self, db: Session) -> int:
+        """写入进程内缓冲，失败时把增量放回"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._pending_count = 0
+        if not pending:
+            return 0
+        
+        try:
+            return write_queue.execute(
+                db, lambda session: sum(self._apply(session, name, deltas) for name, deltas in pending.items()),
+                read_your_writes=False
+            )
+        except Exception:
+            with self._lock:
+                for name, deltas in pending.items():
+                    for entity_id, delta in deltas.items():
+                        self._pending[name][entity_id] += delta
+                        self._pending_count += 1
+            raise
+    
+    def _flush_redis(self, db: Session) -> int:
+        """写入Redis缓冲
+        
+        先把哈希RENAME为处理中键，写库提交后再删除；上次残留的处理中键优先写入。
+        同一时间只有一个worker刷新。
+        """
+        client = self.redis_client
+        lock_key = f"{self.REDIS_PREFIX}:flush_lock"
+        token = uuid.uuid4().hex
+        # 多个worker同时刷新会重复写入同一个处理中键
+        if not client.set(lock_key, token, nx=True, px=int(max(self.flush_interval * 10, 30) * 1000)):
+            return 0
+        
+        try:
+            return self._flush_redis_locked(client, db)
+        finally:
+            # 刷新超过锁超时后锁可能已被其他worker获取，只释放自己持有的锁
+            client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    
+    def _flush_redis_locked(self, client, db: Session) -> int:
+        """持有刷新锁时逐个计数器写入"""
+        updated = 0
+        for name in COUNTERS:
+            live_key = self._redis_key(name)
+            flushing_key = f"{live_key}:flushing"
+            
+            if not client.exists(flushing_key):
+                try:
+                    client.rename(live_key, flushing_key)
+                except Exception:
+                    # 没有新的增量
+                    continue
+            
+            raw = client.hgetall(flushing_key)
+            deltas = {int(entity_id): int(delta) for entity_id, delta in raw.items() if int(delta)}
+            updated += write_queue.execute(
+                db, lambda session: self._apply(session, name, deltas), read_your_writes=False
+            )
+            client.delete(flushing_key)
+        return updated
+    
+    @staticmethod
+    def _apply(db: Session, name: str, deltas: Dict[int, int]) -> int:
+        """批量执行 UPDATE ... SET col = col + :delta，返回更新的行数"""
+        if not deltas:
+            return 0
+        
+        model, field = COUNTERS[name]
+        table = model.__table__
+        column = table.c[field]
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("entity_id"))
+            .values({field: column + bindparam("delta")})
+        )
+        result = db.execute(statement, [
+            {"entity_id": entity_id, "delta": delta}
+            for entity_id, delta in deltas.items()
+        ])
+        # 单条执行时受影响行数可靠；executemany 时部分驱动不返回行数
+        return result.rowcount if len(deltas) == 1 else len(deltas)
+    
+    def _new_session(self) -> Session:
+        if self.session_factory is None:
+            from app.db.session import SessionLocal
+            self.session_factory = SessionLocal
+        return self.session_factory()
+    
+    def _redis_key(self, name: str) -> str:
+        return f"{self.REDIS_PREFIX}:{name}"
+
+
+# 全局计数器缓冲实例
+counter_buffer = CounterBuffer()
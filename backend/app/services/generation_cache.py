@@ -0,0 +1,245 @@
+"""
+生成结果缓存
+
+以 (规范化提示词, 模型, 温度档位, 长度) 的哈希为键，每个键保存最多N个
+不同的生成结果（变体环）。变体未攒满前继续调用上游并追加结果，攒满后
+轮询返回，避免重复请求总是拿到同一个笑话。进程内使用LRU，Redis作为
+多个worker共享的第二层。异步生成路径使用 get_async / add_async。
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.cache_service import async_cache, cache
+
+logger = get_logger(__name__)
+
+
+class _VariantRing:
+    """单个键的变体环"""
+    
+    def __init__(self, expires_at: float):
+        self.variants: List[str] = []
+        self.cursor = 0
+        self.expires_at = expires_at
+    
+    def next(self) -> str:
+        content = self.variants[self.cursor % len(self.variants)]
+        self.cursor += 1
+        return content
+
+
+class GenerationCache:
+    """生成结果缓存"""
+    
+    REDIS_PREFIX = "gen_cache"
+    
+    def __init__(
+        self,
+        ttl: Optional[int] = None,
+        variants: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        use_redis: Optional[bool] = None
+    ):
+        self.enabled = settings.GENERATION_CACHE_ENABLED
+        self.ttl = ttl or settings.GENERATION_CACHE_TTL
+        self.variants = variants or settings.GENERATION_CACHE_VARIANTS
+        self.max_entries = max_entries or settings.GENERATION_CACHE_MAX_ENTRIES
+        self.temperature_step = settings.GENERATION_CACHE_TEMPERATURE_STEP
+        self.use_redis = settings.GENERATION_CACHE_USE_REDIS if use_redis is None else use_redis
+        
+        self._rings: "OrderedDict[str, _VariantRing]" = OrderedDict()
+        
+        # 统计信息
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+    
+    @property
+    def redis_client(self):
+        """共享层使用的Redis客户端，不可用时返回None"""
+        if self.use_redis and cache.enabled and cache.redis_client:
+            return cache.redis_client
+        return None
+    
+    @property
+    def async_redis_client(self):
+        """异步路径使用的Redis客户端，不可用时返回None"""
+        if self.use_redis and async_cache.enabled and async_cache.redis_client:
+            return async_cache.redis_client
+        return None
+    
+    def make_key(self, prompt: str, model: str, temperature: float, length: Optional[str]) -> str:
+        """计算规范化缓存键"""
+        normalized = unicodedata.normalize("NFKC", prompt)
+        normalized = re.sub(r"\s+", " ", normalized).strip().lower()
+        bucket = round(round(temperature / self.temperature_step) * self.temperature_step, 2)
+        raw = "\x1f".join([normalized, model, str(bucket), length or "medium"])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """变体环攒满时轮询返回一个变体，否则返回None"""
+        content = self._next_local(key)
+        if content is None:
+            content = self._get_shared(key)
+        return self._record_lookup(content)
+    
+    async def get_async(self, key: str) -> Optional[str]:
+        """get 的异步版本"""
+        content = self._next_local(key)
+        if content is None:
+            content = await self._get_shared_async(key)
+        return self._record_lookup(content)
+    
+    def add(self, key: str, content: str):
+        """追加一个新生成的变体"""
+        self._add_local(key, content)
+        
+        client = self.redis_client
+        if client is not None:
+            redis_key = f"{self.REDIS_PREFIX}:{key}"
+            try:
+                length = client.rpush(redis_key, content.encode("utf-8"))
+                if length == 1:
+                    # TTL从第一个变体写入时开始计算
+                    client.expire(redis_key, self.ttl)
+                elif length > self.variants:
+                    client.ltrim(redis_key, 0, self.variants - 1)
+            except Exception as e:
+                logger.error(f"写入生成缓存失败: {e}")
+    
+    async def add_async(self, key: str, content: str):
+        """add 的异步版本"""
+        self._add_local(key, content)
+        
+        client = self.async_redis_client
+        if client is not None:
+            redis_key = f"{self.REDIS_PREFIX}:{key}"
+            try:
+                length = await client.rpush(redis_key, content.encode("utf-8"))
+                if length == 1:
+                    await client.expire(redis_key, self.ttl)
+                elif length > self.variants:
+                    await client.ltrim(redis_key, 0, self.variants - 1)
+            except Exception as e:
+                logger.error(f"写入生成缓存失败: {e}")
+    
+    def clear(self):
+        """清空进程内缓存"""
+        self._rings.clear()
+    
+    def get_stats(self) -> dict:
+        """获取缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": "memory+redis" if self.redis_client is not None else "memory",
+            "entries": len(self._rings),
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "upstream_calls_saved": self.hits,
+            "evictions": self.evictions
+        }
+    
+    def _next_local(self, key: str) -> Optional[str]:
+        """本地变体环攒满时轮询返回一个变体"""
+        ring = self._get_local(key)
+        if ring is not None and len(ring.variants) >= self.variants:
+            self.local_hits += 1
+            return ring.next()
+        return None
+    
+    def _record_lookup(self, content: Optional[str]) -> Optional[str]:
+        """统计一次查找的命中情况"""
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+    
+    def _add_local(self, key: str, content: str):
+        """追加变体到本地变体环"""
+        ring = self._get_local(key)
+        if ring is None:
+            ring = _VariantRing(time.monotonic() + self.ttl)
+            self._rings[key] = ring
+            self._evict()
+        
+        if len(ring.variants) < self.variants and content not in ring.variants:
+            ring.variants.append(content)
+        self.stores += 1
+    
+    def _get_local(self, key: str) -> Optional[_VariantRing]:
+        """读取进程内变体环并维护LRU顺序"""
+        ring = self._rings.get(key)
+        if ring is None:
+            return None
+        if ring.expires_at <= time.monotonic():
+            del self._rings[key]
+            return None
+        self._rings.move_to_end(key)
+        return ring
+    
+    def _get_shared(self, key: str) -> Optional[str]:
+        """从Redis共享层读取，攒满时轮询返回一个变体并回填本地"""
+        client = self.redis_client
+        if client is None:
+            return None
+        
+        redis_key = f"{self.REDIS_PREFIX}:{key}"
+        try:
+            pipe = client.pipeline()
+            pipe.lrange(redis_key, 0, -1)
+            pipe.ttl(redis_key)
+            raw_variants, ttl = pipe.execute()
+        except Exception as e:
+            logger.error(f"读取生成缓存失败: {e}")
+            return None
+        return self._fill_local(key, raw_variants, ttl)
+    
+    async def _get_shared_async(self, key: str) -> Optional[str]:
+        """_get_shared 的异步版本"""
+        client = self.async_redis_client
+        if client is None:
+            return None
+        
+        redis_key = f"{self.REDIS_PREFIX}:{key}"
+        try:
+            pipe = client.pipeline()
+            pipe.lrange(redis_key, 0, -1)
+            pipe.ttl(redis_key)
+            raw_variants, ttl = await pipe.execute()
+        except Exception as e:
+            logger.error(f"读取生成缓存失败: {e}")
+            return None
+        return self._fill_local(key, raw_variants, ttl)
+    
+    def _fill_local(self, key: str, raw_variants: List[bytes], ttl: Optional[int]) -> Optional[str]:
+        """共享层攒满时回填本地并轮询返回一个变体"""
+        if len(raw_variants) < self.variants:
+            return None
+        
+        ring = _VariantRing(time.monotonic() + (ttl if ttl and ttl > 0 else self.ttl))
+        ring.variants = [item.decode("utf-8") for item in raw_variants]
+        self._rings[key] = ring
+        self._evict()
+        return ring.next()
+    
+    def _evict(self):
+        """超过容量时淘汰最久未使用的键"""
+        while len(self._rings) > self.max_entries:
+            self._rings.popitem(last=False)
+            self.evictions += 1
+
+
+# 全局生成缓存实例
+generation_cache = GenerationCache()
@@ -0,0 +1,386 @@
+"""
+笑话蓄水池服务
+
+按 (分类, 长度, 温度档位) 预先生成笑话，请求到来时直接取出，
+后台协程在水位低于低水位线时补充到高水位线。可选使用Redis列表
+作为共享存储，使多个worker进程共用同一个蓄水池；Redis访问走异步客户端，
+不阻塞事件循环。
+
+只有预热分类和被反复请求的键才会维持水位：动态键数量受LRU上限约束，
+闲置超时后不再补充，避免任意分类名触发大量上游调用。
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.schemas.joke import JokeGenerateRequest
+from app.services.ai_service import AIService
+from app.services.cache_service import RELEASE_LOCK_SCRIPT, async_cache
+
+logger = get_logger(__name__)
+
+# (分类, 长度, 温度档位)
+ReservoirKey = Tuple[str, str, float]
+
+
+class JokeReservoir:
+    """笑话蓄水池"""
+    
+    REDIS_PREFIX = "joke_reservoir"
+    
+    def __init__(
+        self,
+        low_water: Optional[int] = None,
+        high_water: Optional[int] = None,
+        use_redis: Optional[bool] = None,
+        refill_concurrency: Optional[int] = None,
+        ai_service: Optional[AIService] = None,
+        promote_hits: Optional[int] = None,
+        max_dynamic_keys: Optional[int] = None,
+        idle_ttl: Optional[float] = None
+    ):
+        self.enabled = settings.JOKE_RESERVOIR_ENABLED
+        self.low_water = low_water or settings.JOKE_RESERVOIR_LOW_WATER
+        self.high_water = max(high_water or settings.JOKE_RESERVOIR_HIGH_WATER, self.low_water)
+        self.temperature_step = settings.JOKE_RESERVOIR_TEMPERATURE_STEP
+        self.refill_interval = settings.JOKE_RESERVOIR_REFILL_INTERVAL
+        self.refill_concurrency = refill_concurrency or settings.JOKE_RESERVOIR_REFILL_CONCURRENCY
+        self.use_redis = settings.JOKE_RESERVOIR_USE_REDIS if use_redis is None else use_redis
+        self.ai_service = ai_service
+        self.promote_hits = promote_hits or settings.JOKE_RESERVOIR_PROMOTE_HITS
+        self.max_dynamic_keys = max_dynamic_keys or settings.JOKE_RESERVOIR_MAX_DYNAMIC_KEYS
+        self.idle_ttl = idle_ttl or settings.JOKE_RESERVOIR_IDLE_TTL
+        
+        self._local: Dict[ReservoirKey, Deque[str]] = {}
+        # 维持水位的键：预热键常驻，动态键按最近使用时间排序
+        self._templates: Dict[ReservoirKey, JokeGenerateRequest] = {}
+        self._pinned: Set[ReservoirKey] = set()
+        self._active: "OrderedDict[ReservoirKey, float]" = OrderedDict()
+        # 尚未达到晋升次数的候选键及其请求次数
+        self._candidates: "OrderedDict[ReservoirKey, int]" = OrderedDict()
+        self._refilling: Set[ReservoirKey] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self.refill_errors = 0
+        self._refill_times: Deque[float] = deque()
+    
+    @property
+    def redis_client(self):
+        """共享存储使用的异步Redis客户端，不可用时返回None"""
+        if self.use_redis and async_cache.enabled and async_cache.redis_client:
+            return async_cache.redis_client
+        return None
+    
+    @staticmethod
+    def is_eligible(request: JokeGenerateRequest) -> bool:
+        """带标签或自定义提示词的请求无法复用预生成结果"""
+        return not request.tags and not request.custom_prompt
+    
+    def make_key(self, request: JokeGenerateRequest) -> ReservoirKey:
+        """计算请求对应的蓄水池键"""
+        temperature = request.temperature or 0.8
+        bucket = round(round(temperature / self.temperature_step) * self.temperature_step, 2)
+        return (request.category or "", request.length or "medium", bucket)
+    
+    def register(self, request: JokeGenerateRequest) -> ReservoirKey:
+        """登记常驻维持水位的键（预热分类）"""
+        key = self.make_key(request)
+        self._pinned.add(key)
+        self._active.pop(key, None)
+        self._candidates.pop(key, None)
+        self._track(key)
+        return key
+    
+    async def take(self, request: JokeGenerateRequest) -> Optional[str]:
+        """取出一个预生成的笑话，未命中返回None"""
+        key = self.make_key(request)
+        self._touch(key)
+        # 共享模式下其他worker维持的键也可能有存货
+        content = await self._pop(key)
+        
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        
+        if key in self._templates and await self.level(key) < self.low_water:
+            self._notify()
+        
+        return content
+    
+    async def level(self, key: ReservoirKey) -> int:
+        """当前水位"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                return int(await client.llen(self._redis_key(key)))
+            except Exception as e:
+                logger.error(f"获取蓄水池水位失败: {e}")
+                return 0
+        return len(self._local.get(key, ()))
+    
+    async def start(self):
+        """启动后台补充协程"""
+        if not self.enabled or self._task is not None:
+            return
+        
+        self._semaphore = asyncio.Semaphore(self.refill_concurrency)
+        self._wakeup = asyncio.Event()
+        
+        for category in settings.JOKE_RESERVOIR_WARM_CATEGORIES:
+            self.register(JokeGenerateRequest(category=category))
+        
+        self._task = asyncio.create_task(self._run())
+        self._notify()
+        logger.info(f"笑话蓄水池已启动: 低水位={self.low_water}, 高水位={self.high_water}")
+    
+    async def stop(self):
+        """停止后台补充协程"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("笑话蓄水池已停止")
+    
+    async def refill_all(self):
+        """补充所有低于低水位的键"""
+        self._expire_idle()
+        keys = [
+            key for key in list(self._templates)
+            if key not in self._refilling and await self.level(key) < self.low_water
+        ]
+        if keys:
+            await asyncio.gather(*(self._refill(key) for key in keys))
+    
+    async def get_stats(self) -> dict:
+        """获取蓄水池统计信息"""
+        self._trim_refill_times()
+        total = self.hits + self.misses
+        
+        return {
+            "enabled": self.enabled,
+            "backend": "redis" if self.redis_client is not None else "memory",
+            "low_water": self.low_water,
+            "high_water": self.high_water,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "refilled": self.refilled,
+            "refill_errors": self.refill_errors,
+            "refill_rate_per_minute": len(self._refill_times),
+            "dynamic_keys": len(self._active),
+            "levels": {
+                self._redis_key(key).split(":", 1)[1]: await self.level(key)
+                for key in list(self._templates)
+            }
+        }
+    
+    async def _run(self):
+        """后台补充循环"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            
+            try:
+                await self.refill_all()
+            except Exception as e:
+                logger.error(f"蓄水池补充失败: {e}")
+    
+    async def _refill(self, key: ReservoirKey):
+        """将单个键补充到高水位"""
+        from app.services.joke_service import JokeService
+        
+        ai_service = self.ai_service or AIService()
+        if not ai_service.is_configured:
+            # 没有API密钥时备用笑话本身就是即时的，无需预生成
+            return
+        
+        template = self._templates.get(key)
+        if template is None:
+            # 等待调度期间键已被淘汰
+            return
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.refill_concurrency)
+        
+        # Redis模式下同一个键只由一个worker补充
+        lock_token = await self._acquire_refill_lock(key)
+        if lock_token is None:
+            return
+        
+        self._refilling.add(key)
+        try:
+            prompt = JokeService._build_prompt(template)
+            deficit = self.high_water - await self.level(key)
+            
+            async def generate_one():
+                async with self._semaphore:
+                    try:
+                        content = await ai_service._call_qwen_api(
+                            prompt, key[2], settings.QWEN_MAX_TOKENS
+                        )
+                    except Exception as e:
+                        # 失败的结果不入池，避免用备用笑话掩盖上游故障
+                        self.refill_errors += 1
+                        logger.warning(f"蓄水池生成笑话失败: {e}")
+                        return
+                    await self._push(key, content)
+            
+            await asyncio.gather(*(generate_one() for _ in range(max(deficit, 0))))
+        finally:
+            self._refilling.discard(key)
+            await self._release_refill_lock(key, lock_token)
+            self._trim_refill_times()
+    
+    def _track(self, key: ReservoirKey):
+        """为键建立补充模板"""
+        if key not in self._templates:
+            category, length, temperature = key
+            self._templates[key] = JokeGenerateRequest(
+                category=category or None,
+                length=length,
+                temperature=temperature
+            )
+    
+    def _touch(self, key: ReservoirKey):
+        """记录一次请求，动态键达到晋升次数后开始维持水位"""
+        if key in self._pinned:
+            return
+        
+        if key in self._active:
+            self._active[key] = time.monotonic()
+            self._active.move_to_end(key)
+            return
+        
+        count = self._candidates.pop(key, 0) + 1
+        if count < self.promote_hits:
+            self._candidates[key] = count
+            while len(self._candidates) > self.max_dynamic_keys:
+                self._candidates.popitem(last=False)
+            return
+        
+        self._active[key] = time.monotonic()
+        self._track(key)
+        while len(self._active) > self.max_dynamic_keys:
+            evicted, _ = self._active.popitem(last=False)
+            self._forget(evicted)
+    
+    def _expire_idle(self):
+        """移除闲置超时的动态键"""
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._active:
+            key, last_used = next(iter(self._active.items()))
+            if last_used >= cutoff:
+                break
+            del self._active[key]
+            self._forget(key)
+    
+    def _forget(self, key: ReservoirKey):
+        """停止维持键的水位并释放本地存货"""
+        self._templates.pop(key, None)
+        self._local.pop(key, None)
+    
+    def _refill_lock_key(self, key: ReservoirKey) -> str:
+        return f"{self._redis_key(key)}:refill_lock"
+    
+    async def _acquire_refill_lock(self, key: ReservoirKey) -> Optional[str]:
+        """SET NX PX 获取补充锁，未使用Redis时总是成功；失败返回None"""
+        token = uuid.uuid4().hex
+        client = self.redis_client
+        if client is None:
+            return token
+        
+        try:
+            acquired = await client.set(
+                self._refill_lock_key(key), token,
+                nx=True, px=settings.JOKE_RESERVOIR_REFILL_LOCK_MS
+            )
+        except Exception as e:
+            logger.error(f"获取蓄水池补充锁失败: {e}")
+            return None
+        return token if acquired else None
+    
+    async def _release_refill_lock(self, key: ReservoirKey, token: str):
+        """校验令牌后释放补充锁"""
+        client = self.redis_client
+        if client is None:
+            return
+        
+        try:
+            await client.eval(RELEASE_LOCK_SCRIPT, 1, self._refill_lock_key(key), token)
+        except Exception as e:
+            logger.error(f"释放蓄水池补充锁失败: {e}")
+    
+    async def _pop(self, key: ReservoirKey) -> Optional[str]:
+        """弹出一个笑话"""
+        client = self.redis_client
+        if client is not None:
+            try:
+                data = await client.lpop(self._redis_key(key))
+                return data.decode("utf-8") if data else None
+            except Exception as e:
+                logger.error(f"从蓄水池取笑话失败: {e}")
+                return None
+        
+        bucket = self._local.get(key)
+        return bucket.popleft() if bucket else None
+    
+    async def _push(self, key: ReservoirKey, content: str):
+        """放入一个笑话"""
+        client = self.redis_client
+        if client is not None:
+            redis_key = self._redis_key(key)
+            try:
+                pipe = client.pipeline()
+                pipe.rpush(redis_key, content.encode("utf-8"))
+                if key not in self._pinned:
+                    # 动态键的共享存货随闲置一起过期
+                    pipe.expire(redis_key, int(self.idle_ttl))
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"写入蓄水池失败: {e}")
+                return
+        elif key in self._templates:
+            self._local.setdefault(key, deque()).append(content)
+        else:
+            return
+        
+        self.refilled += 1
+        self._refill_times.append(time.monotonic())
+    
+    def _notify(self):
+        """唤醒补充协程"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def _trim_refill_times(self):
+        """只保留最近一分钟的补充记录"""
+        cutoff = time.monotonic() - 60
+        while self._refill_times and self._refill_times[0] < cutoff:
+            self._refill_times.popleft()
+    
+    def _redis_key(self, key: ReservoirKey) -> str:
+        category, length, temperature = key
+        return f"{self.REDIS_PREFIX}:{category or '*'}:{length}:{temperature}"
+
+
+# 全局蓄水池实例
+joke_reservoir = JokeReservoir()
@@ -1,15 +1,20 @@
 """
 笑话服务
 """
+import asyncio
 import json
 import random
-from typing import List, Optional
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func
+from sqlalchemy import and_, func, select
 
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.core.exceptions import JokeGenerationException, DatabaseException
+from app.db.atomic import atomic_increment
+from app.db.pagination import paginate, paginate_async
+from app.db.write_queue import write_queue
 from app.models.joke import Joke
 from app.schemas.joke import (
     JokeGenerateRequest,
@@ -18,9 +23,31 @@ from app.schemas.joke import (
     JokeListResponse
 )
 from app.services.ai_service import AIService
+from app.services.cache_decorator import cached
+from app.services.cache_service import CacheNamespace, async_cache, cache
+from app.services.count_cache import count_cache
+from app.services.counter_buffer import counter_buffer
+from app.services.generation_cache import generation_cache
+from app.services.joke_reservoir import joke_reservoir
 
 logger = get_logger(__name__)
 
+# 同步和异步列表方法共用缓存
+cache_joke_list = cached(
+    "jokes:list",
+    ttl=60,
+    namespaces=lambda args: [
+        CacheNamespace.joke_category(args["category"]) if args["category"] else CacheNamespace.JOKE_LISTS
+    ],
+    model=JokeListResponse
+)
+cache_user_jokes = cached(
+    "jokes:user",
+    ttl=60,
+    namespaces=lambda args: [CacheNamespace.user_jokes(args["user_id"])],
+    model=JokeListResponse
+)
+
 
 class JokeService:
     """笑话服务类"""
@@ -35,25 +62,10 @@ class JokeService:
             # 构建提示词
             prompt = self._build_prompt(request)
             
-            # 调用AI服务生成笑话
-            content = await self.ai_service.generate_joke(
-                prompt=prompt,
-                temperature=request.temperature or 0.8,
-                max_tokens=settings.QWEN_MAX_TOKENS
-            )
+            content = await self._generate_content(request, prompt)
             
             # 创建笑话记录
-            joke_create = JokeCreate(
-                content=content,
-                category=request.category,
-                tags=",".join(request.tags) if request.tags else None,
-                prompt=prompt,
-                model_name=settings.QWEN_MODEL,
-                temperature=request.temperature,
-                user_id=user_id
-            )
-            
-            joke = self.create_joke(joke_create)
+            joke = await self.create_joke_async(self._build_joke_create(request, prompt, content, user_id))
             logger.info(f"成功生成笑话: {joke.id}")
             
             return joke
@@ -62,113 +74,262 @@ class JokeService:
             logger.error(f"生成笑话失败: {e}")
             raise JokeGenerationException(f"生成笑话失败: {str(e)}")
     
+    async def stream_joke(
+        self,
+        request: JokeGenerateRequest,
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式生成笑话，先逐段返回内容，结束后保存并返回笑话记录"""
+        prompt = self._build_prompt(request)
+        
+        content = None
+        if joke_reservoir.enabled and joke_reservoir.is_eligible(request):
+            content = await joke_reservoir.take(request)
+        
+        if content is not None:
+            yield {"event": "delta", "content": content}
+        else:
+            chunks = []
+            async for delta in self.ai_service.stream_joke(
+                prompt=prompt,
+                temperature=request.temperature or 0.8,
+                max_tokens=settings.QWEN_MAX_TOKENS
+            ):
+                chunks.append(delta)
+                yield {"event": "delta", "content": delta}
+            content = self.ai_service._clean_joke_content("".join(chunks))
+        
+        joke = await self.create_joke_async(self._build_joke_create(request, prompt, content, user_id))
+        logger.info(f"成功流式生成笑话: {joke.id}")
+        
+        yield {"event": "done", "joke": joke}
+    
     async def generate_batch_jokes(
         self, 
         request: JokeBatchGenerateRequest, 
         user_id: Optional[int] = None
     ) -> List[Joke]:
         """批量生成笑话"""
-        jokes = []
-        
-        for i in range(request.count):
-            try:
-                single_request = JokeGenerateRequest(
-                    category=request.category,
-                    tags=request.tags,
-                    length=request.length,
-                    temperature=request.temperature
-                )
-                
-                joke = await self.generate_joke(single_request, user_id)
-                jokes.append(joke)
-                
-            except Exception as e:
-                logger.error(f"批量生成第{i+1}个笑话失败: {e}")
-                continue
-        
-        if not jokes:
+        single_request = JokeGenerateRequest(
+            category=request.category,
+            tags=request.tags,
+            length=request.length,
+            temperature=request.temperature
+        )
+        prompt = self._build_prompt(single_request)
+        semaphore = asyncio.Semaphore(settings.JOKE_BATCH_CONCURRENCY)
+        
+        async def generate_one(index: int) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await self._generate_content(single_request, prompt)
+                except Exception as e:
+                    logger.error(f"批量生成第{index+1}个笑话失败: {e}")
+                    return None
+        
+        # 并发调用AI服务，结果顺序与请求顺序一致
+        contents = await asyncio.gather(*(generate_one(i) for i in range(request.count)))
+        joke_creates = [
+            self._build_joke_create(single_request, prompt, content, user_id)
+            for content in contents
+            if content is not None
+        ]
+        
+        if not joke_creates:
             raise JokeGenerationException("批量生成笑话全部失败")
         
-        return jokes
+        # 一次批量插入，一次用户统计更新
+        return await self.create_jokes_async(joke_creates)
     
     def create_joke(self, joke_create: JokeCreate) -> Joke:
         """创建笑话记录"""
+        return self.create_jokes([joke_create])[0]
+    
+    async def create_joke_async(self, joke_create: JokeCreate) -> Joke:
+        """create_joke 的异步版本"""
+        return (await self.create_jokes_async([joke_create]))[0]
+    
+    def create_jokes(self, joke_creates: List[JokeCreate]) -> List[Joke]:
+        """批量创建笑话记录"""
+        jokes = self._insert_jokes(joke_creates)
+        # 已缓存的列表总数做增量调整，并使相关列表和统计的缓存失效
+        count_cache.record_jokes(jokes)
+        cache.bump_namespace(*self._list_namespaces(jokes))
+        return jokes
+    
+    async def create_jokes_async(self, joke_creates: List[JokeCreate]) -> List[Joke]:
+        """create_jokes 的异步版本，等待写入和缓存失效不阻塞事件循环"""
+        jokes = await self._insert_jokes_async(joke_creates)
+        await count_cache.record_jokes_async(jokes)
+        await self._invalidate_lists(jokes)
+        return jokes
+    
+    def _insert_jokes(self, joke_creates: List[JokeCreate]) -> List[Joke]:
+        """写入笑话记录并更新用户生成统计"""
         try:
-            joke = Joke(**joke_create.model_dump())
-            self.db.add(joke)
-            self.db.commit()
-            self.db.refresh(joke)
+            joke_ids = write_queue.execute(self.db, self._jokes_writer(joke_creates))
             
             # 更新用户生成统计
-            if joke.user_id:
-                self._update_user_stats(joke.user_id, "generated")
+            for user_id, amount in self._generated_counts(joke_creates).items():
+                self._update_user_stats(user_id, "generated", amount)
             
-            return joke
+            return self._load_jokes(joke_ids)
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"创建笑话记录失败: {e}")
+            raise DatabaseException(f"创建笑话记录失败: {str(e)}")
+    
+    async def _insert_jokes_async(self, joke_creates: List[JokeCreate]) -> List[Joke]:
+        """_insert_jokes 的异步版本，等待写线程时不阻塞事件循环"""
+        try:
+            joke_ids = await write_queue.execute_async(self.db, self._jokes_writer(joke_creates))
+            
+            for user_id, amount in self._generated_counts(joke_creates).items():
+                await self._update_user_stats_async(user_id, "generated", amount)
+            
+            return self._load_jokes(joke_ids)
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"创建笑话记录失败: {e}")
             raise DatabaseException(f"创建笑话记录失败: {str(e)}")
     
+    @staticmethod
+    def _jokes_writer(joke_creates: List[JokeCreate]):
+        """插入笑话的写操作，返回新记录ID"""
+        def write(db: Session) -> List[int]:
+            jokes = [Joke(**joke_create.model_dump()) for joke_create in joke_creates]
+            db.add_all(jokes)
+            db.flush()
+            return [joke.id for joke in jokes]
+        return write
+    
+    @staticmethod
+    def _generated_counts(joke_creates: List[JokeCreate]) -> Counter:
+        """每个用户新生成的笑话数"""
+        return Counter(joke_create.user_id for joke_create in joke_creates if joke_create.user_id)
+    
+    def _load_jokes(self, joke_ids: List[int]) -> List[Joke]:
+        """一次查询读取所有新记录，代替逐条refresh"""
+        return self.db.query(Joke).filter(Joke.id.in_(joke_ids)).order_by(Joke.id).all()
+    
     def get_joke_by_id(self, joke_id: int) -> Optional[Joke]:
         """根据ID获取笑话"""
         return self.db.query(Joke).filter(Joke.id == joke_id).first()
     
+    async def get_joke_by_id_async(self, joke_id: int) -> Optional[Joke]:
+        """get_joke_by_id 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(self.get_joke_by_id, joke_id)
+        return await self.db.get(Joke, joke_id)
+    
+    @cache_joke_list
     def get_jokes(
         self,
         page: int = 1,
         size: int = 10,
         category: Optional[str] = None,
         is_featured: Optional[bool] = None,
-        is_public: bool = True
+        is_public: bool = True,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        exact: bool = True
     ) -> JokeListResponse:
-        """获取笑话列表"""
-        query = self.db.query(Joke).filter(Joke.is_public == is_public)
-        
-        if category:
-            query = query.filter(Joke.category == category)
-        
-        if is_featured is not None:
-            query = query.filter(Joke.is_featured == is_featured)
-        
-        # 获取总数
-        total = query.count()
-        
-        # 分页查询
-        jokes = query.order_by(desc(Joke.created_at)).offset((page - 1) * size).limit(size).all()
+        """获取笑话列表，传入cursor时使用游标分页，exact为False时总数取自计数缓存"""
+        query = self._filter_jokes(self.db.query(Joke), category, is_featured, is_public)
+        count_key = self._list_count_key(category, is_featured, is_public)
+        return JokeListResponse(**paginate(
+            query, Joke, page, size, cursor, include_total,
+            count=lambda q: count_cache.count(count_key, q, exact)
+        ))
+    
+    @cache_joke_list
+    async def get_jokes_async(
+        self,
+        page: int = 1,
+        size: int = 10,
+        category: Optional[str] = None,
+        is_featured: Optional[bool] = None,
+        is_public: bool = True,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        exact: bool = True
+    ) -> JokeListResponse:
+        """get_jokes 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(
+                JokeService.get_jokes.uncached, self, page, size, category, is_featured, is_public, cursor, include_total, exact
+            )
         
-        return JokeListResponse(
-            items=jokes,
-            total=total,
-            page=page,
-            size=size,
-            pages=(total + size - 1) // size
-        )
+        statement = self._filter_jokes(select(Joke), category, is_featured, is_public)
+        count_key = self._list_count_key(category, is_featured, is_public)
+        return JokeListResponse(**await paginate_async(
+            self.db, statement, Joke, page, size, cursor, include_total,
+            count=lambda s: count_cache.count_async(count_key, self.db, s, exact)
+        ))
     
-    def get_user_jokes(self, user_id: int, page: int = 1, size: int = 10) -> JokeListResponse:
-        """获取用户的笑话"""
+    @cache_user_jokes
+    def get_user_jokes(
+        self,
+        user_id: int,
+        page: int = 1,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        exact: bool = True
+    ) -> JokeListResponse:
+        """获取用户的笑话，传入cursor时使用游标分页，exact为False时总数取自计数缓存"""
         query = self.db.query(Joke).filter(Joke.user_id == user_id)
         
-        total = query.count()
-        jokes = query.order_by(desc(Joke.created_at)).offset((page - 1) * size).limit(size).all()
+        count_key = count_cache.make_key("jokes", user_id=user_id)
+        return JokeListResponse(**paginate(
+            query, Joke, page, size, cursor, include_total,
+            count=lambda q: count_cache.count(count_key, q, exact)
+        ))
+    
+    @cache_user_jokes
+    async def get_user_jokes_async(
+        self,
+        user_id: int,
+        page: int = 1,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        exact: bool = True
+    ) -> JokeListResponse:
+        """get_user_jokes 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(
+                JokeService.get_user_jokes.uncached, self, user_id, page, size, cursor, include_total, exact
+            )
         
-        return JokeListResponse(
-            items=jokes,
-            total=total,
-            page=page,
-            size=size,
-            pages=(total + size - 1) // size
-        )
+        statement = select(Joke).where(Joke.user_id == user_id)
+        
+        count_key = count_cache.make_key("jokes", user_id=user_id)
+        return JokeListResponse(**await paginate_async(
+            self.db, statement, Joke, page, size, cursor, include_total,
+            count=lambda s: count_cache.count_async(count_key, self.db, s, exact)
+        ))
     
     def increment_view_count(self, joke_id: int) -> bool:
-        """增加查看次数"""
+        """增加查看次数（写回缓冲，定期批量写入）"""
         try:
-            joke = self.db.query(Joke).filter(Joke.id == joke_id).first()
-            if joke:
-                joke.view_count += 1
-                self.db.commit()
-                return True
+            # direct模式用受影响行数判断笑话是否存在，缓冲模式需先查询
+            if not counter_buffer.is_direct and not self._joke_exists(joke_id):
+                return False
+            return counter_buffer.incr("joke_views", joke_id, db=self.db)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新查看次数失败: {e}")
             return False
+    
+    async def increment_view_count_async(self, joke_id: int) -> bool:
+        """increment_view_count 的异步版本"""
+        try:
+            if not counter_buffer.is_direct and not self._joke_exists(joke_id):
+                return False
+            return await counter_buffer.incr_async("joke_views", joke_id, db=self.db)
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新查看次数失败: {e}")
@@ -177,18 +338,79 @@ class JokeService:
     def toggle_favorite(self, joke_id: int) -> bool:
         """切换收藏状态"""
         try:
-            joke = self.db.query(Joke).filter(Joke.id == joke_id).first()
-            if joke:
-                joke.like_count += 1
-                self.db.commit()
-                return True
+            if not counter_buffer.is_direct and not self._joke_exists(joke_id):
+                return False
+            return counter_buffer.incr("joke_likes", joke_id, db=self.db)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新收藏状态失败: {e}")
             return False
+    
+    async def toggle_favorite_async(self, joke_id: int) -> bool:
+        """toggle_favorite 的异步版本"""
+        try:
+            if not counter_buffer.is_direct and not self._joke_exists(joke_id):
+                return False
+            return await counter_buffer.incr_async("joke_likes", joke_id, db=self.db)
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新收藏状态失败: {e}")
             return False
     
-    def _build_prompt(self, request: JokeGenerateRequest) -> str:
+    def _joke_exists(self, joke_id: int) -> bool:
+        """笑话是否存在"""
+        return self.db.query(Joke.id).filter(Joke.id == joke_id).first() is not None
+    
+    async def _generate_content(self, request: JokeGenerateRequest, prompt: str) -> str:
+        """生成笑话内容"""
+        # 优先从蓄水池取预生成的笑话
+        if joke_reservoir.enabled and joke_reservoir.is_eligible(request):
+            content = await joke_reservoir.take(request)
+            if content is not None:
+                return content
+        
+        # 其次查生成结果缓存
+        temperature = request.temperature or 0.8
+        cache_key = None
+        if generation_cache.enabled:
+            cache_key = generation_cache.make_key(prompt, settings.QWEN_MODEL, temperature, request.length)
+            content = await generation_cache.get_async(cache_key)
+            if content is not None:
+                return content
+        
+        # 未命中时调用AI服务生成笑话
+        content = await self.ai_service.generate_joke(
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=settings.QWEN_MAX_TOKENS
+        )
+        
+        # 备用笑话不写入缓存，避免上游恢复后仍返回备用内容
+        if cache_key is not None and content not in self.ai_service.fallback_jokes:
+            await generation_cache.add_async(cache_key, content)
+        
+        return content
+    
+    def _build_joke_create(
+        self,
+        request: JokeGenerateRequest,
+        prompt: str,
+        content: str,
+        user_id: Optional[int] = None
+    ) -> JokeCreate:
+        """构建笑话记录"""
+        return JokeCreate(
+            content=content,
+            category=request.category,
+            tags=",".join(request.tags) if request.tags else None,
+            prompt=prompt,
+            model_name=settings.QWEN_MODEL,
+            temperature=request.temperature,
+            user_id=user_id
+        )
+    
+    @staticmethod
+    def _build_prompt(request: JokeGenerateRequest) -> str:
         """构建生成提示词"""
         base_prompt = "请生成一个幽默的冷笑话"
         
@@ -213,16 +435,64 @@ class JokeService:
         
         return base_prompt
     
-    def _update_user_stats(self, user_id: int, stat_type: str):
+    @staticmethod
+    def _filter_jokes(statement, category: Optional[str], is_featured: Optional[bool], is_public: bool):
+        """列表筛选条件，statement 可以是 Query 或 select()"""
+        statement = statement.filter(Joke.is_public == is_public)
+        
+        if category:
+            statement = statement.filter(Joke.category == category)
+        
+        if is_featured is not None:
+            statement = statement.filter(Joke.is_featured == is_featured)
+        
+        return statement
+    
+    @staticmethod
+    def _list_count_key(category: Optional[str], is_featured: Optional[bool], is_public: bool) -> str:
+        return count_cache.make_key(
+            "jokes", is_public=is_public, category=category or None, is_featured=is_featured
+        )
+    
+    @staticmethod
+    def _list_namespaces(jokes: List[Joke]) -> List[str]:
+        """新增笑话后需要失效的命名空间"""
+        namespaces = [CacheNamespace.JOKE_LISTS]
+        for joke in jokes:
+            if joke.category:
+                namespaces.append(CacheNamespace.joke_category(joke.category))
+            if joke.user_id:
+                namespaces.append(CacheNamespace.user_jokes(joke.user_id))
+                namespaces.append(CacheNamespace.USER_STATS)
+        return namespaces
+    
+    async def _invalidate_lists(self, jokes: List[Joke]):
+        """新增笑话后递增相关命名空间的代数"""
+        await async_cache.bump_namespace(*self._list_namespaces(jokes))
+    
+    def _update_user_stats(self, user_id: int, stat_type: str, amount: int = 1):
         """更新用户统计"""
         try:
-            from app.models.user import User
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if user:
-                if stat_type == "generated":
-                    user.total_generated += 1
-                elif stat_type == "shared":
-                    user.total_shared += 1
-                self.db.commit()
+            write = self._user_stats_writer(user_id, stat_type, amount)
+            if write:
+                write_queue.execute(self.db, write)
+        except Exception as e:
+            logger.error(f"更新用户统计失败: {e}")
+    
+    async def _update_user_stats_async(self, user_id: int, stat_type: str, amount: int = 1):
+        """_update_user_stats 的异步版本"""
+        try:
+            write = self._user_stats_writer(user_id, stat_type, amount)
+            if write:
+                await write_queue.execute_async(self.db, write)
         except Exception as e:
-            logger.error(f"更新用户统计失败: {e}")
\ No newline at end of file
+            logger.error(f"更新用户统计失败: {e}")
+    
+    @staticmethod
+    def _user_stats_writer(user_id: int, stat_type: str, amount: int):
+        """原子累加用户统计的写操作，未知统计类型返回None"""
+        from app.models.user import User
+        field = {"generated": "total_generated", "shared": "total_shared"}.get(stat_type)
+        if not field:
+            return None
+        return lambda db: atomic_increment(db, User, user_id, **{field: amount})
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+上游延迟统计
+
+维护最近N次调用延迟的滑动窗口，按分位数计算自适应超时和对冲请求的触发延迟。
+"""
+from collections import deque
+from typing import Deque, Optional
+
+from app.core.config import settings
+
+
+class LatencyTracker:
+    """延迟滑动窗口"""
+    
+    def __init__(self, window_size: Optional[int] = None, min_samples: Optional[int] = None):
+        self.window_size = window_size or settings.QWEN_LATENCY_WINDOW_SIZE
+        self.min_samples = settings.QWEN_LATENCY_MIN_SAMPLES if min_samples is None else min_samples
+        self._samples: Deque[float] = deque(maxlen=self.window_size)
+        
+        # 统计信息
+        self.timeouts = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+    
+    def record(self, seconds: float):
+        """记录一次调用耗时"""
+        self._samples.append(seconds)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """计算分位延迟，样本不足时返回None"""
+        if len(self._samples) < max(self.min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))]
+    
+    def timeout(self) -> Optional[float]:
+        """自适应超时（秒），未启用或样本不足时返回None表示使用固定超时"""
+        if not settings.QWEN_ADAPTIVE_TIMEOUT_ENABLED:
+            return None
+        latency = self.quantile(settings.QWEN_ADAPTIVE_TIMEOUT_QUANTILE)
+        if latency is None:
+            return None
+        return min(
+            max(latency * settings.QWEN_ADAPTIVE_TIMEOUT_MULTIPLIER, settings.QWEN_ADAPTIVE_TIMEOUT_MIN),
+            settings.QWEN_ADAPTIVE_TIMEOUT_MAX
+        )
+    
+    def hedge_delay(self) -> Optional[float]:
+        """对冲请求的触发延迟（秒），未启用或样本不足时返回None"""
+        if not settings.QWEN_HEDGE_ENABLED:
+            return None
+        latency = self.quantile(settings.QWEN_HEDGE_QUANTILE)
+        if latency is None:
+            return None
+        return max(latency, settings.QWEN_HEDGE_MIN_DELAY)
+    
+    def get_stats(self) -> dict:
+        """获取延迟统计"""
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+        
+        return {
+            "samples": len(self._samples),
+            "p50_ms": ms(self.quantile(0.50)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "adaptive_timeout_ms": ms(self.timeout()),
+            "hedge_delay_ms": ms(self.hedge_delay()),
+            "timeouts": self.timeouts,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won
+        }
+
+
+# 千问API延迟统计
+qwen_latency = LatencyTracker()
@@ -0,0 +1,118 @@
+"""
+请求合并服务
+
+相同提示词和参数的并发生成请求共享一次上游调用（single-flight）。
+开启多选模式时，在短暂窗口内收集同批请求，通过一次多候选（n>1）
+请求为每个调用方返回不同的笑话。
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 参数为候选数量，返回上游生成的内容列表
+ChoicesCall = Callable[[int], Awaitable[List[str]]]
+
+
+class _Flight:
+    """一次进行中的上游调用"""
+    
+    def __init__(self):
+        self.waiters: List[asyncio.Future] = []
+
+
+class RequestCoalescer:
+    """请求合并器"""
+    
+    def __init__(
+        self,
+        variety: Optional[bool] = None,
+        window_ms: Optional[int] = None,
+        max_choices: Optional[int] = None
+    ):
+        self.variety = settings.QWEN_COALESCE_VARIETY if variety is None else variety
+        self.window = (settings.QWEN_COALESCE_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_choices = max_choices or settings.QWEN_COALESCE_MAX_CHOICES
+        
+        self._flights: Dict[Hashable, _Flight] = {}
+        # 事件循环只弱引用任务，需持有引用防止进行中的调用被回收
+        self._tasks: Set[asyncio.Task] = set()
+        
+        # 统计信息
+        self.requests = 0
+        self.upstream_calls = 0
+    
+    async def run(self, key: Hashable, call: ChoicesCall) -> str:
+        """执行或加入一次合并调用"""
+        self.requests += 1
+        waiter = asyncio.get_running_loop().create_future()
+        
+        flight = self._flights.get(key)
+        if flight is None or (self.variety and len(flight.waiters) >= self.max_choices):
+            flight = _Flight()
+            flight.waiters.append(waiter)
+            self._flights[key] = flight
+            # 上游调用放在独立任务中，单个调用方取消不影响其他调用方
+            task = asyncio.create_task(self._dispatch(key, flight, call))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            flight.waiters.append(waiter)
+        
+        return await waiter
+    
+    def get_stats(self) -> dict:
+        """获取合并统计信息"""
+        coalesced = max(self.requests - self.upstream_calls, 0)
+        return {
+            "enabled": settings.QWEN_COALESCE_ENABLED,
+            "variety": self.variety,
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._flights)
+        }
+    
+    async def _dispatch(self, key: Hashable, flight: _Flight, call: ChoicesCall):
+        """发起上游调用并把结果分发给所有等待者"""
+        try:
+            if self.variety:
+                # 等待窗口内的同批请求，之后新到的请求进入下一批
+                await asyncio.sleep(self.window)
+                self._release(key, flight)
+                choices = min(len(flight.waiters), self.max_choices)
+            else:
+                choices = 1
+            
+            self.upstream_calls += 1
+            results = await call(choices)
+            if not results:
+                raise ValueError("上游未返回任何候选结果")
+        except Exception as e:
+            self._release(key, flight)
+            for waiter in flight.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        
+        # 非多选模式下，结果返回前到达的请求仍可加入本次调用
+        self._release(key, flight)
+        for index, waiter in enumerate(flight.waiters):
+            if not waiter.done():
+                waiter.set_result(results[index % len(results)])
+        
+        if len(flight.waiters) > 1:
+            logger.debug(f"合并{len(flight.waiters)}个相同请求为1次上游调用")
+    
+    def _release(self, key: Hashable, flight: _Flight):
+        """停止接收新的等待者"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+# 全局请求合并实例
+generation_coalescer = RequestCoalescer()
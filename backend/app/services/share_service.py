@@ -1,19 +1,35 @@
 """
 分享服务
 """
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import Select, func, desc, select
 
 from app.core.logging import get_logger
 from app.core.exceptions import DatabaseException
+from app.db.atomic import atomic_increment
+from app.db.pagination import paginate, paginate_async, timestamp_param
+from app.db.write_queue import write_queue
 from app.models.share import Share
 from app.models.joke import Joke
 from app.schemas.joke import ShareRequest, ShareCreate, ShareStatsResponse
+from app.services.cache_decorator import cached
+from app.services.cache_service import CacheNamespace, async_cache
+from app.services.counter_buffer import counter_buffer
 
 logger = get_logger(__name__)
 
+# 同步和异步统计方法共用缓存
+cache_share_stats = cached(
+    "shares:stats",
+    ttl=300,
+    namespaces=lambda args: [CacheNamespace.SHARE_STATS],
+    model=ShareStatsResponse,
+    fallback=lambda args: ShareService._build_stats(0, [], [], [])
+)
+
 
 class ShareService:
     """分享服务类"""
@@ -30,11 +46,6 @@ class ShareService:
     ) -> Share:
         """创建分享记录"""
         try:
-            # 检查笑话是否存在
-            joke = self.db.query(Joke).filter(Joke.id == share_request.joke_id).first()
-            if not joke:
-                raise DatabaseException("笑话不存在")
-            
             # 生成分享链接
             share_url = self._generate_share_url(share_request.joke_id)
             
@@ -47,18 +58,29 @@ class ShareService:
                 user_agent=user_agent
             )
             
-            share = Share(**share_create.model_dump())
-            self.db.add(share)
-            
-            # 更新笑话分享次数
-            joke.share_count += 1
-            
-            # 更新用户分享统计
+            def write(db: Session) -> int:
+                # 原子更新笑话分享次数，同时检查笑话是否存在
+                if atomic_increment(db, Joke, share_request.joke_id, share_count=1) is None:
+                    raise DatabaseException("笑话不存在")
+                
+                share = Share(**share_create.model_dump())
+                db.add(share)
+                
+                # 更新用户分享统计
+                if user_id:
+                    self._update_user_share_stats(db, user_id)
+                
+                db.flush()
+                return share.id
+            
+            share_id = await write_queue.execute_async(self.db, write)
+            share = self.db.get(Share, share_id, populate_existing=True)
+            
+            # 分享统计失效；有用户时用户分享排行也失效
+            namespaces = [CacheNamespace.SHARE_STATS]
             if user_id:
-                self._update_user_share_stats(user_id)
-            
-            self.db.commit()
-            self.db.refresh(share)
+                namespaces.append(CacheNamespace.USER_STATS)
+            await async_cache.bump_namespace(*namespaces)
             
             logger.info(f"创建分享记录成功: {share.id}")
             return share
@@ -68,72 +90,37 @@ class ShareService:
             logger.error(f"创建分享记录失败: {e}")
             raise DatabaseException(f"创建分享记录失败: {str(e)}")
     
+    @cache_share_stats
     def get_share_stats(self, days: int = 7) -> ShareStatsResponse:
-        """获取分享统计"""
-        try:
-            # 计算时间范围
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days)
-            
-            # 总分享次数
-            total_shares = self.db.query(Share).filter(
-                Share.created_at >= start_date
-            ).count()
-            
-            # 按平台统计
-            platform_stats = {}
-            platform_query = self.db.query(
-                Share.share_to,
-                func.count(Share.id).label('count')
-            ).filter(
-                Share.created_at >= start_date
-            ).group_by(Share.share_to).all()
-            
-            for platform, count in platform_query:
-                platform_stats[platform] = count
-            
-            # 最近分享记录
-            recent_shares = self.db.query(Share).filter(
-                Share.created_at >= start_date
-            ).order_by(desc(Share.created_at)).limit(10).all()
-            
-            # 最受欢迎的笑话
-            top_shared_query = self.db.query(
-                Joke,
-                func.count(Share.id).label('share_count')
-            ).join(Share).filter(
-                Share.created_at >= start_date
-            ).group_by(Joke.id).order_by(
-                desc(func.count(Share.id))
-            ).limit(5).all()
-            
-            top_shared_jokes = [joke for joke, _ in top_shared_query]
-            
-            return ShareStatsResponse(
-                total_shares=total_shares,
-                platform_stats=platform_stats,
-                recent_shares=recent_shares,
-                top_shared_jokes=top_shared_jokes
-            )
-            
-        except Exception as e:
-            logger.error(f"获取分享统计失败: {e}")
-            return ShareStatsResponse(
-                total_shares=0,
-                platform_stats={},
-                recent_shares=[],
-                top_shared_jokes=[]
-            )
+        """获取分享统计，查询失败时返回空统计且不缓存"""
+        total, platforms, recent, top_shared = self._stats_statements(days)
+        return self._build_stats(
+            self.db.execute(total).scalar_one(),
+            self.db.execute(platforms).all(),
+            self.db.execute(recent).scalars().all(),
+            self.db.execute(top_shared).all()
+        )
+    
+    @cache_share_stats
+    async def get_share_stats_async(self, days: int = 7) -> ShareStatsResponse:
+        """get_share_stats 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(ShareService.get_share_stats.uncached, self, days)
+        
+        total, platforms, recent, top_shared = self._stats_statements(days)
+        return self._build_stats(
+            (await self.db.execute(total)).scalar_one(),
+            (await self.db.execute(platforms)).all(),
+            (await self.db.execute(recent)).scalars().all(),
+            (await self.db.execute(top_shared)).all()
+        )
     
     def increment_click_count(self, share_id: int) -> bool:
-        """增加点击次数"""
+        """增加点击次数（写回缓冲，定期批量写入）"""
         try:
-            share = self.db.query(Share).filter(Share.id == share_id).first()
-            if share:
-                share.click_count += 1
-                self.db.commit()
-                return True
-            return False
+            if not counter_buffer.is_direct and not self.db.query(Share.id).filter(Share.id == share_id).first():
+                return False
+            return counter_buffer.incr("share_clicks", share_id, db=self.db)
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新点击次数失败: {e}")
@@ -147,21 +134,65 @@ class ShareService:
         self,
         user_id: int,
         page: int = 1,
-        size: int = 10
+        size: int = 10,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None
     ) -> Dict[str, Any]:
-        """获取用户分享记录"""
+        """获取用户分享记录，传入cursor时使用游标分页"""
         query = self.db.query(Share).filter(Share.user_id == user_id)
         
-        total = query.count()
-        shares = query.order_by(desc(Share.created_at)).offset((page - 1) * size).limit(size).all()
+        return paginate(query, Share, page, size, cursor, include_total)
+    
+    async def get_user_shares_async(
+        self,
+        user_id: int,
+        page: int = 1,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """get_user_shares 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(self.get_user_shares, user_id, page, size, cursor, include_total)
         
-        return {
-            "items": shares,
-            "total": total,
-            "page": page,
-            "size": size,
-            "pages": (total + size - 1) // size
-        }
+        statement = select(Share).where(Share.user_id == user_id)
+        
+        return await paginate_async(self.db, statement, Share, page, size, cursor, include_total)
+    
+    def _stats_statements(self, days: int) -> Tuple[Select, Select, Select, Select]:
+        """分享统计的查询语句：总数、按平台统计、最近分享、最受欢迎的笑话"""
+        start_date = timestamp_param(self.db, datetime.utcnow() - timedelta(days=days))
+        
+        total = select(func.count(Share.id)).where(Share.created_at >= start_date)
+        platforms = select(
+            Share.share_to,
+            func.count(Share.id).label('count')
+        ).where(
+            Share.created_at >= start_date
+        ).group_by(Share.share_to)
+        recent = select(Share).where(
+            Share.created_at >= start_date
+        ).order_by(desc(Share.created_at)).limit(10)
+        top_shared = select(
+            Joke,
+            func.count(Share.id).label('share_count')
+        ).join(Share).where(
+            Share.created_at >= start_date
+        ).group_by(Joke.id).order_by(
+            desc(func.count(Share.id))
+        ).limit(5)
+        
+        return total, platforms, recent, top_shared
+    
+    @staticmethod
+    def _build_stats(total_shares: int, platform_rows, recent_shares, top_shared_rows) -> ShareStatsResponse:
+        """组装分享统计结果"""
+        return ShareStatsResponse(
+            total_shares=total_shares,
+            platform_stats={platform: count for platform, count in platform_rows},
+            recent_shares=list(recent_shares),
+            top_shared_jokes=[joke for joke, _ in top_shared_rows]
+        )
     
     def _generate_share_url(self, joke_id: int) -> str:
         """生成分享链接"""
@@ -169,12 +200,10 @@ class ShareService:
         # 例如：https://your-domain.com/share/joke/{joke_id}
         return f"/share/joke/{joke_id}"
     
-    def _update_user_share_stats(self, user_id: int):
+    def _update_user_share_stats(self, db: Session, user_id: int):
         """更新用户分享统计"""
         try:
             from app.models.user import User
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if user:
-                user.total_shared += 1
+            atomic_increment(db, User, user_id, total_shared=1)
         except Exception as e:
             logger.error(f"更新用户分享统计失败: {e}")
\ No newline at end of file
@@ -1,18 +1,32 @@
 """
 用户服务
 """
-from datetime import datetime
-from typing import Optional, Dict, Any
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import Select, desc, func, select
 
 from app.core.logging import get_logger
 from app.core.exceptions import DatabaseException
+from app.db.pagination import paginate, paginate_async, timestamp_param
+from app.db.write_queue import write_queue
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate, UserStatsResponse
+from app.services.cache_decorator import cached
+from app.services.cache_service import CacheNamespace, async_cache, cache
 
 logger = get_logger(__name__)
 
+# 同步和异步统计方法共用缓存
+cache_user_stats = cached(
+    "users:stats",
+    ttl=300,
+    namespaces=lambda args: [CacheNamespace.USER_STATS],
+    model=UserStatsResponse,
+    fallback=lambda args: UserService._build_stats([0, 0, 0], [[], []])
+)
+
 
 class UserService:
     """用户服务类"""
@@ -23,10 +37,24 @@ class UserService:
     def create_user(self, user_create: UserCreate) -> User:
         """创建用户"""
         try:
-            user = User(**user_create.model_dump())
-            self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
+            user_id = write_queue.execute(self.db, self._user_writer(user_create))
+            user = self.db.get(User, user_id, populate_existing=True)
+            self._invalidate_stats()
+            
+            logger.info(f"创建用户成功: {user.id}")
+            return user
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"创建用户失败: {e}")
+            raise DatabaseException(f"创建用户失败: {str(e)}")
+    
+    async def create_user_async(self, user_create: UserCreate) -> User:
+        """create_user 的异步版本，供异步接口使用"""
+        try:
+            user_id = await write_queue.execute_async(self.db, self._user_writer(user_create))
+            user = self.db.get(User, user_id, populate_existing=True)
+            await self._invalidate_stats_async()
             
             logger.info(f"创建用户成功: {user.id}")
             return user
@@ -36,10 +64,26 @@ class UserService:
             logger.error(f"创建用户失败: {e}")
             raise DatabaseException(f"创建用户失败: {str(e)}")
     
+    @staticmethod
+    def _user_writer(user_create: UserCreate):
+        """插入用户的写操作，返回新用户ID"""
+        def write(db: Session) -> int:
+            user = User(**user_create.model_dump())
+            db.add(user)
+            db.flush()
+            return user.id
+        return write
+    
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """根据ID获取用户"""
         return self.db.query(User).filter(User.id == user_id).first()
     
+    async def get_user_by_id_async(self, user_id: int) -> Optional[User]:
+        """get_user_by_id 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(self.get_user_by_id, user_id)
+        return await self.db.get(User, user_id)
+    
     def get_user_by_openid(self, openid: str) -> Optional[User]:
         """根据openid获取用户"""
         return self.db.query(User).filter(User.openid == openid).first()
@@ -47,16 +91,24 @@ class UserService:
     def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[User]:
         """更新用户信息"""
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
+            if not write_queue.execute(self.db, self._update_writer(user_id, user_update)):
                 return None
+            user = self.db.get(User, user_id, populate_existing=True)
             
-            update_data = user_update.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(user, field, value)
+            logger.info(f"更新用户信息成功: {user.id}")
+            return user
             
-            self.db.commit()
-            self.db.refresh(user)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新用户信息失败: {e}")
+            raise DatabaseException(f"更新用户信息失败: {str(e)}")
+    
+    async def update_user_async(self, user_id: int, user_update: UserUpdate) -> Optional[User]:
+        """update_user 的异步版本"""
+        try:
+            if not await write_queue.execute_async(self.db, self._update_writer(user_id, user_update)):
+                return None
+            user = self.db.get(User, user_id, populate_existing=True)
             
             logger.info(f"更新用户信息成功: {user.id}")
             return user
@@ -69,113 +121,124 @@ class UserService:
     def update_last_login(self, user_id: int) -> Optional[User]:
         """更新最后登录时间"""
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
+            if not write_queue.execute(self.db, self._login_writer(user_id)):
                 return None
+            return self.db.get(User, user_id, populate_existing=True)
             
-            user.last_login_at = datetime.utcnow()
-            self.db.commit()
-            self.db.refresh(user)
-            
-            return user
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新登录时间失败: {e}")
+            return None
+    
+    async def update_last_login_async(self, user_id: int) -> Optional[User]:
+        """update_last_login 的异步版本"""
+        try:
+            if not await write_queue.execute_async(self.db, self._login_writer(user_id)):
+                return None
+            return self.db.get(User, user_id, populate_existing=True)
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新登录时间失败: {e}")
             return None
     
+    @staticmethod
+    def _update_writer(user_id: int, user_update: UserUpdate):
+        """更新用户信息的写操作，用户不存在时返回False"""
+        update_data = user_update.model_dump(exclude_unset=True)
+        
+        def write(db: Session) -> bool:
+            user = db.get(User, user_id)
+            if not user:
+                return False
+            for field, value in update_data.items():
+                setattr(user, field, value)
+            return True
+        return write
+    
+    @staticmethod
+    def _login_writer(user_id: int):
+        """更新最后登录时间的写操作，用户不存在时返回False"""
+        def write(db: Session) -> bool:
+            user = db.get(User, user_id)
+            if not user:
+                return False
+            user.last_login_at = datetime.utcnow()
+            return True
+        return write
+    
     def get_users(
         self,
         page: int = 1,
         size: int = 10,
-        is_active: Optional[bool] = None
+        is_active: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None
     ) -> Dict[str, Any]:
-        """获取用户列表"""
+        """获取用户列表，传入cursor时使用游标分页"""
         query = self.db.query(User)
         
         if is_active is not None:
             query = query.filter(User.is_active == is_active)
         
-        total = query.count()
-        users = query.order_by(desc(User.created_at)).offset((page - 1) * size).limit(size).all()
+        return paginate(query, User, page, size, cursor, include_total)
+    
+    async def get_users_async(
+        self,
+        page: int = 1,
+        size: int = 10,
+        is_active: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """get_users 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(self.get_users, page, size, is_active, cursor, include_total)
+        
+        statement = select(User)
         
-        return {
-            "items": users,
-            "total": total,
-            "page": page,
-            "size": size,
-            "pages": (total + size - 1) // size
-        }
+        if is_active is not None:
+            statement = statement.where(User.is_active == is_active)
+        
+        return await paginate_async(self.db, statement, User, page, size, cursor, include_total)
     
+    @cache_user_stats
     def get_user_stats(self) -> UserStatsResponse:
-        """获取用户统计信息"""
-        try:
-            # 总用户数
-            total_users = self.db.query(User).count()
-            
-            # 活跃用户数
-            active_users = self.db.query(User).filter(User.is_active == True).count()
-            
-            # 今日新用户数
-            today = datetime.utcnow().date()
-            new_users_today = self.db.query(User).filter(
-                func.date(User.created_at) == today
-            ).count()
-            
-            # 生成次数最多的用户
-            top_generators = self.db.query(User).filter(
-                User.total_generated > 0
-            ).order_by(desc(User.total_generated)).limit(5).all()
-            
-            # 分享次数最多的用户
-            top_sharers = self.db.query(User).filter(
-                User.total_shared > 0
-            ).order_by(desc(User.total_shared)).limit(5).all()
-            
-            return UserStatsResponse(
-                total_users=total_users,
-                active_users=active_users,
-                new_users_today=new_users_today,
-                top_generators=[
-                    {
-                        "id": user.id,
-                        "nickname": user.nickname,
-                        "total_generated": user.total_generated
-                    }
-                    for user in top_generators
-                ],
-                top_sharers=[
-                    {
-                        "id": user.id,
-                        "nickname": user.nickname,
-                        "total_shared": user.total_shared
-                    }
-                    for user in top_sharers
-                ]
-            )
-            
-        except Exception as e:
-            logger.error(f"获取用户统计失败: {e}")
-            return UserStatsResponse(
-                total_users=0,
-                active_users=0,
-                new_users_today=0,
-                top_generators=[],
-                top_sharers=[]
-            )
+        """获取用户统计信息，查询失败时返回全零统计且不缓存"""
+        counts, rankings = self._stats_statements()
+        return self._build_stats(
+            [self.db.execute(statement).scalar_one() for statement in counts],
+            [self.db.execute(statement).scalars().all() for statement in rankings]
+        )
+    
+    @cache_user_stats
+    async def get_user_stats_async(self) -> UserStatsResponse:
+        """get_user_stats 的异步版本"""
+        if isinstance(self.db, Session):
+            return await asyncio.to_thread(UserService.get_user_stats.uncached, self)
+        
+        counts, rankings = self._stats_statements()
+        return self._build_stats(
+            [(await self.db.execute(statement)).scalar_one() for statement in counts],
+            [(await self.db.execute(statement)).scalars().all() for statement in rankings]
+        )
     
     def ban_user(self, user_id: int) -> bool:
         """封禁用户"""
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
-                return False
+            def write(db: Session) -> bool:
+                user = db.get(User, user_id)
+                if not user:
+                    return False
+                user.is_banned = True
+                user.is_active = False
+                return True
             
-            user.is_banned = True
-            user.is_active = False
-            self.db.commit()
+            if not write_queue.execute(self.db, write):
+                return False
+            self._invalidate_stats()
             
-            logger.info(f"封禁用户成功: {user.id}")
+            logger.info(f"封禁用户成功: {user_id}")
             return True
             
         except Exception as e:
@@ -186,18 +249,81 @@ class UserService:
     def unban_user(self, user_id: int) -> bool:
         """解封用户"""
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
-            if not user:
-                return False
+            def write(db: Session) -> bool:
+                user = db.get(User, user_id)
+                if not user:
+                    return False
+                user.is_banned = False
+                user.is_active = True
+                return True
             
-            user.is_banned = False
-            user.is_active = True
-            self.db.commit()
+            if not write_queue.execute(self.db, write):
+                return False
+            self._invalidate_stats()
             
-            logger.info(f"解封用户成功: {user.id}")
+            logger.info(f"解封用户成功: {user_id}")
             return True
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"解封用户失败: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    @staticmethod
+    def _invalidate_stats():
+        """用户总数或活跃状态变化后使用户统计缓存失效"""
+        cache.bump_namespace(CacheNamespace.USER_STATS)
+    
+    @staticmethod
+    async def _invalidate_stats_async():
+        """_invalidate_stats 的异步版本"""
+        await async_cache.bump_namespace(CacheNamespace.USER_STATS)
+    
+    def _stats_statements(self) -> Tuple[List[Select], List[Select]]:
+        """用户统计的查询语句
+        
+        Returns:
+            (总用户数、活跃用户数、今日新用户数), (生成次数最多、分享次数最多的用户)
+        """
+        # 今日新用户数用范围条件代替 date(created_at)，可以使用索引
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        counts = [
+            select(func.count()).select_from(User),
+            select(func.count()).select_from(User).where(User.is_active == True),
+            select(func.count()).select_from(User).where(
+                User.created_at >= timestamp_param(self.db, today),
+                User.created_at < timestamp_param(self.db, today + timedelta(days=1))
+            )
+        ]
+        rankings = [
+            select(User).where(User.total_generated > 0).order_by(desc(User.total_generated)).limit(5),
+            select(User).where(User.total_shared > 0).order_by(desc(User.total_shared)).limit(5)
+        ]
+        return counts, rankings
+    
+    @staticmethod
+    def _build_stats(counts: List[int], rankings: List[List[User]]) -> UserStatsResponse:
+        """组装用户统计结果"""
+        total_users, active_users, new_users_today = counts
+        top_generators, top_sharers = rankings
+        return UserStatsResponse(
+            total_users=total_users,
+            active_users=active_users,
+            new_users_today=new_users_today,
+            top_generators=[
+                {
+                    "id": user.id,
+                    "nickname": user.nickname,
+                    "total_generated": user.total_generated
+                }
+                for user in top_generators
+            ],
+            top_sharers=[
+                {
+                    "id": user.id,
+                    "nickname": user.nickname,
+                    "total_shared": user.total_shared
+                }
+                for user in top_sharers
+            ]
+        )
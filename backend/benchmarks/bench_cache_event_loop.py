@@ -0,0 +1,95 @@
+"""
+缓存客户端事件循环阻塞基准测试
+
+在异步接口中使用同步 redis.Redis 时，每次网络往返都会阻塞整个事件循环。
+本测试在事件循环中运行一个1ms的心跳任务，记录其实际唤醒延迟（即循环
+卡顿时间），同时并发执行缓存读取，对比同步 CacheService 与异步
+AsyncCacheService 的卡顿总时长、最大卡顿和吞吐量。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_cache_event_loop --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from app.core.config import settings
+from app.services.cache_service import AsyncCacheService, CacheService
+from benchmarks.bench_http_pool import percentile, report
+from benchmarks.stub_redis import StubRedisServer
+
+HEARTBEAT_INTERVAL = 0.001
+
+
+async def heartbeat(lags: List[float], stop: asyncio.Event):
+    """按固定间隔唤醒，记录超出预期的延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(time.perf_counter() - start - HEARTBEAT_INTERVAL, 0.0))
+
+
+async def run_mode(name: str, get_stats, get_json, total: int, concurrency: int):
+    """并发执行缓存读取，同时测量事件循环卡顿"""
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+    
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            # 与管理接口一致：少量统计请求混在普通读取中
+            if index % 20 == 0:
+                await get_stats()
+            else:
+                await get_json(f"joke:{index % 100}")
+            samples.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    
+    report(name, samples, elapsed)
+    print(
+        f"{'':<12} 心跳={len(lags)} 卡顿总计={sum(lags) * 1000:8.1f}ms "
+        f"最大卡顿={max(lags) * 1000:7.2f}ms p99卡顿={percentile(lags, 0.99) * 1000:7.2f}ms"
+    )
+
+
+async def main(total: int, concurrency: int, delay: float):
+    settings.CACHE_L1_ENABLED = False
+    
+    with StubRedisServer(delay=delay) as server:
+        settings.REDIS_URL = server.url
+        settings.REDIS_MAX_CONNECTIONS = concurrency
+        
+        sync_cache = CacheService()
+        
+        async def sync_get_stats():
+            return sync_cache.get_stats()
+        
+        async def sync_get_json(key: str):
+            return sync_cache.get_json(key)
+        
+        await run_mode("sync", sync_get_stats, sync_get_json, total, concurrency)
+        
+        async_cache = AsyncCacheService()
+        await async_cache.connect()
+        try:
+            await run_mode("async", async_cache.get_stats, async_cache.get_json, total, concurrency)
+        finally:
+            await async_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="缓存客户端事件循环阻塞基准测试")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.002, help="每条Redis命令的延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.delay))
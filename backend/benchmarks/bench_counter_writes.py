@@ -0,0 +1,119 @@
+"""
+计数器写入基准测试
+
+在临时SQLite文件库中对少量热门笑话并发增加查看次数，对比：
+- legacy: 原实现，每次查询整行、+1、提交（读-改-写事务）
+- direct: 每次一条原子 UPDATE ... SET view_count = view_count + 1
+- memory: 进程内累加，后台定期批量写入
+
+输出每秒增量数、数据库写事务数和最终计数是否准确（读-改-写会丢失更新）。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_counter_writes --hits 5000 --workers 16 --hot 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.joke import Joke
+from app.services.counter_buffer import CounterBuffer
+
+
+def setup_database(path: str, jokes: int):
+    """创建库并插入笑话"""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    with session_factory() as db:
+        db.add_all([Joke(content=f"笑话{i}", category="程序员") for i in range(jokes)])
+        db.commit()
+    
+    commits = {"count": 0}
+    
+    @event.listens_for(engine, "commit")
+    def count_commit(conn):
+        commits["count"] += 1
+    
+    return engine, session_factory, commits
+
+
+def legacy_increment(session_factory, joke_id: int):
+    """原实现：读-改-写"""
+    with session_factory() as db:
+        joke = db.query(Joke).filter(Joke.id == joke_id).first()
+        joke.view_count += 1
+        db.commit()
+
+
+def run_mode(name: str, hits: int, workers: int, hot: int, flush_interval: float):
+    with tempfile.TemporaryDirectory() as directory:
+        engine, session_factory, commits = setup_database(os.path.join(directory, "bench.db"), max(hot, 100))
+        targets = [random.randint(1, hot) for _ in range(hits)]
+        
+        buffer = CounterBuffer(
+            mode=CounterBuffer.DIRECT if name == "direct" else CounterBuffer.MEMORY,
+            flush_interval=flush_interval,
+            session_factory=session_factory
+        )
+        stop = threading.Event()
+        
+        def flusher():
+            while not stop.wait(flush_interval):
+                buffer.flush()
+        
+        def one(joke_id: int):
+            if name == "legacy":
+                legacy_increment(session_factory, joke_id)
+            elif name == "direct":
+                with session_factory() as db:
+                    buffer.incr("joke_views", joke_id, db=db)
+            else:
+                buffer.incr("joke_views", joke_id)
+        
+        background = threading.Thread(target=flusher, daemon=True)
+        if name == "memory":
+            background.start()
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(one, targets))
+        if name == "memory":
+            stop.set()
+            background.join()
+            buffer.flush()
+        elapsed = time.perf_counter() - start
+        
+        with session_factory() as db:
+            total = db.query(func.sum(Joke.view_count)).scalar() or 0
+        engine.dispose()
+        
+        print(
+            f"{name:<8} 增量/秒={hits / elapsed:9.1f} 耗时={elapsed:6.2f}s "
+            f"写事务={commits['count']:<6} 最终计数={total}/{hits} 丢失={hits - total}"
+        )
+
+
+def main(hits: int, workers: int, hot: int, flush_interval: float):
+    for name in ("legacy", "direct", "memory"):
+        run_mode(name, hits, workers, hot, flush_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="计数器写入基准测试")
+    parser.add_argument("--hits", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--hot", type=int, default=10, help="热门笑话数量")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    args = parser.parse_args()
+    main(args.hits, args.workers, args.hot, args.flush_interval)
@@ -0,0 +1,114 @@
+"""
+数据库查询事件循环阻塞基准测试
+
+异步接口中直接调用同步Session查询时，整个查询期间事件循环被阻塞，
+同一进程里等待大模型响应的请求也无法推进。本测试在事件循环中并发运行：
+- 模拟的大模型调用（await asyncio.sleep），记录其实际耗时
+- 笑话列表查询（页码分页 + 精确COUNT）
+- 1ms心跳任务，记录事件循环卡顿
+
+分别用同步Session直接查询（旧实现）、同步Session放到线程池、AsyncSession
+（aiosqlite）三种方式执行列表查询，对比卡顿和两类请求的延迟。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_db_event_loop --rows 200000 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services.cache_service import async_cache, cache
+from app.services.joke_service import JokeService
+from benchmarks.bench_cache_event_loop import heartbeat, percentile
+from benchmarks.bench_http_pool import report
+from benchmarks.bench_pagination import seed
+
+
+async def run_mode(name: str, list_jokes, total: int, concurrency: int, llm_delay: float):
+    """并发执行大模型调用和列表查询，同时测量事件循环卡顿"""
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+    llm_samples: List[float] = []
+    list_samples: List[float] = []
+    
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            # 一半请求等待大模型，一半请求查询列表
+            if index % 2 == 0:
+                await asyncio.sleep(llm_delay)
+                llm_samples.append(time.perf_counter() - start)
+            else:
+                await list_jokes(index % 50 + 1)
+                list_samples.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    
+    print(f"[{name}]")
+    report("  llm", llm_samples, elapsed)
+    report("  list", list_samples, elapsed)
+    print(
+        f"  心跳={len(lags)} 卡顿总计={sum(lags) * 1000:8.1f}ms "
+        f"最大卡顿={max(lags) * 1000:7.2f}ms p99卡顿={percentile(lags, 0.99) * 1000:7.2f}ms"
+    )
+
+
+async def main(rows: int, total: int, concurrency: int, llm_delay: float, size: int):
+    # 直接测数据库查询
+    cache.enabled = False
+    async_cache.enabled = False
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=concurrency)
+        seed(engine, rows, per_second=7)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        
+        async def blocking(page: int):
+            with session_factory() as db:
+                service = JokeService(db)
+                return service.get_jokes.uncached(service, page=page, size=size)
+        
+        async def threaded(page: int):
+            with session_factory() as db:
+                service = JokeService(db)
+                return await service.get_jokes_async.uncached(service, page=page, size=size)
+        
+        async def native(page: int):
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                service = JokeService(db)
+                return await service.get_jokes_async.uncached(service, page=page, size=size)
+        
+        try:
+            for name, list_jokes in (("sync", blocking), ("to_thread", threaded), ("async", native)):
+                # 预热连接和页缓存
+                await list_jokes(1)
+                await run_mode(name, list_jokes, total, concurrency, llm_delay)
+        finally:
+            await async_engine.dispose()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库查询事件循环阻塞基准测试")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="模拟大模型调用耗时（秒）")
+    parser.add_argument("--size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.requests, args.concurrency, args.llm_delay, args.size))
@@ -0,0 +1,102 @@
+"""
+对冲请求与自适应超时基准测试
+
+本地千问桩服务模拟长尾延迟：大部分请求很快，少量请求非常慢。
+依次测量固定超时、自适应超时、对冲请求三种模式的 p50/p99 延迟、
+失败数和上游请求放大倍数。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_hedging --requests 400 --concurrency 10
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.core.http_client import build_http_client
+from app.services.ai_service import AIService
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.latency_tracker import LatencyTracker
+from benchmarks.bench_http_pool import report
+from benchmarks.stub_qwen import StubQwenServer
+
+
+def long_tail_delay(fast: float, slow: float, slow_ratio: float):
+    """长尾延迟分布"""
+    def delay() -> float:
+        if random.random() < slow_ratio:
+            return slow
+        return random.uniform(fast * 0.5, fast * 1.5)
+    return delay
+
+
+async def run_mode(
+    name: str,
+    server: StubQwenServer,
+    total: int,
+    concurrency: int,
+    adaptive: bool,
+    hedge: bool
+) -> Tuple[List[float], int]:
+    """在指定模式下压测，返回延迟样本和失败数"""
+    settings.QWEN_ADAPTIVE_TIMEOUT_ENABLED = adaptive
+    settings.QWEN_HEDGE_ENABLED = hedge
+    
+    client = build_http_client()
+    latency = LatencyTracker()
+    # 熔断器阈值放宽，只观察超时与对冲本身的效果
+    breaker = CircuitBreaker(name, min_calls=total + 1)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+    failures = 0
+    
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            service = AIService(client=client, breaker=breaker, latency=latency)
+            service.api_key = "bench"
+            service.api_url = server.url
+            start = time.perf_counter()
+            try:
+                await service._request_qwen("请生成一个冷笑话", 0.8, 200)
+            except Exception:
+                failures += 1
+            samples.append(time.perf_counter() - start)
+    
+    requests_before = server.request_count
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    report(name, samples, time.perf_counter() - start)
+    await client.aclose()
+    
+    amplification = (server.request_count - requests_before) / total
+    print(
+        f"{'':<12} 失败={failures} 上游放大={amplification:.2f}x "
+        f"对冲={latency.hedges_sent} 对冲胜出={latency.hedges_won} 超时={latency.timeouts}"
+    )
+    return samples, failures
+
+
+async def main(total: int, concurrency: int, fast: float, slow: float, slow_ratio: float):
+    settings.QWEN_ADAPTIVE_TIMEOUT_MIN = fast * 4
+    settings.QWEN_HEDGE_MIN_DELAY = fast
+    
+    server = StubQwenServer(delay=long_tail_delay(fast, slow, slow_ratio))
+    async with server:
+        await run_mode("fixed", server, total, concurrency, adaptive=False, hedge=False)
+        await run_mode("adaptive", server, total, concurrency, adaptive=True, hedge=False)
+        await run_mode("hedged", server, total, concurrency, adaptive=False, hedge=True)
+        await run_mode("both", server, total, concurrency, adaptive=True, hedge=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对冲请求与自适应超时基准测试")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fast", type=float, default=0.05, help="正常请求延迟（秒）")
+    parser.add_argument("--slow", type=float, default=2.0, help="长尾请求延迟（秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="长尾请求比例")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.fast, args.slow, args.slow_ratio))
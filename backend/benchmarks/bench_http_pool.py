@@ -0,0 +1,99 @@
+"""
+HTTP连接池基准测试
+
+对比每次调用新建 httpx.AsyncClient 与共享连接池客户端调用本地千问桩服务的
+p50/p99 延迟。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_http_pool --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from app.core.http_client import build_http_client
+from app.services.ai_service import AIService
+from benchmarks.stub_qwen import StubQwenServer
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """计算分位数"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name: str, samples: List[float], elapsed: float):
+    """打印统计结果"""
+    print(
+        f"{name:<12} n={len(samples):<5} "
+        f"p50={percentile(samples, 0.50) * 1000:7.2f}ms "
+        f"p99={percentile(samples, 0.99) * 1000:7.2f}ms "
+        f"mean={statistics.mean(samples) * 1000:7.2f}ms "
+        f"qps={len(samples) / elapsed:8.1f}"
+    )
+
+
+class UnpooledAIService(AIService):
+    """旧实现：每次调用都新建客户端"""
+    
+    async def _call_qwen_api(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            self._client = client
+            try:
+                return await super()._call_qwen_api(prompt, temperature, max_tokens)
+            finally:
+                self._client = None
+
+
+async def run(service_factory, total: int, concurrency: int) -> List[float]:
+    """并发调用并收集每次延迟"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+    
+    async def one():
+        async with semaphore:
+            # 与 JokeService 一致：每个请求新建 AIService
+            service = service_factory()
+            start = time.perf_counter()
+            await service._call_qwen_api("请生成一个冷笑话", 0.8, 200)
+            samples.append(time.perf_counter() - start)
+    
+    await asyncio.gather(*(one() for _ in range(total)))
+    return samples
+
+
+async def main(total: int, concurrency: int):
+    async with StubQwenServer() as server:
+        def configure(service: AIService) -> AIService:
+            service.api_key = "bench"
+            service.api_url = server.url
+            return service
+        
+        start = time.perf_counter()
+        samples = await run(lambda: configure(UnpooledAIService()), total, concurrency)
+        report("unpooled", samples, time.perf_counter() - start)
+        unpooled_connections = server.connection_count
+        
+        server.connection_count = 0
+        client = build_http_client()
+        try:
+            start = time.perf_counter()
+            samples = await run(lambda: configure(AIService(client=client)), total, concurrency)
+            report("pooled", samples, time.perf_counter() - start)
+        finally:
+            await client.aclose()
+        
+        print(f"TCP连接数: unpooled={unpooled_connections} pooled={server.connection_count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP连接池基准测试")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,98 @@
+"""
+笑话蓄水池负载测试
+
+本地千问桩服务每次生成耗时 1~5 秒（可用 --delay-scale 缩放），对比
+直接调用上游与先从蓄水池取笑话两种方式下的 p50/p99 生成延迟。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_joke_reservoir --requests 200 --rate 20 --delay-scale 0.2
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from app.core.http_client import build_http_client
+from app.schemas.joke import JokeGenerateRequest
+from app.services.ai_service import AIService
+from app.services.joke_reservoir import JokeReservoir
+from benchmarks.bench_http_pool import report
+from benchmarks.stub_qwen import StubQwenServer
+
+CATEGORIES = ["程序员", "动物", "生活", "校园"]
+
+
+async def fire(handler, total: int, rate: float) -> List[float]:
+    """按固定速率发起请求，收集每次延迟"""
+    samples: List[float] = []
+    
+    async def one(request: JokeGenerateRequest):
+        start = time.perf_counter()
+        await handler(request)
+        samples.append(time.perf_counter() - start)
+    
+    tasks = []
+    for i in range(total):
+        request = JokeGenerateRequest(category=CATEGORIES[i % len(CATEGORIES)], temperature=0.8)
+        tasks.append(asyncio.create_task(one(request)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return samples
+
+
+async def main(total: int, rate: float, delay_scale: float, high_water: int, concurrency: int):
+    server = StubQwenServer(delay=lambda: random.uniform(1.0, 5.0) * delay_scale)
+    async with server:
+        client = build_http_client()
+        ai_service = AIService(client=client)
+        ai_service.api_key = "bench"
+        ai_service.api_url = server.url
+        
+        async def direct(request: JokeGenerateRequest):
+            await ai_service._call_qwen_api("请生成一个冷笑话", 0.8, 200)
+        
+        start = time.perf_counter()
+        samples = await fire(direct, total, rate)
+        report("direct", samples, time.perf_counter() - start)
+        
+        reservoir = JokeReservoir(
+            low_water=max(high_water // 2, 1),
+            high_water=high_water,
+            use_redis=False,
+            refill_concurrency=concurrency,
+            ai_service=ai_service
+        )
+        reservoir.enabled = True
+        for category in CATEGORIES:
+            reservoir.register(JokeGenerateRequest(category=category, temperature=0.8))
+        await reservoir.start()
+        await reservoir.refill_all()
+        
+        async def pooled(request: JokeGenerateRequest):
+            if await reservoir.take(request) is None:
+                await direct(request)
+        
+        start = time.perf_counter()
+        samples = await fire(pooled, total, rate)
+        report("reservoir", samples, time.perf_counter() - start)
+        
+        await reservoir.stop()
+        await client.aclose()
+        
+        stats = await reservoir.get_stats()
+        print(
+            f"命中率={stats['hit_ratio']:.2%} 补充={stats['refilled']} "
+            f"补充速率={stats['refill_rate_per_minute']}/min"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="笑话蓄水池负载测试")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20.0, help="每秒请求数")
+    parser.add_argument("--delay-scale", type=float, default=0.2, help="上游延迟缩放系数")
+    parser.add_argument("--high-water", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16, help="补充并发数")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rate, args.delay_scale, args.high_water, args.concurrency))
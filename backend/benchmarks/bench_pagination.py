@@ -0,0 +1,102 @@
+"""
+分页基准测试
+
+在临时SQLite文件库中插入大量公开笑话（默认100万条，每秒7条，created_at
+有大量并列），分别用页码分页（精确COUNT、计数缓存、不返回总数）和游标分页
+读取第1页和第N页，对比耗时。
+表结构含模型上定义的 (is_public, created_at, id) 等复合索引。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_pagination --rows 1000000 --page 5000 --size 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.services.cache_service import cache
+from app.services.joke_service import JokeService
+
+
+def seed(engine, rows: int, per_second: int, batch: int = 50000):
+    """批量插入笑话，created_at与 CURRENT_TIMESTAMP 默认值格式相同（精确到秒）"""
+    Base.metadata.create_all(bind=engine)
+    base = datetime(2024, 1, 1)
+    statement = text(
+        "INSERT INTO jokes (content, category, is_public, is_featured, view_count, share_count, like_count, created_at, updated_at) "
+        "VALUES (:content, '程序员', 1, 0, 0, 0, 0, :created_at, :created_at)"
+    )
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(statement, [
+                {
+                    "content": f"基准笑话{i}",
+                    "created_at": (base + timedelta(seconds=i // per_second)).strftime("%Y-%m-%d %H:%M:%S")
+                }
+                for i in range(start, min(start + batch, rows))
+            ])
+        conn.execute(text("ANALYZE"))
+
+
+def timed(func, rounds: int) -> float:
+    """平均耗时（毫秒）"""
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(rows: int, page: int, size: int, rounds: int, per_second: int):
+    # 直接测数据库查询
+    cache.enabled = False
+    
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        start = time.perf_counter()
+        seed(engine, rows, per_second)
+        print(f"插入 {rows} 条笑话耗时 {time.perf_counter() - start:.1f}s")
+        
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        with session_factory() as db:
+            service = JokeService(db)
+            
+            # 第N页的游标：取第N-1页最后一条记录的位置
+            previous = service.get_jokes(page=page - 1, size=size, include_total=False)
+            deep_cursor = previous.next_cursor
+            first_cursor_page = service.get_jokes(size=size, include_total=False)
+            
+            cases = [
+                ("offset+count 第1页", lambda: service.get_jokes(page=1, size=size)),
+                (f"offset+count 第{page}页", lambda: service.get_jokes(page=page, size=size)),
+                ("offset+缓存总数 第1页", lambda: service.get_jokes(page=1, size=size, exact=False)),
+                (f"offset+缓存总数 第{page}页", lambda: service.get_jokes(page=page, size=size, exact=False)),
+                ("offset 第1页", lambda: service.get_jokes(page=1, size=size, include_total=False)),
+                (f"offset 第{page}页", lambda: service.get_jokes(page=page, size=size, include_total=False)),
+                ("cursor 第2页", lambda: service.get_jokes(size=size, cursor=first_cursor_page.next_cursor)),
+                (f"cursor 第{page}页", lambda: service.get_jokes(size=size, cursor=deep_cursor)),
+            ]
+            
+            offset_ids = [item.id for item in service.get_jokes(page=page, size=size).items]
+            cursor_ids = [item.id for item in service.get_jokes(size=size, cursor=deep_cursor).items]
+            assert offset_ids == cursor_ids, "游标分页结果与页码分页不一致"
+            
+            for name, func in cases:
+                print(f"{name:<20} {timed(func, rounds):8.2f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分页基准测试")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--per-second", type=int, default=7, help="每秒笑话数，制造created_at并列")
+    args = parser.parse_args()
+    main(args.rows, args.page, args.size, args.rounds, args.per_second)
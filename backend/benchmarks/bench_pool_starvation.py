@@ -0,0 +1,71 @@
+"""
+连接池耗尽与慢查询对比
+
+同样的并发和同样的单次查询耗时（事务内 sleep 模拟），分别在连接池偏小和
+连接池充足时运行，观察连接池监控的两个指标：
+- starved: 连接数少于并发数，获取连接的等待时间远高于占用时间
+- slow_query: 连接充足，等待接近0，占用时间等于查询耗时
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_pool_starvation --threads 16 --query-ms 20
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.db.pool_metrics import InstrumentedQueuePool, PoolMonitor
+
+
+def run_mode(name: str, pool_size: int, args):
+    """并发执行慢查询，打印连接池监控统计"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'pool.db')}",
+            connect_args={"check_same_thread": False},
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=0,
+            pool_timeout=30
+        )
+        monitor = PoolMonitor(name)
+        monitor.instrument(engine)
+        
+        def worker():
+            for _ in range(args.queries):
+                with engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                    time.sleep(args.query_ms / 1000)
+        
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    
+    stats = monitor.get_stats()
+    print(
+        f"{name:<11} pool={pool_size:<3} qps={args.threads * args.queries / elapsed:7.1f} "
+        f"wait_p50={stats['checkout_wait_p50_ms']:8.2f}ms wait_p99={stats['checkout_wait_p99_ms']:8.2f}ms "
+        f"hold_p50={stats['hold_p50_ms']:7.2f}ms hold_p99={stats['hold_p99_ms']:7.2f}ms"
+    )
+
+
+def main(args):
+    run_mode("starved", max(args.threads // 8, 1), args)
+    run_mode("slow_query", args.threads, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="连接池耗尽与慢查询对比")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=25, help="每个线程的查询次数")
+    parser.add_argument("--query-ms", type=float, default=20.0, help="模拟的单次查询耗时")
+    args = parser.parse_args()
+    main(args)
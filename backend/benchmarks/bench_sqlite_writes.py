@@ -0,0 +1,131 @@
+"""
+SQLite读写混合基准测试
+
+多个线程同时对同一个SQLite文件库执行读写混合负载：
+- 读：笑话列表分页查询
+- 写：查看次数原子累加（计数器direct模式）、更新用户最后登录时间
+
+对比三种配置：
+- default: 默认回滚日志模式，每个请求各自提交
+- wal: 开启生产模式PRAGMA（WAL、synchronous=NORMAL等），每个请求各自提交
+- wal+queue: 生产模式PRAGMA，写操作经单写线程队列合并提交
+
+报告读写吞吐、写入延迟和 "database is locked" 错误数。
+
+运行方式（在 backend 目录下）：
+    python -m benchmarks.bench_sqlite_writes --threads 16 --duration 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import List
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import configure_sqlite
+from app.db.write_queue import write_queue
+from app.models.user import User
+from app.services.cache_service import cache
+from app.services.counter_buffer import CounterBuffer, counter_buffer
+from app.services.joke_service import JokeService
+from app.services.user_service import UserService
+from benchmarks.bench_http_pool import percentile
+from benchmarks.bench_pagination import seed
+
+
+def run_mode(name: str, tuned: bool, queued: bool, args):
+    """在新建的库上运行一轮负载"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            connect_args={"check_same_thread": False},
+            pool_size=args.threads + 2
+        )
+        if tuned:
+            configure_sqlite(engine)
+        seed(engine, args.rows, per_second=7)
+        with engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [
+                {"openid": f"bench_user_{i}", "total_generated": 0, "total_shared": 0} for i in range(100)
+            ])
+        
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        write_queue.enabled = queued
+        write_queue.session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        
+        reads: List[float] = []
+        writes: List[float] = []
+        errors = [0]
+        stop = threading.Event()
+        
+        def worker(seed_value: int):
+            rng = random.Random(seed_value)
+            with session_factory() as db:
+                jokes = JokeService(db)
+                users = UserService(db)
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < args.write_ratio:
+                            if rng.random() < 0.5:
+                                ok = jokes.increment_view_count(rng.randint(1, args.rows))
+                            else:
+                                ok = users.update_last_login(rng.randint(1, 100)) is not None
+                            # 服务内部捕获了锁错误，失败时返回False/None
+                            if ok:
+                                writes.append(time.perf_counter() - start)
+                            else:
+                                errors[0] += 1
+                        else:
+                            jokes.get_jokes.uncached(jokes, page=rng.randint(1, 20), size=20, include_total=False)
+                            db.rollback()
+                            reads.append(time.perf_counter() - start)
+                    except OperationalError:
+                        errors[0] += 1
+                        db.rollback()
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        queue_stats = write_queue.get_stats()
+        write_queue.stop()
+        engine.dispose()
+    
+    print(
+        f"{name:<10} reads/s={len(reads) / elapsed:8.1f} writes/s={len(writes) / elapsed:8.1f} "
+        f"read_p99={percentile(reads, 0.99) * 1000:7.2f}ms "
+        f"write_p50={percentile(writes, 0.50) * 1000:7.2f}ms "
+        f"write_p99={percentile(writes, 0.99) * 1000:7.2f}ms errors={errors[0]}"
+        + (f" jobs/commit={queue_stats['jobs_per_commit']}" if queued else "")
+    )
+
+
+def main(args):
+    # 直接测数据库读写
+    cache.enabled = False
+    counter_buffer.mode = CounterBuffer.DIRECT
+    
+    run_mode("default", tuned=False, queued=False, args=args)
+    run_mode("wal", tuned=True, queued=False, args=args)
+    run_mode("wal+queue", tuned=True, queued=True, args=args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite读写混合基准测试")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="每种配置运行的秒数")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,108 @@
+"""
+本地千问API桩服务
+
+基于 asyncio 的极简 HTTP/1.1 服务，支持 keep-alive，返回与 DashScope
+相同结构的响应，供基准测试使用，不依赖外网和API密钥。
+"""
+import asyncio
+import json
+import random
+from typing import Callable, Optional
+
+
+def _default_delay() -> float:
+    """默认响应延迟（秒）"""
+    return 0.005
+
+
+class StubQwenServer:
+    """千问API桩服务"""
+    
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        delay: Optional[Callable[[], float]] = None,
+        content: str = "为什么程序员喜欢冷笑话？因为它们像代码一样冷！"
+    ):
+        self.host = host
+        self.port = port
+        self.delay = delay or _default_delay
+        self.content = content
+        self.request_count = 0
+        self.connection_count = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    @property
+    def url(self) -> str:
+        """服务地址"""
+        return f"http://{self.host}:{self.port}/api/v1/services/aigc/text-generation/generation"
+    
+    async def start(self):
+        """启动服务"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+    
+    async def stop(self):
+        """停止服务"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def __aenter__(self) -> "StubQwenServer":
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.stop()
+    
+    def build_body(self, payload: dict) -> dict:
+        """构建响应体"""
+        n = payload.get("parameters", {}).get("n", 1)
+        return {
+            "output": {
+                "choices": [
+                    {"message": {"role": "assistant", "content": f"{self.content}#{random.randint(0, 9999)}"}}
+                    for _ in range(n)
+                ]
+            },
+            "usage": {"input_tokens": 30, "output_tokens": 40}
+        }
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个TCP连接上的所有请求"""
+        self.connection_count += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+                payload = json.loads(raw) if raw else {}
+                self.request_count += 1
+                
+                await asyncio.sleep(self.delay())
+                
+                body = json.dumps(self.build_body(payload), ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,120 @@
+"""
+本地Redis桩服务
+
+在独立线程的事件循环中运行的极简 RESP2 服务，支持 PING/GET/SET/SETEX/
+DEL/INFO/PUBLISH 等少量命令，每条命令可注入固定延迟，供缓存基准测试使用。
+由于运行在独立线程中，同步客户端阻塞调用方的事件循环时桩服务仍能正常响应。
+"""
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+
+class StubRedisServer:
+    """Redis桩服务"""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.002):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.data: Dict[bytes, bytes] = {}
+        self.command_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+    
+    @property
+    def url(self) -> str:
+        """连接地址"""
+        return f"redis://{self.host}:{self.port}/0"
+    
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+    
+    def stop(self):
+        """停止服务"""
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+    
+    def __enter__(self) -> "StubRedisServer":
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+    
+    async def _shutdown(self):
+        """关闭监听并断开所有连接"""
+        self._server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+    
+    def execute(self, command: List[bytes]) -> bytes:
+        """执行一条命令并返回RESP编码的响应"""
+        name = command[0].upper()
+        args = command[1:]
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"GET":
+            value = self.data.get(args[0])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if name == b"SETEX":
+            self.data[args[0]] = args[2]
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % sum(1 for key in args if self.data.pop(key, None) is not None)
+        if name == b"INFO":
+            info = b"connected_clients:1\r\nused_memory_human:1M\r\ntotal_commands_processed:%d\r\n" % self.command_count
+            return b"$%d\r\n%s\r\n" % (len(info), info)
+        if name == b"PUBLISH":
+            return b":0\r\n"
+        return b"+OK\r\n"
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个TCP连接上的所有命令"""
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                count = int(header[1:])
+                command = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:])
+                    command.append((await reader.readexactly(length + 2))[:-2])
+                self.command_count += 1
+                
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                
+                writer.write(self.execute(command))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
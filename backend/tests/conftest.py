@@ -9,7 +9,9 @@ from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.replicas import get_read_db
+from app.db.session import get_async_db, get_db
+from app.services.counter_buffer import CounterBuffer, counter_buffer
 
 # 创建测试数据库
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_test.db"
@@ -22,6 +24,9 @@ engine = create_engine(
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 接口测试中的计数直接写入测试会话，不经过后台写回
+counter_buffer.mode = CounterBuffer.DIRECT
+
 
 def override_get_db():
     """覆盖数据库依赖"""
@@ -58,6 +63,9 @@ def db_session(db_engine):
 def client(db_session):
     """测试客户端fixture"""
     app.dependency_overrides[get_db] = lambda: db_session
+    # 只读接口也使用测试会话，*_async 方法对同步会话走线程池
+    app.dependency_overrides[get_async_db] = lambda: db_session
+    app.dependency_overrides[get_read_db] = lambda: db_session
     
     with TestClient(app) as test_client:
         yield test_client
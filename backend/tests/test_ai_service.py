@@ -132,4 +132,358 @@ class TestAIService:
         # 应该返回备用笑话
         assert isinstance(joke, str)
         assert len(joke) > 0
-        assert joke in ai_service.fallback_jokes
\ No newline at end of file
+        assert joke in ai_service.fallback_jokes
+    
+    def test_instances_share_pooled_client(self):
+        """测试多个AIService实例复用同一个连接池客户端"""
+        first = AIService()
+        second = AIService()
+        
+        assert first.client is second.client
+        assert not first.client.is_closed
+    
+    @pytest.mark.asyncio
+    async def test_close_http_client_recreates_on_demand(self):
+        """测试关闭共享客户端后可惰性重建"""
+        from app.core.http_client import close_http_client, get_http_client
+        
+        old_client = get_http_client()
+        await close_http_client()
+        
+        assert old_client.is_closed
+        assert get_http_client() is not old_client
+
+
+class TestRequestCoalescer:
+    """请求合并测试类"""
+    
+    @staticmethod
+    def make_call(calls: list, delay: float = 0.05):
+        """构造记录调用次数的上游桩"""
+        import asyncio
+        
+        async def call(n: int):
+            calls.append(n)
+            batch = len(calls)
+            await asyncio.sleep(delay)
+            return [f"笑话{batch}-{i}" for i in range(n)]
+        
+        return call
+    
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_call(self):
+        """测试相同请求只调用一次上游"""
+        import asyncio
+        from app.services.request_coalescer import RequestCoalescer
+        
+        coalescer = RequestCoalescer(variety=False)
+        calls = []
+        call = self.make_call(calls)
+        
+        results = await asyncio.gather(*(coalescer.run("same", call) for _ in range(10)))
+        
+        assert calls == [1]
+        assert len(set(results)) == 1
+        stats = coalescer.get_stats()
+        assert stats["upstream_calls"] == 1
+        assert stats["coalescing_ratio"] == 0.9
+    
+    @pytest.mark.asyncio
+    async def test_dispatch_task_is_referenced_until_done(self):
+        """测试进行中的上游任务被持有引用，完成后释放"""
+        import asyncio
+        import gc
+        from app.services.request_coalescer import RequestCoalescer
+        
+        coalescer = RequestCoalescer(variety=False)
+        calls = []
+        pending = asyncio.ensure_future(coalescer.run("same", self.make_call(calls)))
+        await asyncio.sleep(0)
+        
+        assert len(coalescer._tasks) == 1
+        gc.collect()
+        
+        assert await asyncio.wait_for(pending, timeout=1) == "笑话1-0"
+        assert not coalescer._tasks
+    
+    @pytest.mark.asyncio
+    async def test_variety_mode_returns_distinct_choices(self):
+        """测试多选模式为每个调用方返回不同结果"""
+        import asyncio
+        from app.services.request_coalescer import RequestCoalescer
+        
+        coalescer = RequestCoalescer(variety=True, window_ms=10, max_choices=4)
+        calls = []
+        call = self.make_call(calls)
+        
+        results = await asyncio.gather(*(coalescer.run("same", call) for _ in range(8)))
+        
+        assert calls == [4, 4]
+        assert len(set(results)) == 8
+    
+    @pytest.mark.asyncio
+    async def test_upstream_error_propagates_to_all_waiters(self):
+        """测试上游异常传递给所有等待者"""
+        import asyncio
+        from app.services.request_coalescer import RequestCoalescer
+        
+        coalescer = RequestCoalescer(variety=False)
+        
+        async def failing(n: int):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("上游故障")
+        
+        results = await asyncio.gather(
+            *(coalescer.run("same", failing) for _ in range(3)),
+            return_exceptions=True
+        )
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert coalescer.get_stats()["in_flight"] == 0
+
+
+class FakeQwenUpstream:
+    """本地假上游：按需注入失败和超时"""
+    
+    def __init__(self):
+        self.mode = "ok"
+        self.calls = 0
+    
+    async def handler(self, request):
+        import httpx
+        
+        self.calls += 1
+        if self.mode == "error":
+            return httpx.Response(500, json={"message": "internal error"})
+        if self.mode == "timeout":
+            raise httpx.ReadTimeout("read timeout", request=request)
+        return httpx.Response(200, json={
+            "output": {"choices": [{"message": {"content": "上游笑话"}}]}
+        })
+    
+    def make_service(self, breaker):
+        import httpx
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        service = AIService(client=client, breaker=breaker)
+        service.api_key = "test_api_key"
+        return service
+
+
+class TestCircuitBreaker:
+    """熔断器测试类"""
+    
+    @staticmethod
+    def make_breaker(**kwargs):
+        from app.services.circuit_breaker import CircuitBreaker
+        
+        options = dict(window_size=4, min_calls=4, error_rate=0.5, open_seconds=60)
+        options.update(kwargs)
+        return CircuitBreaker("test", **options)
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", ["error", "timeout"])
+    async def test_opens_and_falls_back_instantly(self, mode):
+        """测试连续失败后熔断打开并直接返回备用笑话"""
+        breaker = self.make_breaker()
+        upstream = FakeQwenUpstream()
+        upstream.mode = mode
+        service = upstream.make_service(breaker)
+        
+        for _ in range(2):
+            joke = await service.generate_joke("生成一个笑话")
+            assert joke in service.fallback_jokes
+        
+        assert breaker.state == breaker.OPEN
+        calls_when_opened = upstream.calls
+        
+        joke = await service.generate_joke("生成一个笑话")
+        assert joke in service.fallback_jokes
+        assert upstream.calls == calls_when_opened
+        assert breaker.get_stats()["total_rejected"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_half_open_probe_closes_breaker(self):
+        """测试半开探测成功后恢复关闭"""
+        breaker = self.make_breaker(open_seconds=0)
+        upstream = FakeQwenUpstream()
+        upstream.mode = "error"
+        service = upstream.make_service(breaker)
+        
+        for _ in range(2):
+            await service.generate_joke("生成一个笑话")
+        assert breaker.state == breaker.OPEN
+        assert breaker.get_stats()["state"] == breaker.HALF_OPEN
+        
+        upstream.mode = "ok"
+        joke = await service.generate_joke("生成一个笑话")
+        
+        assert joke == "上游笑话"
+        assert breaker.state == breaker.CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_stream_failures_open_breaker(self):
+        """测试流式调用失败计入熔断统计，打开后直接返回备用笑话"""
+        breaker = self.make_breaker()
+        upstream = FakeQwenUpstream()
+        upstream.mode = "error"
+        service = upstream.make_service(breaker)
+        
+        for _ in range(4):
+            received = [delta async for delta in service.stream_joke("生成一个笑话")]
+            assert received[0] in service.fallback_jokes
+        
+        assert breaker.state == breaker.OPEN
+        assert upstream.calls == 4
+        
+        received = [delta async for delta in service.stream_joke("生成一个笑话")]
+        assert received[0] in service.fallback_jokes
+        assert upstream.calls == 4
+        assert breaker.get_stats()["total_rejected"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_stream_half_open_probe_closes_breaker(self):
+        """测试半开状态下流式调用作为探测，成功后恢复关闭"""
+        breaker = self.make_breaker(open_seconds=0)
+        breaker._open()
+        upstream = FakeQwenUpstream()
+        service = upstream.make_service(breaker)
+        
+        [delta async for delta in service.stream_joke("生成一个笑话")]
+        
+        assert upstream.calls == 1
+        assert breaker.state == breaker.CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_abandoned_stream_returns_probe_slot(self):
+        """测试提前关闭的流式探测不计入结果并归还探测名额"""
+        breaker = self.make_breaker(open_seconds=0)
+        breaker._open()
+        
+        async def chunks():
+            yield "为什么"
+            yield "程序员"
+        
+        stream = breaker.stream(chunks)
+        assert await stream.__anext__() == "为什么"
+        await stream.aclose()
+        
+        assert breaker.state == breaker.HALF_OPEN
+        assert [item async for item in breaker.stream(chunks)] == ["为什么", "程序员"]
+        assert breaker.state == breaker.CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_slow_calls_open_breaker(self):
+        """测试慢调用比例超过阈值时熔断"""
+        breaker = self.make_breaker(slow_call_seconds=0.0, slow_call_rate=1.0)
+        service = FakeQwenUpstream().make_service(breaker)
+        
+        for _ in range(4):
+            assert await service.generate_joke("生成一个笑话") == "上游笑话"
+        
+        assert breaker.state == breaker.OPEN
+
+
+class TestAdaptiveTimeoutAndHedging:
+    """自适应超时与对冲请求测试类"""
+    
+    @staticmethod
+    def make_service(handler, samples: float = 0.05):
+        import httpx
+        from app.services.circuit_breaker import CircuitBreaker
+        from app.services.latency_tracker import LatencyTracker
+        
+        latency = LatencyTracker(window_size=50, min_samples=10)
+        for _ in range(20):
+            latency.record(samples)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = AIService(client=client, breaker=CircuitBreaker("test"), latency=latency)
+        service.api_key = "test_api_key"
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_hedged_request_wins_over_slow_primary(self, monkeypatch):
+        """测试首个请求过慢时对冲请求先返回"""
+        import asyncio
+        import time
+        import httpx
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "QWEN_HEDGE_ENABLED", True)
+        monkeypatch.setattr(settings, "QWEN_HEDGE_MIN_DELAY", 0.05)
+        calls = []
+        
+        async def handler(request):
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(2)
+            return httpx.Response(200, json={
+                "output": {"choices": [{"message": {"content": f"笑话{len(calls)}"}}]}
+            })
+        
+        service = self.make_service(handler)
+        start = time.perf_counter()
+        result = await service._request_qwen("生成一个笑话", 0.8, 200)
+        
+        assert result == ["笑话2"]
+        assert time.perf_counter() - start < 1
+        assert service.latency.hedges_sent == 1
+        assert service.latency.hedges_won == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancel_during_hedge_delay_cancels_primary(self, monkeypatch):
+        """测试在对冲等待期间取消调用方时首个请求一并取消"""
+        import asyncio
+        import httpx
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "QWEN_HEDGE_ENABLED", True)
+        monkeypatch.setattr(settings, "QWEN_HEDGE_MIN_DELAY", 1)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+        
+        async def handler(request):
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return httpx.Response(200, json={})
+        
+        service = self.make_service(handler)
+        caller = asyncio.create_task(service._request_qwen("生成一个笑话", 0.8, 200))
+        await started.wait()
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert service.latency.hedges_sent == 0
+    
+    @pytest.mark.asyncio
+    async def test_adaptive_timeout_follows_latency_quantile(self, monkeypatch):
+        """测试自适应超时按分位延迟提前放弃慢请求"""
+        import asyncio
+        import time
+        import httpx
+        from app.core.config import settings
+        from app.core.exceptions import JokeGenerationException
+        
+        monkeypatch.setattr(settings, "QWEN_ADAPTIVE_TIMEOUT_ENABLED", True)
+        monkeypatch.setattr(settings, "QWEN_ADAPTIVE_TIMEOUT_MIN", 0.1)
+        
+        async def handler(request):
+            await asyncio.sleep(2)
+            return httpx.Response(200, json={})
+        
+        service = self.make_service(handler)
+        assert service.latency.timeout() == pytest.approx(0.1)
+        
+        start = time.perf_counter()
+        with pytest.raises(JokeGenerationException):
+            await service._request_qwen("生成一个笑话", 0.8, 200)
+        
+        assert time.perf_counter() - start < 1
+        assert service.latency.timeouts == 1
@@ -0,0 +1,644 @@
+"""
+缓存服务测试
+"""
+import asyncio
+import fnmatch
+import json
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.joke import JokeResponse
+from app.schemas.joke import JokeListResponse
+from app.services import cache_decorator
+from app.services.cache_decorator import cache_bypass, cached, get_method_cache_stats
+from app.services.cache_serializers import MAGIC, CacheCodec
+from app.services.cache_service import AsyncCacheService, CacheClearJob, CacheNamespace, CacheService, LocalCache
+
+
+class FakeRedis:
+    """记录调用次数的内存Redis，发布的消息投递给所有订阅的缓存服务"""
+    
+    def __init__(self):
+        self.data = {}
+        self.gets = 0
+        self.scans = 0
+        self.removed = set()
+        self.subscribers = []
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+    
+    def set(self, key, value, nx=False, px=None):
+        with self.lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value if isinstance(value, bytes) else value.encode("utf-8")
+            return True
+    
+    def eval(self, script, numkeys, key, token):
+        # 仅支持释放锁脚本：令牌匹配时删除
+        with self.lock:
+            if self.data.get(key) == token.encode("utf-8"):
+                return self.delete(key)
+            return 0
+    
+    def setex(self, key, expire, value):
+        self.data[key] = value if isinstance(value, bytes) else value.encode("utf-8")
+        return True
+    
+    def delete(self, *keys):
+        self.removed.update(keys)
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+    
+    def incrby(self, key, amount):
+        value = int(self.data.get(key, b"0")) + amount
+        self.data[key] = str(value).encode("utf-8")
+        return value
+    
+    def keys(self, pattern):
+        raise AssertionError("不应使用KEYS")
+    
+    def scan(self, cursor=0, match="*", count=10):
+        self.scans += 1
+        # 与真实SCAN一致：迭代期间删除键不会导致其他键被跳过
+        keys = sorted(set(self.data) | self.removed)
+        page = keys[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(keys) else 0
+        return next_cursor, [key for key in page if key in self.data and fnmatch.fnmatchcase(key, match)]
+    
+    def scan_iter(self, match="*", count=10):
+        cursor = 0
+        while True:
+            cursor, keys = self.scan(cursor, match, count)
+            yield from keys
+            if cursor == 0:
+                break
+    
+    def unlink(self, *keys):
+        return self.delete(*keys)
+    
+    def publish(self, channel, message):
+        for service in self.subscribers:
+            service._handle_invalidation({"channel": channel, "data": message})
+        return len(self.subscribers)
+
+
+class FakeAsyncRedis:
+    """FakeRedis的异步包装"""
+    
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+    
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+        
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+def make_cache(redis: FakeRedis) -> CacheService:
+    """创建连接到假Redis的缓存服务"""
+    service = CacheService()
+    service.enabled = True
+    service.redis_client = redis
+    service.local = LocalCache(max_size=3, ttl=30)
+    redis.subscribers.append(service)
+    return service
+
+
+class TestLocalCache:
+    """进程内缓存测试类"""
+    
+    def test_lru_eviction(self):
+        """超过容量时淘汰最久未使用的键"""
+        local = LocalCache(max_size=2, ttl=30)
+        local.set("a", b"1")
+        local.set("b", b"2")
+        local.get("a")
+        local.set("c", b"3")
+        
+        assert local.get("a") == b"1"
+        assert local.get("b") is None
+        assert local.evictions == 1
+    
+    def test_ttl_expiry(self):
+        """过期条目不再返回"""
+        local = LocalCache(max_size=10, ttl=30)
+        local.set("a", b"1", expire=1)
+        local._data["a"] = (time.monotonic() - 1, b"1")
+        
+        assert local.get("a") is None
+    
+    def test_delete_pattern(self):
+        """按模式删除"""
+        local = LocalCache(max_size=10, ttl=30)
+        local.set("joke:1", b"1")
+        local.set("joke:2", b"2")
+        local.set("user:1", b"3")
+        
+        assert local.delete_pattern("joke:*") == 2
+        assert local.get("user:1") == b"3"
+
+
+class TestCacheCodec:
+    """缓存编解码测试类"""
+    
+    def test_round_trip_with_compression(self):
+        """超过阈值的数据压缩后可还原"""
+        codec = CacheCodec(default="orjson", compression="zlib", compression_min_bytes=64)
+        value = {"items": [{"content": "冷笑话" * 20, "id": i} for i in range(10)]}
+        
+        data = codec.encode("jokes:list", value)
+        
+        assert data[0] == MAGIC
+        assert data[2] != 0
+        assert codec.decode(data) == value
+    
+    def test_namespace_serializer(self):
+        """按命名空间选择序列化器"""
+        codec = CacheCodec(default="orjson", namespaces={"legacy": "pickle"}, compression="none")
+        
+        assert codec.serializer_for("legacy:1").name == "pickle"
+        assert codec.serializer_for("joke:1").name == "orjson"
+        assert codec.decode(codec.encode("legacy:1", {1, 2})) == {1, 2}
+    
+    def test_legacy_payloads(self):
+        """没有帧头的旧数据按指定格式解码"""
+        codec = CacheCodec(compression="none")
+        
+        assert codec.decode(pickle.dumps({"id": 1})) == {"id": 1}
+        assert codec.decode(b'{"id": 1}', legacy="json") == {"id": 1}
+    
+    def test_pydantic_models_serialized_as_json(self):
+        """Pydantic对象按JSON模式序列化"""
+        codec = CacheCodec(default="orjson", compression="none")
+        joke = JokeResponse(id=1, content="笑话", created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1))
+        
+        decoded = codec.decode(codec.encode("joke:1", joke))
+        
+        assert decoded["id"] == 1
+        assert decoded["created_at"] == "2024-01-01T00:00:00"
+    
+    def test_unknown_serializer_falls_back_to_json(self):
+        """未安装的序列化器回退到json"""
+        codec = CacheCodec(default="not-installed", compression="not-installed")
+        
+        assert codec.default.name == "json"
+        assert codec.compressor.name == "zlib"
+
+
+class TestTwoTierCache:
+    """两级缓存测试类"""
+    
+    def test_l1_hit_skips_redis(self):
+        """L1命中时不访问Redis"""
+        redis = FakeRedis()
+        service = make_cache(redis)
+        service.set_json("joke:1", {"id": 1})
+        
+        assert service.get_json("joke:1") == {"id": 1}
+        assert service.get_json("joke:1") == {"id": 1}
+        assert redis.gets == 0
+    
+    def test_redis_hit_populates_l1(self):
+        """L2命中后回填L1"""
+        redis = FakeRedis()
+        writer = make_cache(redis)
+        reader = make_cache(redis)
+        writer.set("joke:1", {"id": 1})
+        
+        assert reader.get("joke:1") == {"id": 1}
+        assert reader.get("joke:1") == {"id": 1}
+        assert redis.gets == 1
+        assert reader.l2_hits == 1
+    
+    def test_remote_write_invalidates_other_workers(self):
+        """其他worker写入后本地副本失效"""
+        redis = FakeRedis()
+        worker_a = make_cache(redis)
+        worker_b = make_cache(redis)
+        worker_a.set_json("joke:1", {"likes": 1})
+        assert worker_b.get_json("joke:1") == {"likes": 1}
+        
+        worker_a.set_json("joke:1", {"likes": 2})
+        
+        assert worker_b.get_json("joke:1") == {"likes": 2}
+    
+    def test_remote_pattern_invalidation(self):
+        """按模式清除会同步到其他worker"""
+        redis = FakeRedis()
+        worker_a = make_cache(redis)
+        worker_b = make_cache(redis)
+        worker_a.set_json("joke:1", {"id": 1})
+        worker_b.get_json("joke:1")
+        
+        worker_a.clear_pattern("joke:*")
+        
+        assert worker_b.local.get("joke:1") is None
+        assert worker_b.get_json("joke:1") is None
+    
+    def test_own_messages_ignored(self):
+        """自己发布的失效通知不会清掉刚写入的副本"""
+        redis = FakeRedis()
+        service = make_cache(redis)
+        service.set_json("joke:1", {"id": 1})
+        
+        service._handle_invalidation({"data": json.dumps({
+            "origin": service.instance_id, "op": "key", "value": "joke:1"
+        })})
+        
+        assert service.local.get("joke:1") is not None
+    
+    def test_increment_invalidates_l1(self):
+        """计数器更新后L1不返回旧值"""
+        redis = FakeRedis()
+        service = make_cache(redis)
+        service.set_json("counter", 1)
+        service.increment("counter", 5)
+        
+        assert service.get_json("counter") == 6
+    
+    def test_sync_clear_pattern_scans_in_batches(self, monkeypatch):
+        """同步按模式清除使用SCAN分批删除"""
+        monkeypatch.setattr(settings, "CACHE_SCAN_BATCH_SIZE", 10)
+        redis = FakeRedis()
+        service = make_cache(redis)
+        for i in range(35):
+            redis.data[f"joke:{i}"] = b"1"
+        redis.data["user:1"] = b"1"
+        
+        assert service.clear_pattern("joke:*") == 35
+        assert list(redis.data) == ["user:1"]
+        assert redis.scans == 4
+
+
+def make_async_cache(redis: FakeRedis) -> AsyncCacheService:
+    """创建连接到假Redis的异步缓存服务"""
+    service = AsyncCacheService(local=LocalCache(max_size=3, ttl=30))
+    service.enabled = True
+    service.redis_client = FakeAsyncRedis(redis)
+    return service
+
+
+class TestAsyncCache:
+    """异步缓存测试类"""
+    
+    @pytest.mark.asyncio
+    async def test_disabled_before_connect(self):
+        """未连接时按缓存禁用处理"""
+        service = AsyncCacheService()
+        
+        assert await service.get_json("joke:1") is None
+        assert await service.set_json("joke:1", {"id": 1}) is False
+        assert await service.get_stats() == {"enabled": False}
+    
+    @pytest.mark.asyncio
+    async def test_shares_l1_with_sync_cache(self):
+        """与同步实例共用L1，写入通知其他worker"""
+        redis = FakeRedis()
+        sync_cache = make_cache(redis)
+        other_worker = make_cache(redis)
+        service = AsyncCacheService(local=sync_cache.local, instance_id=sync_cache.instance_id)
+        service.enabled = True
+        service.redis_client = FakeAsyncRedis(redis)
+        
+        other_worker.set_json("joke:1", {"likes": 1})
+        assert other_worker.get_json("joke:1") == {"likes": 1}
+        await service.set_json("joke:1", {"likes": 2})
+        
+        assert sync_cache.get_json("joke:1") == {"likes": 2}
+        assert other_worker.get_json("joke:1") == {"likes": 2}
+    
+    @pytest.mark.asyncio
+    async def test_clear_job_reports_progress(self, monkeypatch):
+        """后台清除任务立即返回并记录进度"""
+        monkeypatch.setattr(settings, "CACHE_SCAN_BATCH_SIZE", 10)
+        redis = FakeRedis()
+        service = make_async_cache(redis)
+        for i in range(25):
+            redis.data[f"joke:{i}"] = b"1"
+        redis.data["user:1"] = b"1"
+        
+        job = service.start_clear_job("joke:*")
+        assert job.status == CacheClearJob.PENDING
+        assert service.get_clear_job(job.id) is job
+        
+        await asyncio.gather(*service._tasks)
+        
+        assert job.status == CacheClearJob.COMPLETED
+        assert job.deleted == 25
+        assert job.scanned == 25
+        assert job.batches == 3
+        assert list(redis.data) == ["user:1"]
+    
+    @pytest.mark.asyncio
+    async def test_stampede_entries_interchangeable_with_sync_cache(self):
+        """同步与异步实例写入的防击穿条目可以互相读取"""
+        redis = FakeRedis()
+        sync_cache = make_cache(redis)
+        service = make_async_cache(redis)
+        
+        assert sync_cache.get_or_compute("stats:sync", lambda: {"total": 1}, ttl=60) == {"total": 1}
+        assert await service.get_or_compute("stats:sync", lambda: {"total": 2}, ttl=60) == {"total": 1}
+        
+        assert await service.get_or_compute("stats:async", lambda: {"total": 3}, ttl=60) == {"total": 3}
+        assert sync_cache.get_or_compute("stats:async", lambda: {"total": 4}, ttl=60) == {"total": 3}
+        
+        assert sync_cache.stampede.recomputes == 1
+        assert service.stampede.recomputes == 1
+    
+    def test_clear_job_without_redis(self):
+        """缓存未启用时任务直接失败"""
+        service = AsyncCacheService()
+        
+        job = service.start_clear_job("*")
+        
+        assert job.status == CacheClearJob.FAILED
+
+
+
+class TestStampedeProtection:
+    """防击穿测试类"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_compute_once(self, monkeypatch):
+        """500个并发未命中只重新计算一次"""
+        monkeypatch.setattr(settings, "CACHE_LOCK_WAIT_MS", 5)
+        redis = FakeRedis()
+        service = make_async_cache(redis)
+        calls = 0
+        
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"total": 42}
+        
+        results = await asyncio.gather(*(
+            service.get_or_compute("stats:jokes", compute, ttl=60) for _ in range(500)
+        ))
+        
+        assert calls == 1
+        assert all(result == {"total": 42} for result in results)
+        assert service.stampede.recomputes == 1
+        assert "lock:stats:jokes" not in redis.data
+    
+    def test_concurrent_misses_compute_once_across_threads(self, monkeypatch):
+        """多线程（模拟多个worker）并发未命中只重新计算一次"""
+        monkeypatch.setattr(settings, "CACHE_LOCK_WAIT_MS", 5)
+        redis = FakeRedis()
+        services = [make_cache(redis) for _ in range(4)]
+        calls = 0
+        calls_lock = threading.Lock()
+        
+        def compute():
+            nonlocal calls
+            with calls_lock:
+                calls += 1
+            time.sleep(0.05)
+            return [1, 2, 3]
+        
+        with ThreadPoolExecutor(max_workers=50) as executor:
+            results = list(executor.map(
+                lambda i: services[i % len(services)].get_or_compute("jokes:list", compute, ttl=60),
+                range(500)
+            ))
+        
+        assert calls == 1
+        assert all(result == [1, 2, 3] for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_stale_value_served_while_refreshing(self):
+        """其他worker刷新期间返回旧值"""
+        redis = FakeRedis()
+        service = make_async_cache(redis)
+        await service.set("jokes:list", {"value": "old", "delta": 0.1, "expires_at": time.time() - 1}, expire=60)
+        redis.set("lock:jokes:list", "other-worker", nx=True)
+        
+        async def compute():
+            raise AssertionError("持锁期间不应重新计算")
+        
+        assert await service.get_or_compute("jokes:list", compute, ttl=60) == "old"
+        assert service.stampede.stale_served == 1
+    
+    @pytest.mark.asyncio
+    async def test_expired_value_recomputed(self):
+        """逻辑过期且无人持锁时重新计算"""
+        redis = FakeRedis()
+        service = make_async_cache(redis)
+        await service.set("jokes:list", {"value": "old", "delta": 0.1, "expires_at": time.time() - 1}, expire=60)
+        
+        assert await service.get_or_compute("jokes:list", lambda: "new", ttl=60) == "new"
+        assert await service.get_or_compute("jokes:list", lambda: "newer", ttl=60) == "new"
+        assert service.stampede.recomputes == 1
+    
+    @pytest.mark.asyncio
+    async def test_xfetch_refreshes_slow_keys_early(self):
+        """计算耗时远大于剩余时间时提前刷新"""
+        redis = FakeRedis()
+        service = make_async_cache(redis)
+        await service.set("jokes:list", {"value": "old", "delta": 1000.0, "expires_at": time.time() + 5}, expire=60)
+        
+        assert await service.get_or_compute("jokes:list", lambda: "new", ttl=60) == "new"
+        assert service.stampede.early_refreshes == 1
+    
+    def test_compute_directly_without_redis(self):
+        """缓存未启用时直接计算"""
+        service = CacheService()
+        service.enabled = False
+        
+        assert service.get_or_compute("jokes:list", lambda: "value") == "value"
+
+
+
+class TestVersionedNamespaces:
+    """版本化命名空间测试类"""
+    
+    def test_bump_changes_versioned_key(self):
+        """递增代数后键随之变化，旧缓存不再命中"""
+        redis = FakeRedis()
+        service = make_cache(redis)
+        namespace = CacheNamespace.joke_category("程序员")
+        key = service.versioned_key("jokes:list:page:1", namespace)
+        service.set_json(key, {"items": []})
+        
+        service.bump_namespace(namespace)
+        new_key = service.versioned_key("jokes:list:page:1", namespace)
+        
+        assert new_key != key
+        assert service.get_json(new_key) is None
+    
+    def test_bump_only_affects_own_namespace(self):
+        """只影响被递增的命名空间"""
+        redis = FakeRedis()
+        service = make_cache(redis)
+        other = CacheNamespace.joke_category("日常")
+        key = service.versioned_key("jokes:list:page:1", other)
+        
+        service.bump_namespace(CacheNamespace.joke_category("程序员"))
+        
+        assert service.versioned_key("jokes:list:page:1", other) == key
+    
+    def test_bump_seen_by_other_workers(self):
+        """其他worker缓存在L1中的代数随失效通知更新"""
+        redis = FakeRedis()
+        worker_a = make_cache(redis)
+        worker_b = make_cache(redis)
+        key = worker_b.versioned_key("stats", CacheNamespace.SHARE_STATS)
+        
+        worker_a.bump_namespace(CacheNamespace.SHARE_STATS)
+        
+        assert worker_b.versioned_key("stats", CacheNamespace.SHARE_STATS) != key
+    
+    @pytest.mark.asyncio
+    async def test_async_bump(self):
+        """异步版本与同步版本共用计数器"""
+        redis = FakeRedis()
+        sync_cache = make_cache(redis)
+        service = make_async_cache(redis)
+        
+        await service.bump_namespace(CacheNamespace.SHARE_STATS, CacheNamespace.USER_STATS)
+        
+        assert sync_cache.namespace_version(CacheNamespace.SHARE_STATS) == 1
+        assert await service.namespace_version(CacheNamespace.USER_STATS) == 1
+
+
+
+class CountingService:
+    """记录数据库查询次数的示例服务"""
+    
+    def __init__(self):
+        self.queries = 0
+    
+    @cached("test:list", ttl=60, namespaces=lambda args: [CacheNamespace.joke_category(args["category"])], model=JokeListResponse)
+    def get_list(self, category: str, page: int = 1) -> JokeListResponse:
+        self.queries += 1
+        joke = JokeResponse(id=page, content=category, created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1))
+        return JokeListResponse(items=[joke], total=1, page=page, size=10, pages=1)
+    
+    @cached("test:item", ttl=60, negative_ttl=5)
+    def get_item(self, item_id: int):
+        self.queries += 1
+        return None
+
+
+class TestCachedDecorator:
+    """读穿缓存装饰器测试类"""
+    
+    @pytest.fixture
+    def service(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr(cache_decorator, "cache", make_cache(redis))
+        return CountingService()
+    
+    def test_hit_returns_model_without_query(self, service):
+        """第二次调用命中缓存并还原为模型"""
+        first = service.get_list("程序员", page=2)
+        second = service.get_list("程序员", 2)
+        
+        assert service.queries == 1
+        assert isinstance(second, JokeListResponse)
+        assert second == first
+        
+        stats = get_method_cache_stats()["CountingService.get_list"]
+        assert stats["hits"] >= 1
+    
+    def test_arguments_in_key(self, service):
+        """不同参数使用不同的键"""
+        service.get_list("程序员", page=1)
+        service.get_list("程序员", page=2)
+        service.get_list("日常", page=1)
+        
+        assert service.queries == 3
+    
+    def test_namespace_bump_invalidates(self, service):
+        """命名空间代数递增后重新查询"""
+        service.get_list("程序员")
+        cache_decorator.cache.bump_namespace(CacheNamespace.joke_category("程序员"))
+        service.get_list("程序员")
+        
+        assert service.queries == 2
+    
+    def test_negative_cache(self, service):
+        """未找到的结果也会缓存，并使用较短的TTL"""
+        assert service.get_item(1) is None
+        assert service.get_item(1) is None
+        
+        assert service.queries == 1
+        assert get_method_cache_stats()["CountingService.get_item"]["negative_hits"] >= 1
+    
+    def test_bypass(self, service):
+        """设置跳过标记时直接查询"""
+        token = cache_bypass.set(True)
+        try:
+            service.get_list("程序员")
+            service.get_list("程序员")
+        finally:
+            cache_bypass.reset(token)
+        
+        assert service.queries == 2
+    
+    def test_user_stats_fallback_not_cached(self, service, db_session, monkeypatch):
+        """统计查询失败时返回降级结果且不缓存，下一次调用重新查询数据库"""
+        from app.services.user_service import UserService
+        
+        calls = []
+        statements = UserService._stats_statements
+        
+        def flaky_statements(self):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("数据库暂时不可用")
+            return statements(self)
+        
+        monkeypatch.setattr(UserService, "_stats_statements", flaky_statements)
+        user_service = UserService(db_session)
+        
+        assert user_service.get_user_stats().total_users == 0
+        db_session.add(User(openid="stats_user", nickname="统计用户"))
+        db_session.commit()
+        
+        assert user_service.get_user_stats().total_users == 1
+        assert len(calls) == 2
+    
+    @pytest.mark.asyncio
+    async def test_share_stats_fallback_not_cached_async(self, db_session, monkeypatch):
+        """异步统计查询失败时同样不缓存降级结果"""
+        from app.services.share_service import ShareService
+        
+        monkeypatch.setattr(cache_decorator, "async_cache", make_async_cache(FakeRedis()))
+        calls = []
+        statements = ShareService._stats_statements
+        
+        def flaky_statements(self, days):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("数据库暂时不可用")
+            return statements(self, days)
+        
+        monkeypatch.setattr(ShareService, "_stats_statements", flaky_statements)
+        share_service = ShareService(db_session)
+        
+        assert (await share_service.get_share_stats_async(7)).total_shares == 0
+        await share_service.get_share_stats_async(7)
+        await share_service.get_share_stats_async(7)
+        
+        assert len(calls) == 2
+    
+    def test_ttl_jitter(self):
+        """TTL在抖动范围内"""
+        ttls = {cache_decorator._jittered_ttl(100, 0.1) for _ in range(200)}
+        
+        assert min(ttls) >= 90
+        assert max(ttls) <= 110
+        assert len(ttls) > 1
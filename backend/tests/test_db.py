@@ -0,0 +1,491 @@
+"""
+数据库基础设施测试
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.joke import Joke
+from app.models.user import User
+
+
+class TestWriteQueue:
+    """SQLite生产模式和单写线程队列测试类"""
+    
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """开启生产模式PRAGMA的文件库"""
+        from sqlalchemy import create_engine
+        from app.db.base import Base
+        from app.db.session import configure_sqlite
+        
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'writes.db'}",
+            connect_args={"check_same_thread": False},
+            pool_size=20
+        )
+        configure_sqlite(engine)
+        Base.metadata.create_all(bind=engine)
+        yield engine
+        engine.dispose()
+    
+    @pytest.fixture
+    def writes(self, engine):
+        from sqlalchemy.orm import sessionmaker
+        from app.db.write_queue import WriteQueue
+        
+        writes = WriteQueue(
+            enabled=True,
+            session_factory=sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        )
+        yield writes
+        writes.stop()
+    
+    @pytest.fixture
+    def session_factory(self, engine):
+        from sqlalchemy.orm import sessionmaker
+        
+        return sessionmaker(bind=engine, autoflush=False)
+    
+    def test_pragmas_applied_on_connect(self, engine):
+        """每个连接都使用WAL和配置的参数"""
+        from app.core.config import settings
+        
+        with engine.connect() as connection:
+            pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            assert pragma("journal_mode") == "wal"
+            assert pragma("synchronous") == 1
+            assert pragma("busy_timeout") == settings.SQLITE_BUSY_TIMEOUT
+            assert pragma("temp_store") == 2
+            assert pragma("cache_size") == settings.SQLITE_CACHE_SIZE
+    
+    def test_concurrent_writes_are_grouped(self, writes, session_factory, sample_joke_data):
+        """并发写入全部生效，且合并为更少的提交"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.db.atomic import atomic_increment
+        
+        with session_factory() as db:
+            joke = Joke(**sample_joke_data)
+            db.add(joke)
+            db.commit()
+            joke_id = joke.id
+        
+        def one(_):
+            with session_factory() as db:
+                writes.execute(db, lambda session: atomic_increment(session, Joke, joke_id, view_count=1))
+        
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(one, range(800)))
+        
+        with session_factory() as db:
+            assert db.get(Joke, joke_id).view_count == 800
+        assert writes.jobs == 800
+        assert writes.commits < 800
+    
+    def test_failed_write_does_not_affect_batch(self, writes, session_factory):
+        """批次中一个写操作失败，其余写操作仍然提交"""
+        import threading
+        from sqlalchemy import func
+        
+        release = threading.Event()
+        blocker = writes.submit(lambda db: release.wait(5))
+        
+        def add_user(openid):
+            def write(db):
+                user = User(openid=openid)
+                db.add(user)
+                db.flush()
+                return user.id
+            return write
+        
+        first = writes.submit(add_user("queued_1"))
+        duplicate = writes.submit(add_user("queued_1"))
+        last = writes.submit(add_user("queued_2"))
+        release.set()
+        
+        assert blocker.result(5)
+        assert first.result(5) and last.result(5)
+        with pytest.raises(Exception):
+            duplicate.result(5)
+        assert writes.retried_batches == 1
+        with session_factory() as db:
+            assert db.query(func.count(User.id)).scalar() == 2
+    
+    def test_services_read_back_queued_writes(self, writes, session_factory, monkeypatch):
+        """经写队列创建和更新的记录在调用方会话中可读"""
+        import app.services.user_service as user_service
+        from app.schemas.user import UserCreate, UserUpdate
+        
+        monkeypatch.setattr(user_service, "write_queue", writes)
+        
+        with session_factory() as db:
+            service = user_service.UserService(db)
+            user = service.create_user(UserCreate(openid="queued_user", nickname="排队用户"))
+            assert user.created_at is not None
+            
+            # 调用方会话先读过旧值，更新后仍能读到新值
+            assert service.get_user_by_id(user.id).nickname == "排队用户"
+            updated = service.update_user(user.id, UserUpdate(nickname="新昵称"))
+            assert updated.nickname == "新昵称"
+            assert service.ban_user(user.id)
+            assert service.get_user_by_id(user.id).is_banned
+    
+    @pytest.mark.asyncio
+    async def test_async_paths_do_not_block_on_queue(self, writes, session_factory, monkeypatch):
+        """异步创建、计数和用户更新路径等待写线程时不调用阻塞的 execute"""
+        import app.services.counter_buffer as counter_buffer
+        import app.services.joke_service as joke_service
+        import app.services.user_service as user_service
+        from app.schemas.joke import JokeCreate
+        from app.schemas.user import UserCreate, UserUpdate
+        
+        def blocking(db, work):
+            raise AssertionError("异步路径不应阻塞等待写线程")
+        
+        monkeypatch.setattr(writes, "execute", blocking)
+        for module in (counter_buffer, joke_service, user_service):
+            monkeypatch.setattr(module, "write_queue", writes)
+        
+        with session_factory() as db:
+            users = user_service.UserService(db)
+            user = await users.create_user_async(UserCreate(openid="async_queued", nickname="异步"))
+            assert (await users.update_user_async(user.id, UserUpdate(nickname="新昵称"))).nickname == "新昵称"
+            assert (await users.update_last_login_async(user.id)).last_login_at is not None
+            
+            jokes = joke_service.JokeService(db)
+            joke = await jokes.create_joke_async(JokeCreate(content="排队笑话", user_id=user.id))
+            assert await jokes.increment_view_count_async(joke.id)
+            assert not await jokes.increment_view_count_async(joke.id + 1000)
+            assert await jokes.toggle_favorite_async(joke.id)
+            
+            db.expire_all()
+            assert db.get(Joke, joke.id).view_count == 1
+            assert db.get(Joke, joke.id).like_count == 1
+            assert db.get(User, user.id).total_generated == 1
+
+
+class TestPoolMetrics:
+    """连接池监控测试类"""
+    
+    @pytest.fixture
+    def pooled(self, tmp_path):
+        """常驻1个连接、最多溢出1个的文件库引擎"""
+        from sqlalchemy import create_engine
+        from app.db.pool_metrics import InstrumentedQueuePool, PoolMonitor
+        
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            connect_args={"check_same_thread": False},
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=0.2
+        )
+        monitor = PoolMonitor("test_pool")
+        monitor.instrument(engine)
+        yield engine, monitor
+        engine.dispose()
+    
+    def test_starvation_shows_as_checkout_wait(self, pooled):
+        """连接全部被占用时，等待时间和超时被记录，占用时间单独统计"""
+        import threading
+        from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+        
+        engine, monitor = pooled
+        release = threading.Event()
+        held = threading.Semaphore(0)
+        
+        def hold():
+            with engine.connect():
+                held.release()
+                release.wait(5)
+        
+        holders = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in holders:
+            thread.start()
+        # 等两个线程都进入 with，checkout 事件已处理完，再读取统计
+        for _ in holders:
+            assert held.acquire(timeout=5)
+        
+        stats = monitor.get_stats()
+        assert stats["overflow"] == 1
+        # 两个线程几乎同时取出，checkout事件触发时都可能已处于溢出状态
+        assert stats["overflow_checkouts"] >= 1
+        
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+        assert monitor.timeouts == 1
+        
+        # 归还一个连接后等待者拿到连接，等待时间计入 checkout wait
+        threading.Timer(0.1, release.set).start()
+        with engine.connect():
+            pass
+        for thread in holders:
+            thread.join()
+        
+        stats = monitor.get_stats()
+        assert stats["checkout_wait_p99_ms"] >= 50
+        assert stats["hold_p99_ms"] >= 100
+        assert stats["checked_out"] == 0
+    
+    def test_monitor_survives_dispose(self, pooled):
+        """engine.dispose() 重建连接池后继续计时"""
+        engine, monitor = pooled
+        engine.dispose()
+        with engine.connect():
+            pass
+        
+        assert engine.pool.monitor is monitor
+        assert monitor.checkout_wait.quantile(0.5) is not None
+    
+    def test_exported_to_prometheus(self, pooled):
+        """指标带引擎标签导出"""
+        prometheus_client = pytest.importorskip("prometheus_client")
+        
+        engine, _ = pooled
+        with engine.connect():
+            pass
+        
+        output = prometheus_client.generate_latest().decode()
+        assert 'db_pool_checkout_wait_seconds_count{engine="test_pool"}' in output
+        assert 'db_pool_checked_out{engine="test_pool"} 0.0' in output
+
+
+class TestQueryStats:
+    """请求级SQL统计测试类"""
+    
+    def test_normalize_and_redact(self):
+        """慢查询日志中的SQL归一化、参数只保留类型"""
+        from app.db.query_stats import normalize_sql, redact_parameters
+        
+        sql = normalize_sql(
+            "SELECT jokes.id FROM jokes\n  WHERE jokes.category = '程序员' AND jokes.id IN (?, ?, ?)\n LIMIT 10"
+        )
+        
+        assert sql == "SELECT jokes.id FROM jokes WHERE jokes.category = ? AND jokes.id IN (...) LIMIT ?"
+        assert redact_parameters(("secret", 42)) == "(str, int)"
+        assert redact_parameters({"openid": "secret"}) == "{openid: str}"
+        assert redact_parameters([("a", 1), ("b", 2)], executemany=True) == "2 x (str, int)"
+    
+    def test_list_query_count_does_not_grow_with_rows(self, client: TestClient, db_session):
+        """列表接口的语句数与返回行数无关（N+1检查）"""
+        def list_queries():
+            response = client.get("/api/v1/jokes/?size=50&category=N1")
+            assert response.status_code == 200
+            return int(response.headers["X-DB-Query-Count"])
+        
+        db_session.add_all([Joke(content=f"N1笑话{i}", category="N1") for i in range(2)])
+        db_session.commit()
+        few = list_queries()
+        
+        db_session.add_all([Joke(content=f"N1笑话{i}", category="N1") for i in range(2, 30)])
+        db_session.commit()
+        
+        assert list_queries() == few
+        assert few <= 3
+    
+    def test_share_statement_count(self, client: TestClient, db_session, sample_joke_data):
+        """分享接口：原子更新笑话、插入分享记录、读回分享记录"""
+        from app.db.query_stats import query_accounting
+        
+        joke = Joke(**sample_joke_data)
+        db_session.add(joke)
+        db_session.commit()
+        query_accounting.reset()
+        
+        response = client.post("/api/v1/jokes/share", json={"joke_id": joke.id, "share_to": "wechat"})
+        
+        assert response.status_code == 200
+        assert response.headers["X-DB-Query-Count"] == "3"
+        assert float(response.headers["X-DB-Time"]) > 0
+        assert query_accounting.get_stats()["routes"]["POST /api/v1/jokes/share"]["max_queries"] == 3
+    
+    def test_slow_query_logged_with_request_id(self, client: TestClient, monkeypatch):
+        """超过阈值的语句带请求ID记录，不输出参数值"""
+        from app.core.config import settings
+        from app.core.logging import logger
+        
+        monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+        messages = []
+        sink = logger.add(lambda message: messages.append(str(message)), level="WARNING")
+        try:
+            response = client.get("/api/v1/jokes/?category=不会出现的分类值")
+        finally:
+            logger.remove(sink)
+        
+        slow = [message for message in messages if "Slow query" in message]
+        assert slow
+        assert all(response.headers["X-Request-ID"] in message for message in slow)
+        assert not any("不会出现的分类值" in message for message in slow)
+
+
+class TestReplicaRouting:
+    """只读副本路由测试类"""
+    
+    @pytest.fixture
+    def router(self, tmp_path):
+        """两个SQLite文件副本，各有一条只在副本上存在的笑话"""
+        import asyncio
+        from sqlalchemy import create_engine
+        from app.db.base import Base
+        from app.db.replicas import ReplicaRouter
+        
+        urls = []
+        for name in ("replica_a", "replica_b"):
+            url = f"sqlite:///{tmp_path / f'{name}.db'}"
+            engine = create_engine(url)
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as connection:
+                connection.execute(Joke.__table__.insert(), [{"content": f"{name}上的笑话", "category": "副本"}])
+            engine.dispose()
+            urls.append(url)
+        
+        router = ReplicaRouter(urls=urls, max_lag=5.0, window=10.0)
+        router.check()
+        yield router
+        asyncio.run(router.stop())
+    
+    @staticmethod
+    def request(**path_params):
+        from starlette.requests import Request
+        
+        return Request({"type": "http", "path_params": path_params})
+    
+    def test_round_robin_skips_lagging_replicas(self, router):
+        """在延迟未超限的副本间轮询，全部超限时回到主库"""
+        first, second = router.replicas
+        assert first.healthy and first.lag == 0.0
+        
+        assert {router.choose().name for _ in range(4)} == {"replica_0", "replica_1"}
+        
+        first.lag = 30.0
+        assert all(router.choose() is second for _ in range(3))
+        
+        second.lag = 30.0
+        assert router.choose() is None
+        assert router.lag_fallbacks == 1
+    
+    def test_unreachable_replica_not_routed(self):
+        """检测失败的副本标记为不可用，读取走主库"""
+        import asyncio
+        from app.db.replicas import ReplicaRouter
+        
+        router = ReplicaRouter(urls=["sqlite:////nonexistent-dir/replica.db"])
+        try:
+            router.check()
+            
+            assert router.replicas[0].healthy is False
+            assert router.choose() is None
+            assert router.get_stats()["replicas"]["replica_0"]["lag_seconds"] is None
+        finally:
+            asyncio.run(router.stop())
+    
+    def test_read_your_writes(self, router, db_session):
+        """本请求写入过、Cookie在窗口内或用户被标记时读主库"""
+        import asyncio
+        from app.db.replicas import ReadScope, current_read_scope
+        from app.db.write_queue import WriteQueue
+        
+        async def route(scope, **path_params):
+            token = current_read_scope.set(scope)
+            try:
+                return await router.route(self.request(**path_params))
+            finally:
+                current_read_scope.reset(token)
+        
+        # 写操作经写队列记录到当前请求
+        scope = ReadScope()
+        token = current_read_scope.set(scope)
+        try:
+            WriteQueue(enabled=False).execute(db_session, lambda session: None)
+        finally:
+            current_read_scope.reset(token)
+        assert scope.wrote is True
+        
+        assert asyncio.run(route(scope)) is None
+        assert asyncio.run(route(ReadScope(sticky=True))) is None
+        assert asyncio.run(route(ReadScope())) is not None
+        
+        asyncio.run(router.mark_user(7))
+        assert asyncio.run(route(ReadScope(), user_id="7")) is None
+        assert asyncio.run(route(ReadScope(), user_id="8")) is not None
+        
+        stats = router.get_stats()
+        assert stats["sticky_reads"] == 3
+        assert sum(replica["reads"] for replica in stats["replicas"].values()) == 2
+    
+    def test_read_db_uses_chosen_replica(self, router, monkeypatch):
+        """get_read_db 返回所选副本的会话"""
+        import asyncio
+        from contextlib import asynccontextmanager
+        from sqlalchemy import select
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from app.db import replicas
+        
+        monkeypatch.setattr(replicas, "replica_router", router)
+        
+        async def read_once():
+            async with asynccontextmanager(replicas.get_read_db)(self.request()) as db:
+                statement = select(Joke.content).where(Joke.category == "副本")
+                if isinstance(db, AsyncSession):
+                    return (await db.execute(statement)).scalar()
+                return db.execute(statement).scalar()
+        
+        assert [asyncio.run(read_once()) for _ in range(2)] == ["replica_a上的笑话", "replica_b上的笑话"]
+    
+    def test_middleware_sets_primary_cookie(self, router, monkeypatch):
+        """写请求设置读主库Cookie并标记路径中的用户"""
+        from fastapi import Depends, FastAPI
+        from app.core import middleware
+        from app.db.replicas import READ_YOUR_WRITES_COOKIE, current_read_scope, note_write
+        
+        monkeypatch.setattr(middleware, "replica_router", router)
+        app = FastAPI()
+        app.add_middleware(middleware.ReadYourWritesMiddleware)
+        
+        @app.post("/users/{user_id}")
+        async def write(user_id: int):
+            note_write()
+            return {}
+        
+        @app.get("/users/{user_id}/reads")
+        async def read(user_id: int, target=Depends(router.route)):
+            return {"target": target.name if target is not None else "primary"}
+        
+        with TestClient(app) as writer:
+            assert writer.get("/users/1/reads").json()["target"].startswith("replica")
+            
+            response = writer.post("/users/1")
+            assert READ_YOUR_WRITES_COOKIE in response.cookies
+            assert writer.get("/users/2/reads").json()["target"] == "primary"
+        
+        # 其他客户端没有Cookie，只有被标记的用户读主库
+        with TestClient(app) as other:
+            assert other.get("/users/1/reads").json()["target"] == "primary"
+            assert other.get("/users/2/reads").json()["target"].startswith("replica")
+        assert current_read_scope.get() is None
+    
+    def test_view_count_does_not_pin_reads_to_primary(self, router, db_session, monkeypatch):
+        """查看笑话详情累加计数，但不设置读主库Cookie"""
+        from fastapi import FastAPI
+        from app.api.v1 import jokes
+        from app.core import middleware
+        from app.db.replicas import READ_YOUR_WRITES_COOKIE
+        from app.db.session import get_db
+        
+        joke = Joke(content="详情页笑话", category="副本")
+        db_session.add(joke)
+        db_session.commit()
+        
+        monkeypatch.setattr(middleware, "replica_router", router)
+        app = FastAPI()
+        app.add_middleware(middleware.ReadYourWritesMiddleware)
+        app.include_router(jokes.router, prefix="/jokes")
+        app.dependency_overrides[get_db] = lambda: db_session
+        
+        with TestClient(app) as reader:
+            response = reader.get(f"/jokes/{joke.id}")
+        
+        assert response.status_code == 200
+        assert READ_YOUR_WRITES_COOKIE not in response.cookies
+        db_session.refresh(joke)
+        assert joke.view_count == 1
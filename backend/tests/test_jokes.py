@@ -147,6 +147,45 @@ class TestJokeService:
         assert joke.content == sample_joke_data["content"]
         assert joke.category == sample_joke_data["category"]
     
+    def test_create_joke_bumps_namespaces(self, db_session, sample_joke_data, monkeypatch):
+        """创建笑话后相关列表命名空间失效"""
+        from app.services import joke_service as joke_service_module
+        from app.services.cache_service import CacheNamespace
+        from app.services.joke_service import JokeService
+        from app.schemas.joke import JokeCreate
+        
+        bumped = []
+        monkeypatch.setattr(joke_service_module.cache, "bump_namespace", lambda *namespaces: bumped.extend(namespaces))
+        
+        JokeService(db_session).create_joke(JokeCreate(**sample_joke_data))
+        
+        assert CacheNamespace.JOKE_LISTS in bumped
+        assert CacheNamespace.joke_category(sample_joke_data["category"]) in bumped
+    
+    @pytest.mark.asyncio
+    async def test_generate_joke_bumps_namespaces_async(self, db_session, monkeypatch):
+        """异步生成路径通过异步缓存客户端使列表失效"""
+        from app.services import joke_service as joke_service_module
+        from app.services.cache_service import CacheNamespace
+        from app.services.joke_service import JokeService
+        from app.schemas.joke import JokeGenerateRequest
+        
+        bumped = []
+        
+        async def bump_namespace(*namespaces):
+            bumped.extend(namespaces)
+        
+        def blocking_bump(*namespaces):
+            raise AssertionError("异步路径不应调用同步缓存")
+        
+        monkeypatch.setattr(joke_service_module.async_cache, "bump_namespace", bump_namespace)
+        monkeypatch.setattr(joke_service_module.cache, "bump_namespace", blocking_bump)
+        
+        await JokeService(db_session).generate_joke(JokeGenerateRequest(category="程序员"))
+        
+        assert CacheNamespace.JOKE_LISTS in bumped
+        assert CacheNamespace.joke_category("程序员") in bumped
+    
     def test_get_jokes_pagination(self, db_session, sample_joke_data):
         """测试笑话分页"""
         from app.services.joke_service import JokeService
@@ -171,4 +210,916 @@ class TestJokeService:
         # 测试第二页
         result = joke_service.get_jokes(page=2, size=10)
         assert len(result.items) == 5
-        assert result.total == 15
\ No newline at end of file
+        assert result.total == 15
+    
+    @pytest.mark.asyncio
+    async def test_generate_batch_jokes_concurrently(self, db_session):
+        """测试批量生成并发调用AI服务"""
+        import time
+        from app.services.joke_service import JokeService
+        from app.schemas.joke import JokeBatchGenerateRequest
+        
+        delay = 0.2
+        joke_service = JokeService(db_session)
+        joke_service.ai_service = DelayedAIService(delay)
+        
+        start = time.perf_counter()
+        jokes = await joke_service.generate_batch_jokes(
+            JokeBatchGenerateRequest(count=5, category="程序员")
+        )
+        elapsed = time.perf_counter() - start
+        
+        assert len(jokes) == 5
+        assert joke_service.ai_service.calls == 5
+        # 串行需要 5 * delay，并发应接近单次延迟
+        assert elapsed < delay * 2
+        assert all(joke.id is not None for joke in jokes)
+    
+    @pytest.mark.asyncio
+    async def test_generate_batch_jokes_partial_failure(self, db_session):
+        """测试批量生成部分失败时返回成功的部分"""
+        from app.services.joke_service import JokeService
+        from app.schemas.joke import JokeBatchGenerateRequest
+        
+        joke_service = JokeService(db_session)
+        joke_service.ai_service = DelayedAIService(0, fail_every=2)
+        
+        jokes = await joke_service.generate_batch_jokes(
+            JokeBatchGenerateRequest(count=4, category="程序员")
+        )
+        
+        assert len(jokes) == 2
+
+
+class DelayedAIService:
+    """固定延迟的AI服务桩"""
+    
+    def __init__(self, delay: float, fail_every: int = 0):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.calls = 0
+    
+    async def generate_joke(self, prompt: str, temperature: float = 0.8, max_tokens: int = 200) -> str:
+        import asyncio
+        
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        if self.fail_every and call % self.fail_every == 0:
+            raise RuntimeError("模拟生成失败")
+        return f"延迟笑话{call}"
+
+
+class FakeAIService:
+    """固定返回内容的AI服务桩"""
+    
+    is_configured = True
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def _call_qwen_api(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        self.calls += 1
+        return f"预生成笑话{self.calls}"
+
+
+class TestJokeReservoir:
+    """笑话蓄水池测试类"""
+    
+    @pytest.mark.asyncio
+    async def test_take_miss_then_refill_and_hit(self):
+        """测试未命中后补充到高水位并命中"""
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        ai_service = FakeAIService()
+        reservoir = JokeReservoir(low_water=2, high_water=5, use_redis=False, ai_service=ai_service)
+        request = JokeGenerateRequest(category="程序员", temperature=0.8)
+        reservoir.register(request)
+        
+        assert await reservoir.take(request) is None
+        
+        await reservoir.refill_all()
+        key = reservoir.make_key(request)
+        assert await reservoir.level(key) == 5
+        assert ai_service.calls == 5
+        
+        assert await reservoir.take(request) == "预生成笑话1"
+        stats = await reservoir.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["refilled"] == 5
+    
+    def test_temperature_bucket_and_eligibility(self):
+        """测试温度分档与可复用判断"""
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        reservoir = JokeReservoir(use_redis=False)
+        
+        first = reservoir.make_key(JokeGenerateRequest(category="动物", temperature=0.75))
+        second = reservoir.make_key(JokeGenerateRequest(category="动物", temperature=0.85))
+        assert first == second
+        
+        assert reservoir.is_eligible(JokeGenerateRequest(category="动物"))
+        assert not reservoir.is_eligible(JokeGenerateRequest(tags=["猫"]))
+        assert not reservoir.is_eligible(JokeGenerateRequest(custom_prompt="押韵"))
+    
+    @pytest.mark.asyncio
+    async def test_dynamic_keys_promoted_and_bounded(self):
+        """测试只有被反复请求的键才维持水位，且数量受LRU上限约束"""
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        ai_service = FakeAIService()
+        reservoir = JokeReservoir(
+            low_water=1, high_water=2, use_redis=False, ai_service=ai_service,
+            promote_hits=2, max_dynamic_keys=2
+        )
+        
+        # 只请求一次的分类不会触发补充
+        await reservoir.take(JokeGenerateRequest(category="随便编的分类"))
+        await reservoir.refill_all()
+        assert ai_service.calls == 0
+        
+        for category in ("动物", "程序员", "数学"):
+            for _ in range(2):
+                await reservoir.take(JokeGenerateRequest(category=category))
+        await reservoir.refill_all()
+        
+        stats = await reservoir.get_stats()
+        assert stats["dynamic_keys"] == 2
+        assert len(stats["levels"]) == 2
+        assert await reservoir.level(reservoir.make_key(JokeGenerateRequest(category="动物"))) == 0
+        assert ai_service.calls == 4
+    
+    @pytest.mark.asyncio
+    async def test_idle_dynamic_keys_expire(self):
+        """测试闲置的动态键不再补充，预热键常驻"""
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        ai_service = FakeAIService()
+        reservoir = JokeReservoir(
+            low_water=1, high_water=2, use_redis=False, ai_service=ai_service,
+            promote_hits=1, idle_ttl=60
+        )
+        pinned = reservoir.register(JokeGenerateRequest(category="程序员"))
+        dynamic = JokeGenerateRequest(category="动物")
+        await reservoir.take(dynamic)
+        
+        reservoir._active[reservoir.make_key(dynamic)] -= 120
+        await reservoir.refill_all()
+        
+        assert list((await reservoir.get_stats())["levels"]) == [reservoir._redis_key(pinned).split(":", 1)[1]]
+        assert await reservoir.level(reservoir.make_key(dynamic)) == 0
+        assert ai_service.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_refill_trims_refill_times(self):
+        """测试补充时丢弃一分钟前的补充记录"""
+        import time
+        
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        reservoir = JokeReservoir(low_water=1, high_water=2, use_redis=False, ai_service=FakeAIService())
+        reservoir.register(JokeGenerateRequest(category="程序员"))
+        reservoir._refill_times.extend([time.monotonic() - 120] * 100)
+        
+        await reservoir.refill_all()
+        
+        assert len(reservoir._refill_times) == 2
+    
+    @pytest.mark.asyncio
+    async def test_redis_refill_lock_is_exclusive(self, monkeypatch):
+        """测试Redis模式下同一个键只有一个worker能补充"""
+        from app.schemas.joke import JokeGenerateRequest
+        from app.services.joke_reservoir import JokeReservoir
+        
+        class LockRedis:
+            def __init__(self):
+                self.data = {}
+            
+            async def set(self, key, value, nx=False, px=None):
+                if nx and key in self.data:
+                    return None
+                self.data[key] = value
+                return True
+            
+            async def eval(self, script, numkeys, key, token):
+                if self.data.get(key) == token:
+                    del self.data[key]
+                    return 1
+                return 0
+        
+        redis = LockRedis()
+        monkeypatch.setattr(JokeReservoir, "redis_client", property(lambda self: redis))
+        first = JokeReservoir()
+        second = JokeReservoir()
+        key = first.make_key(JokeGenerateRequest(category="程序员"))
+        
+        token = await first._acquire_refill_lock(key)
+        assert token is not None
+        assert await second._acquire_refill_lock(key) is None
+        
+        # 令牌不匹配时不会释放别人的锁
+        await second._release_refill_lock(key, "other")
+        assert await second._acquire_refill_lock(key) is None
+        
+        await first._release_refill_lock(key, token)
+        assert await second._acquire_refill_lock(key) is not None
+
+
+class TestJokeStream:
+    """流式生成测试类"""
+    
+    def test_stream_endpoint_without_api_key(self, client: TestClient):
+        """测试无API密钥时流式接口返回备用笑话并保存"""
+        response = client.get("/api/v1/jokes/generate/stream?category=程序员")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: delta" in response.text
+        assert "event: done" in response.text
+        assert '"id"' in response.text
+    
+    @pytest.mark.asyncio
+    async def test_ai_service_relays_incremental_output(self):
+        """测试AI服务逐段转发DashScope增量输出"""
+        import json
+        import httpx
+        from app.services.ai_service import AIService
+        from app.services.circuit_breaker import CircuitBreaker
+        
+        chunks = ["为什么", "程序员", "怕冷？"]
+        body = "".join(
+            f"id:{i}\nevent:result\ndata:{json.dumps({'output': {'choices': [{'message': {'content': chunk}}]}}, ensure_ascii=False)}\n\n"
+            for i, chunk in enumerate(chunks)
+        )
+        
+        def handler(request):
+            assert request.headers["X-DashScope-SSE"] == "enable"
+            assert json.loads(request.content)["parameters"]["incremental_output"] is True
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ai_service = AIService(client=client, breaker=CircuitBreaker("test"))
+        ai_service.api_key = "test_api_key"
+        
+        received = [delta async for delta in ai_service.stream_joke("生成一个笑话")]
+        
+        assert received == chunks
+
+
+class TestGenerationCache:
+    """生成结果缓存测试类"""
+    
+    def test_variant_ring_fills_then_round_robins(self):
+        """测试变体攒满前未命中，攒满后轮询返回"""
+        from app.services.generation_cache import GenerationCache
+        
+        generation_cache = GenerationCache(variants=3, use_redis=False)
+        key = generation_cache.make_key("请生成一个冷笑话", "qwen-turbo", 0.8, "short")
+        
+        for i in range(3):
+            assert generation_cache.get(key) is None
+            generation_cache.add(key, f"变体{i}")
+        
+        served = [generation_cache.get(key) for _ in range(6)]
+        
+        assert served == ["变体0", "变体1", "变体2"] * 2
+        stats = generation_cache.get_stats()
+        assert stats["upstream_calls_saved"] == 6
+        assert stats["hit_ratio"] == round(6 / 9, 4)
+    
+    def test_key_normalization(self):
+        """测试提示词规范化与温度分档"""
+        from app.services.generation_cache import GenerationCache
+        
+        generation_cache = GenerationCache(use_redis=False)
+        
+        first = generation_cache.make_key("请生成  一个冷笑话 ", "qwen-turbo", 0.79, None)
+        second = generation_cache.make_key("请生成 一个冷笑话", "qwen-turbo", 0.81, "medium")
+        third = generation_cache.make_key("请生成 一个冷笑话", "qwen-plus", 0.8, "medium")
+        
+        assert first == second
+        assert first != third
+    
+    def test_ttl_and_lru_eviction(self, monkeypatch):
+        """测试过期与LRU淘汰"""
+        from app.services import generation_cache as module
+        
+        generation_cache = module.GenerationCache(ttl=10, variants=1, max_entries=2, use_redis=False)
+        generation_cache.add("a", "笑话a")
+        generation_cache.add("b", "笑话b")
+        assert generation_cache.get("a") == "笑话a"
+        
+        generation_cache.add("c", "笑话c")
+        assert generation_cache.get("b") is None
+        assert generation_cache.get_stats()["evictions"] == 1
+        
+        now = module.time.monotonic()
+        monkeypatch.setattr(module.time, "monotonic", lambda: now + 11)
+        assert generation_cache.get("a") is None
+    
+    @pytest.mark.asyncio
+    async def test_async_shared_layer(self, monkeypatch):
+        """测试异步路径通过共享层在worker之间复用变体"""
+        from app.services.generation_cache import GenerationCache
+        
+        class FakeAsyncListRedis:
+            def __init__(self):
+                self.lists = {}
+                self.ttls = {}
+            
+            async def rpush(self, key, value):
+                self.lists.setdefault(key, []).append(value)
+                return len(self.lists[key])
+            
+            async def expire(self, key, seconds):
+                self.ttls[key] = seconds
+            
+            async def ltrim(self, key, start, end):
+                self.lists[key] = self.lists[key][start:end + 1]
+            
+            def pipeline(self):
+                redis = self
+                
+                class Pipeline:
+                    def __init__(self):
+                        self.commands = []
+                    
+                    def lrange(self, key, start, end):
+                        self.commands.append(lambda: list(redis.lists.get(key, [])))
+                    
+                    def ttl(self, key):
+                        self.commands.append(lambda: redis.ttls.get(key, -2))
+                    
+                    async def execute(self):
+                        return [command() for command in self.commands]
+                
+                return Pipeline()
+        
+        redis = FakeAsyncListRedis()
+        monkeypatch.setattr(GenerationCache, "async_redis_client", property(lambda self: redis))
+        writer = GenerationCache(variants=2)
+        reader = GenerationCache(variants=2)
+        
+        await writer.add_async("k", "变体0")
+        assert await reader.get_async("k") is None
+        await writer.add_async("k", "变体1")
+        
+        assert [await reader.get_async("k") for _ in range(3)] == ["变体0", "变体1", "变体0"]
+        assert redis.ttls["gen_cache:k"] == writer.ttl
+        assert reader.get_stats()["local_hits"] == 2
+
+
+class FakeCounterRedis:
+    """计数缓冲用到的Redis哈希命令"""
+    
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+    
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+    
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+    
+    def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+    
+    def exists(self, key):
+        return int(key in self.hashes)
+    
+    def rename(self, source, target):
+        if source not in self.hashes:
+            raise RuntimeError("ERR no such key")
+        self.hashes[target] = self.hashes.pop(source)
+    
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+    
+    def eval(self, script, numkeys, key, token):
+        # 仅支持释放锁脚本：令牌匹配时删除
+        if self.strings.get(key) == token:
+            self.delete(key)
+            return 1
+        return 0
+    
+    def delete(self, key):
+        self.hashes.pop(key, None)
+        self.strings.pop(key, None)
+
+
+class TestCounterBuffer:
+    """计数器写回测试类"""
+    
+    @pytest.fixture
+    def joke(self, db_session, sample_joke_data):
+        joke = Joke(**sample_joke_data)
+        db_session.add(joke)
+        db_session.commit()
+        return joke
+    
+    def test_memory_buffer_batches_increments(self, db_session, joke):
+        """进程内累加，刷新时一条UPDATE写入总增量"""
+        from app.services.counter_buffer import CounterBuffer
+        
+        buffer = CounterBuffer(mode=CounterBuffer.MEMORY)
+        for _ in range(50):
+            buffer.incr("joke_views", joke.id)
+        buffer.incr("joke_likes", joke.id, delta=3)
+        
+        assert buffer.pending("joke_views", joke.id) == 50
+        assert buffer.flush(db_session) == 2
+        
+        db_session.refresh(joke)
+        assert joke.view_count == 50
+        assert joke.like_count == 3
+        assert buffer.pending("joke_views", joke.id) == 0
+    
+    def test_failed_flush_keeps_increments(self, monkeypatch):
+        """写入失败时增量放回缓冲"""
+        from unittest.mock import MagicMock
+        from app.services.counter_buffer import CounterBuffer
+        
+        buffer = CounterBuffer(mode=CounterBuffer.MEMORY)
+        buffer.incr("joke_views", 1, delta=5)
+        
+        def fail(*args, **kwargs):
+            raise RuntimeError("数据库不可用")
+        monkeypatch.setattr(CounterBuffer, "_apply", staticmethod(fail))
+        
+        db = MagicMock()
+        with pytest.raises(RuntimeError):
+            buffer.flush(db)
+        db.rollback.assert_called_once()
+        assert buffer.pending("joke_views", 1) == 5
+        assert buffer._pending_count == 1
+    
+    def test_direct_mode_writes_immediately(self, db_session, joke):
+        """direct模式每次增量立即写入"""
+        from app.services.counter_buffer import CounterBuffer
+        
+        buffer = CounterBuffer(mode=CounterBuffer.DIRECT)
+        assert buffer.incr("joke_views", joke.id, db=db_session)
+        assert not buffer.incr("joke_views", joke.id + 1000, db=db_session)
+        
+        db_session.refresh(joke)
+        assert joke.view_count == 1
+    
+    @pytest.mark.parametrize("mode", ["direct", "memory"])
+    def test_service_counters_reject_missing_ids(self, db_session, joke, mode, monkeypatch):
+        """不存在的笑话在各写入模式下都返回False"""
+        from app.services import joke_service as joke_service_module
+        from app.services.counter_buffer import CounterBuffer
+        
+        monkeypatch.setattr(joke_service_module, "counter_buffer", CounterBuffer(mode=mode))
+        service = joke_service_module.JokeService(db_session)
+        
+        assert not service.increment_view_count(joke.id + 1000)
+        assert not service.toggle_favorite(joke.id + 1000)
+        assert service.increment_view_count(joke.id)
+        assert service.toggle_favorite(joke.id)
+    
+    def test_redis_buffer_survives_and_flushes(self, db_session, joke, monkeypatch):
+        """redis模式累加在哈希中，刷新后清理"""
+        from app.services.counter_buffer import CounterBuffer
+        
+        redis = FakeCounterRedis()
+        monkeypatch.setattr(CounterBuffer, "redis_client", property(lambda self: redis))
+        buffer = CounterBuffer(mode=CounterBuffer.REDIS)
+        for _ in range(10):
+            buffer.incr("joke_views", joke.id)
+        
+        assert buffer.pending("joke_views", joke.id) == 10
+        assert buffer.flush(db_session) == 1
+        
+        db_session.refresh(joke)
+        assert joke.view_count == 10
+        assert redis.hashes == {}
+        assert redis.strings == {}
+    
+    def test_redis_leftover_batch_flushed_first(self, db_session, joke, monkeypatch):
+        """上次刷新中断留下的批次会在下次刷新时写入"""
+        from app.services.counter_buffer import CounterBuffer
+        
+        redis = FakeCounterRedis()
+        monkeypatch.setattr(CounterBuffer, "redis_client", property(lambda self: redis))
+        redis.hashes["counters:joke_views:flushing"] = {str(joke.id): 7}
+        
+        CounterBuffer(mode=CounterBuffer.REDIS).flush(db_session)
+        
+        db_session.refresh(joke)
+        assert joke.view_count == 7
+    
+    def test_redis_flush_keeps_lock_taken_over_by_other_worker(self, db_session, joke, monkeypatch):
+        """刷新超过锁超时后，不会删除其他worker重新获取的锁"""
+        from app.services.counter_buffer import CounterBuffer
+        
+        redis = FakeCounterRedis()
+        monkeypatch.setattr(CounterBuffer, "redis_client", property(lambda self: redis))
+        buffer = CounterBuffer(mode=CounterBuffer.REDIS)
+        buffer.incr("joke_views", joke.id)
+        
+        def flush_outliving_lock(client, db):
+            # 模拟锁过期后被其他worker获取
+            redis.strings["counters:flush_lock"] = "other-worker"
+            return 0
+        monkeypatch.setattr(buffer, "_flush_redis_locked", flush_outliving_lock)
+        
+        buffer.flush(db_session)
+        
+        assert redis.strings["counters:flush_lock"] == "other-worker"
+
+
+class TestAtomicIncrement:
+    """原子计数更新测试类"""
+    
+    @pytest.fixture
+    def session_factory(self, tmp_path):
+        """每个线程独立连接的文件库"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.db.base import Base
+        
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'atomic.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=16
+        )
+        Base.metadata.create_all(bind=engine)
+        yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        engine.dispose()
+    
+    def test_returns_new_values(self, db_session, sample_joke_data):
+        """返回更新后的值，记录不存在时返回None"""
+        from app.db.atomic import atomic_increment
+        
+        joke = Joke(**sample_joke_data)
+        db_session.add(joke)
+        db_session.commit()
+        
+        assert atomic_increment(db_session, Joke, joke.id, share_count=1, view_count=3) == {
+            "share_count": 1,
+            "view_count": 3
+        }
+        assert atomic_increment(db_session, Joke, 999999, share_count=1) is None
+    
+    def test_parallel_increments_are_exact(self, session_factory, sample_joke_data):
+        """1000次并发累加后计数准确"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.db.atomic import atomic_increment
+        
+        with session_factory() as db:
+            joke = Joke(**sample_joke_data)
+            db.add(joke)
+            db.commit()
+            joke_id = joke.id
+        
+        def one(_):
+            with session_factory() as db:
+                atomic_increment(db, Joke, joke_id, share_count=1)
+                db.commit()
+        
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(one, range(1000)))
+        
+        with session_factory() as db:
+            assert db.get(Joke, joke_id).share_count == 1000
+    
+    def test_parallel_user_stats_are_exact(self, session_factory):
+        """用户统计并发更新不丢失"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services.joke_service import JokeService
+        
+        with session_factory() as db:
+            user = User(openid="atomic_user", nickname="并发用户")
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        
+        def one(_):
+            with session_factory() as db:
+                JokeService(db)._update_user_stats(user_id, "generated")
+        
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(one, range(1000)))
+        
+        with session_factory() as db:
+            assert db.get(User, user_id).total_generated == 1000
+
+
+class TestPagination:
+    """分页测试类"""
+    
+    @pytest.fixture
+    def jokes(self, db_session):
+        """同一秒内创建的笑话，created_at相同，只能靠id区分顺序"""
+        jokes = [Joke(content=f"分页笑话{i}", category="分页") for i in range(25)]
+        db_session.add_all(jokes)
+        db_session.commit()
+        return jokes
+    
+    def test_cursor_walks_all_rows_once(self, db_session, jokes):
+        """游标分页逐页遍历，不重复不遗漏"""
+        from app.services.joke_service import JokeService
+        
+        service = JokeService(db_session)
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            result = service.get_jokes(size=10, category="分页", cursor=cursor)
+            if cursor:
+                assert result.total is None
+            seen.extend(item.id for item in result.items)
+            pages += 1
+            if not result.has_more:
+                break
+            cursor = result.next_cursor
+        
+        assert pages == 3
+        assert seen == sorted((joke.id for joke in jokes), reverse=True)
+    
+    def test_cursor_with_distinct_timestamps(self, db_session):
+        """按created_at倒序，带微秒的时间同样适用"""
+        from datetime import datetime, timedelta
+        from app.services.joke_service import JokeService
+        
+        base = datetime(2024, 1, 1, 12, 0, 0, 500000)
+        jokes = [
+            Joke(content=f"时间笑话{i}", category="时间", created_at=base + timedelta(minutes=i % 3))
+            for i in range(7)
+        ]
+        db_session.add_all(jokes)
+        db_session.commit()
+        
+        service = JokeService(db_session)
+        first = service.get_jokes(size=4, category="时间", cursor=None)
+        second = service.get_jokes(size=4, category="时间", cursor=first.next_cursor)
+        
+        expected = [joke.id for joke in sorted(jokes, key=lambda joke: (joke.created_at, joke.id), reverse=True)]
+        assert [item.id for item in first.items + second.items] == expected
+        assert not second.has_more
+    
+    def test_offset_mode_keeps_total(self, db_session, jokes):
+        """页码分页默认返回总数，并给出可切换到游标的next_cursor"""
+        from app.services.joke_service import JokeService
+        
+        result = JokeService(db_session).get_jokes(page=2, size=10, category="分页")
+        
+        assert result.total == 25
+        assert result.pages == 3
+        assert result.page == 2
+        assert result.has_more
+        assert result.next_cursor
+    
+    def test_invalid_cursor(self, client: TestClient):
+        """无效游标返回422"""
+        response = client.get("/api/v1/jokes/?cursor=not-a-cursor")
+        
+        assert response.status_code == 422
+
+
+class TestCountCache:
+    """列表总数缓存测试类"""
+    
+    @pytest.fixture(autouse=True)
+    def clear_counts(self):
+        from app.services.count_cache import count_cache
+        
+        count_cache.clear()
+        yield
+        count_cache.clear()
+    
+    @pytest.fixture
+    def seeded(self, db_session):
+        jokes = [
+            Joke(content=f"计数笑话{i}", category="计数" if i % 2 else "其他计数", is_featured=i % 3 == 0)
+            for i in range(12)
+        ]
+        db_session.add_all(jokes)
+        db_session.commit()
+        return jokes
+    
+    def test_inexact_total_served_from_cache(self, db_session, seeded, monkeypatch):
+        """exact=False时第二次请求不再执行COUNT"""
+        from sqlalchemy.orm import Query
+        from app.services.joke_service import JokeService
+        
+        service = JokeService(db_session)
+        first = service.get_jokes(category="计数", exact=False)
+        
+        def fail(self):
+            raise AssertionError("不应执行COUNT")
+        monkeypatch.setattr(Query, "count", fail)
+        
+        second = service.get_jokes(page=2, size=3, category="计数", exact=False)
+        assert first.total == second.total == 6
+        assert second.pages == 2
+    
+    def test_inserts_adjust_cached_totals(self, db_session, seeded, monkeypatch):
+        """新增笑话后已缓存的公开列表、分类和精选总数同步增加"""
+        from sqlalchemy.orm import Query
+        from app.schemas.joke import JokeCreate
+        from app.services.joke_service import JokeService
+        
+        service = JokeService(db_session)
+        feed = service.get_jokes(exact=False).total
+        category = service.get_jokes(category="计数", exact=False).total
+        featured = service.get_jokes(category="计数", is_featured=False, exact=False).total
+        
+        service.create_jokes([JokeCreate(content=f"新增计数笑话{i}", category="计数") for i in range(3)])
+        
+        monkeypatch.setattr(Query, "count", lambda self: pytest.fail("不应执行COUNT"))
+        assert service.get_jokes(exact=False).total == feed + 3
+        assert service.get_jokes(category="计数", exact=False).total == category + 3
+        assert service.get_jokes(category="计数", is_featured=False, exact=False).total == featured + 3
+    
+    def test_exact_count_refreshes_cache(self, db_session, seeded):
+        """exact=True总是重新计数并刷新缓存"""
+        from app.services.count_cache import count_cache
+        from app.services.joke_service import JokeService
+        
+        key = count_cache.make_key("jokes", is_public=True, category="计数")
+        count_cache.set(key, 999)
+        
+        service = JokeService(db_session)
+        assert service.get_jokes(category="计数", exact=False).total == 999
+        assert service.get_jokes(category="计数").total == 6
+        assert count_cache.get(key) == 6
+    
+    def test_adjust_skips_uncached_keys(self):
+        """未缓存的条件不会被增量写入不完整的计数"""
+        from app.services.count_cache import CountCache
+        
+        counts = CountCache(ttl=60)
+        counts.set("jokes:is_public=1", 10)
+        counts.adjust({"jokes:is_public=1": 2, "jokes:category=新:is_public=1": 1})
+        
+        assert counts.get("jokes:is_public=1") == 12
+        assert counts.get("jokes:category=新:is_public=1") is None
+    
+    @pytest.mark.asyncio
+    async def test_async_create_adjusts_through_async_redis(self, db_session, monkeypatch):
+        """异步创建路径通过异步Redis客户端调整总数，不使用同步客户端"""
+        from app.schemas.joke import JokeCreate
+        from app.services.count_cache import CountCache
+        from app.services.joke_service import JokeService
+        
+        evals = []
+        
+        class FakeAsyncPipeline:
+            def eval(self, script, numkeys, key, delta):
+                evals.append((key, delta))
+            
+            async def execute(self):
+                return [None] * len(evals)
+        
+        class FakeAsyncCountRedis:
+            def pipeline(self):
+                return FakeAsyncPipeline()
+        
+        def sync_client(self):
+            raise AssertionError("异步路径不应使用同步Redis客户端")
+        
+        monkeypatch.setattr(CountCache, "redis_client", property(sync_client))
+        monkeypatch.setattr(CountCache, "async_redis_client", property(lambda self: FakeAsyncCountRedis()))
+        
+        await JokeService(db_session).create_jokes_async([JokeCreate(content="异步计数笑话", category="计数")])
+        
+        assert ("counts:jokes:category=计数:is_public=1", 1) in evals
+        assert all(delta == 1 for _, delta in evals)
+
+
+class TestAsyncQueries:
+    """异步只读查询测试类"""
+    
+    @pytest.fixture
+    def engines(self, tmp_path):
+        """同一文件库的同步引擎和aiosqlite异步引擎"""
+        import asyncio
+        from datetime import datetime, timedelta
+        from sqlalchemy import create_engine
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from app.db.base import Base
+        from app.models.share import Share
+        
+        path = tmp_path / "async.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        
+        base = datetime(2024, 1, 1)
+        with engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [
+                {"openid": f"async_user_{i}", "is_active": i % 2 == 0, "total_generated": i, "total_shared": 0}
+                for i in range(1, 6)
+            ])
+            connection.execute(Joke.__table__.insert(), [
+                {
+                    "content": f"异步笑话{i}",
+                    "category": "异步" if i % 2 else "其他",
+                    "user_id": i % 5 + 1,
+                    "is_public": True,
+                    "is_featured": i % 4 == 0,
+                    "created_at": base + timedelta(minutes=i // 3)
+                }
+                for i in range(23)
+            ])
+            connection.execute(Share.__table__.insert(), [
+                {"user_id": 1, "joke_id": i + 1, "share_to": "wechat", "share_url": f"/share/joke/{i + 1}"}
+                for i in range(4)
+            ])
+        
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        yield engine, async_engine
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+    
+    @staticmethod
+    def run_both(engines, call):
+        """分别用同步会话和异步会话调用同一个 *_async 方法"""
+        import asyncio
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from sqlalchemy.orm import Session
+        
+        engine, async_engine = engines
+        
+        async def run():
+            with Session(engine) as db:
+                expected = await call(db)
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                actual = await call(db)
+            return expected, actual
+        
+        return asyncio.run(run())
+    
+    def test_joke_lists_match_sync(self, engines):
+        """异步会话的列表、游标分页和总数与同步会话一致"""
+        from app.services.joke_service import JokeService
+        
+        async def walk(db):
+            service = JokeService(db)
+            pages = []
+            cursor = None
+            while True:
+                result = await service.get_jokes_async.uncached(
+                    service, size=4, category="异步", cursor=cursor, include_total=True
+                )
+                pages.append(([item.id for item in result.items], result.total, result.has_more))
+                if not result.has_more:
+                    return pages
+                cursor = result.next_cursor
+        
+        expected, actual = self.run_both(engines, walk)
+        assert actual == expected
+        assert sum(len(ids) for ids, _, _ in actual) == 11
+    
+    def test_user_history_and_lookup_match_sync(self, engines):
+        """用户笑话历史和按ID查询"""
+        from app.services.joke_service import JokeService
+        
+        async def history(db):
+            service = JokeService(db)
+            result = await service.get_user_jokes_async.uncached(service, 2, page=1, size=3)
+            joke = await service.get_joke_by_id_async(result.items[0].id)
+            return [item.id for item in result.items], result.total, joke.content
+        
+        expected, actual = self.run_both(engines, history)
+        assert actual == expected
+    
+    def test_stats_match_sync(self, engines):
+        """用户和分享统计、用户列表"""
+        from app.services.share_service import ShareService
+        from app.services.user_service import UserService
+        
+        async def stats(db):
+            users = UserService(db)
+            shares = ShareService(db)
+            user_stats = await users.get_user_stats_async.uncached(users)
+            share_stats = await shares.get_share_stats_async.uncached(shares, 7)
+            listing = await users.get_users_async(page=1, size=2, is_active=True)
+            user_shares = await shares.get_user_shares_async(1, size=3)
+            return (
+                user_stats.model_dump(),
+                share_stats.total_shares,
+                share_stats.platform_stats,
+                [user.id for user in listing["items"]],
+                listing["total"],
+                [share.id for share in user_shares["items"]],
+                user_shares["has_more"]
+            )
+        
+        expected, actual = self.run_both(engines, stats)
+        assert actual == expected
+        assert actual[0]["total_users"] == 5
+        assert actual[1] == 4
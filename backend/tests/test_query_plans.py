@@ -0,0 +1,171 @@
+"""
+查询计划测试
+
+用Alembic迁移建库并写入样例数据，捕获各服务查询实际执行的SQL，
+逐条 EXPLAIN QUERY PLAN，确认都走索引而不是全表扫描。
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.joke import Joke
+from app.models.share import Share
+from app.models.user import User
+from app.services.joke_service import JokeService
+from app.services.share_service import ShareService
+from app.services.user_service import UserService
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 不带 USING INDEX 的 SCAN 即全表扫描（旧版SQLite输出 SCAN TABLE xxx）
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    """迁移到最新版本并写入样例数据的库"""
+    path = tmp_path_factory.mktemp("plans") / "plans.db"
+    engine = create_engine(f"sqlite:///{path}")
+    
+    # 不传ini文件名，避免env.py重新配置日志
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    
+    base = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {
+                "openid": f"plan_user_{i}",
+                "is_active": i % 5 != 0,
+                "is_banned": False,
+                "total_generated": i % 17,
+                "total_shared": i % 11,
+                "created_at": base + timedelta(hours=i)
+            }
+            for i in range(1, 201)
+        ])
+        connection.execute(Joke.__table__.insert(), [
+            {
+                "content": f"样例笑话{i}",
+                "category": ["程序员", "日常", "谐音", "动物"][i % 4],
+                "user_id": i % 200 + 1,
+                "is_public": i % 10 != 0,
+                "is_featured": i % 20 == 0,
+                "view_count": 0,
+                "share_count": 0,
+                "like_count": 0,
+                "created_at": base + timedelta(minutes=i // 3)
+            }
+            for i in range(3000)
+        ])
+        connection.execute(Share.__table__.insert(), [
+            {
+                "user_id": i % 200 + 1,
+                "joke_id": i % 3000 + 1,
+                "share_to": ["wechat", "moments", "qq"][i % 3],
+                "share_url": f"/share/joke/{i % 3000 + 1}?s={i}",
+                "click_count": 0,
+                "created_at": datetime.utcnow() - timedelta(hours=i % 500)
+            }
+            for i in range(3000)
+        ])
+        connection.execute(text("ANALYZE"))
+    
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def captured(engine):
+    """记录执行的SELECT语句"""
+    statements = []
+    
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+    
+    event.listen(engine, "before_cursor_execute", collect)
+    yield statements
+    event.remove(engine, "before_cursor_execute", collect)
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+def full_scans(engine, statements):
+    """返回包含全表扫描的语句及其查询计划"""
+    offenders = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            details = [row[-1] for row in plan]
+            if any(FULL_SCAN.match(detail) for detail in details):
+                offenders.append((statement, details))
+    return offenders
+
+
+class TestMigrations:
+    """迁移测试类"""
+    
+    def test_migrations_match_models(self, engine):
+        """迁移后的库结构与模型定义一致"""
+        with engine.connect() as connection:
+            diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+        
+        assert diff == []
+
+
+class TestQueryPlans:
+    """查询计划测试类"""
+    
+    def test_joke_queries_use_indexes(self, engine, db, captured):
+        """笑话列表各种筛选组合和用户历史"""
+        service = JokeService(db)
+        for filters in ({}, {"category": "日常"}, {"is_featured": True}, {"category": "日常", "is_featured": True}):
+            first = service.get_jokes(page=3, size=10, **filters)
+            service.get_jokes(size=10, cursor=first.next_cursor, include_total=True, **filters)
+        
+        history = service.get_user_jokes(7, page=2, size=5)
+        service.get_user_jokes(7, size=5, cursor=history.next_cursor)
+        db.query(Joke).filter(Joke.is_featured == True).count()
+        
+        assert len(captured) >= 20
+        assert full_scans(engine, captured) == []
+    
+    def test_user_queries_use_indexes(self, engine, db, captured):
+        """用户列表和用户统计"""
+        service = UserService(db)
+        for is_active in (None, True):
+            first = service.get_users(page=2, size=10, is_active=is_active)
+            service.get_users(size=10, is_active=is_active, cursor=first["next_cursor"])
+        service.get_user_stats()
+        
+        assert len(captured) >= 8
+        assert full_scans(engine, captured) == []
+    
+    def test_share_queries_use_indexes(self, engine, db, captured):
+        """分享统计、用户分享记录和按链接查询"""
+        service = ShareService(db)
+        service.get_share_stats(days=7)
+        first = service.get_user_shares(5, page=1, size=5)
+        service.get_user_shares(5, size=5, cursor=first["next_cursor"])
+        service.get_share_by_url("/share/joke/6?s=5")
+        
+        assert len(captured) >= 7
+        assert full_scans(engine, captured) == []
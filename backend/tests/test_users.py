@@ -151,6 +151,47 @@ class TestUserService:
         assert user.is_active == True
         assert user.is_banned == False
     
+    def test_user_writes_bump_stats_namespace(self, db_session, sample_user_data, monkeypatch):
+        """测试创建、封禁、解封用户后用户统计缓存失效"""
+        from app.services import user_service as user_service_module
+        from app.services.cache_service import CacheNamespace
+        from app.services.user_service import UserService
+        from app.schemas.user import UserCreate
+        
+        bumped = []
+        monkeypatch.setattr(user_service_module.cache, "bump_namespace", lambda *namespaces: bumped.extend(namespaces))
+        
+        user_service = UserService(db_session)
+        user = user_service.create_user(UserCreate(**sample_user_data))
+        assert user_service.ban_user(user.id)
+        assert user_service.unban_user(user.id)
+        
+        assert bumped == [CacheNamespace.USER_STATS] * 3
+    
+    @pytest.mark.asyncio
+    async def test_create_user_async_bumps_stats_namespace(self, db_session, sample_user_data, monkeypatch):
+        """测试异步创建用户通过异步缓存使用户统计失效"""
+        from app.services import user_service as user_service_module
+        from app.services.cache_service import CacheNamespace
+        from app.services.user_service import UserService
+        from app.schemas.user import UserCreate
+        
+        bumped = []
+        
+        async def bump_namespace(*namespaces):
+            bumped.extend(namespaces)
+        
+        def sync_bump(*namespaces):
+            raise AssertionError("异步路径不应使用同步缓存")
+        
+        monkeypatch.setattr(user_service_module.async_cache, "bump_namespace", bump_namespace)
+        monkeypatch.setattr(user_service_module.cache, "bump_namespace", sync_bump)
+        
+        user = await UserService(db_session).create_user_async(UserCreate(**sample_user_data))
+        
+        assert user.id is not None
+        assert bumped == [CacheNamespace.USER_STATS]
+    
     def test_get_user_by_openid_service(self, db_session, sample_user_data):
         """测试通过openid获取用户"""
         from app.services.user_service import UserService